@@ -1,2 +1,6 @@
 bind = "0.0.0.0:8000"
-workers = 2
\ No newline at end of file
+workers = 2
+# threaded workers so long-poll requests (wait_for_created_exercise) do not block a whole worker
+worker_class = "gthread"
+threads = 32
+timeout = 60
@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from language_app_backend.util.log import get_logging_config
+from language_app_backend.util.constants import LOG_SAMPLE_RATE
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +50,9 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'player_app.middleware.ViewMetricsMiddleware',
+    'player_app.middleware.MongoRoundTripMiddleware',
+    'player_app.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -93,6 +99,15 @@ GOOGLE_ADSENSE_CLIENT_ID = os.environ.get('GOOGLE_ADSENSE_CLIENT_ID')
 
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
+# bearer token of the /metrics endpoint, without it the endpoint only works with DEBUG
+METRICS_TOKEN = os.environ.get('LANGUAGE_APP_METRICS_TOKEN')
+
+# fraction of the requests profiled, and the token of the X-Profile header that profiles a request on demand
+PROFILING_RATE = float(os.environ.get('LANGUAGE_APP_PROFILING_RATE', '0'))
+PROFILING_TOKEN = os.environ.get('LANGUAGE_APP_PROFILING_TOKEN')
+# sampling (collapsed stacks for flame graphs, low overhead) or cprofile (every call, .prof files)
+PROFILING_MODE = os.environ.get('LANGUAGE_APP_PROFILING_MODE', 'sampling')
+
 WSGI_APPLICATION = 'language_app.wsgi.application'
 
 # Database
@@ -147,3 +162,11 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# LANGUAGE_APP_LOG_LEVELS sets the level of single modules, e.g. "language_app_backend.obj.LLM=DEBUG,player_app=WARNING"
+
+LOGGING = get_logging_config(os.environ.get('LANGUAGE_APP_LOG_LEVEL', 'INFO'),
+                             os.environ.get('LANGUAGE_APP_LOG_LEVELS', None),
+                             int(os.environ.get('LANGUAGE_APP_LOG_SAMPLE_RATE', LOG_SAMPLE_RATE)))
@@ -0,0 +1,60 @@
+
+from typing import Any, Coroutine, Optional
+import concurrent.futures
+import threading
+import asyncio
+
+class EventLoopThread:
+
+    """
+    An asyncio event loop running forever in its own daemon thread.
+
+    Other threads schedule coroutines on it with submit (returns a future) or
+    run (waits for the result).
+    """
+
+    __slots__ = [
+        "name",
+        "loop",
+        "thread",
+    ]
+    def __init__(self,
+                 name: str) -> None:
+
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.thread_function,
+                                       name=name,
+                                       daemon=True)
+        self.thread.start()
+
+    def thread_function(self) -> None:
+
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self,
+               coroutine: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedule a coroutine on the loop, returns a thread-safe future of its result.
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self,
+            coroutine: Coroutine,
+            timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and wait for its result, must not be called from the loop thread.
+        """
+
+        if threading.current_thread() is self.thread:
+            coroutine.close()
+            raise RuntimeError(f"EventLoopThread '{self.name}' cannot wait for itself.")
+
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self) -> None:
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,64 @@
+
+from typing import Dict, List
+import threading
+
+class ExerciseNotifier:
+
+    """
+    In-process notification that a user's created exercise has changed.
+
+    Waiters subscribe before reading the database so a notification sent
+    between their read and their wait is not lost.
+    """
+
+    __slots__ = [
+        "lock",
+        "events",
+    ]
+    def __init__(self) -> None:
+
+        self.lock = threading.Lock()
+        self.events: Dict[str, List[threading.Event]] = {}
+
+    def subscribe(self, user_id) -> threading.Event:
+        """
+        Get an event that is set when the user's created exercise changes.
+        """
+
+        event = threading.Event()
+
+        with self.lock:
+            self.events.setdefault(user_id, []).append(event)
+
+        return event
+
+    def unsubscribe(self, user_id, event) -> None:
+
+        with self.lock:
+
+            user_events = self.events.get(user_id, None)
+
+            if user_events is None:
+                return
+
+            if event in user_events:
+                user_events.remove(event)
+
+            if not len(user_events):
+                del self.events[user_id]
+
+    def notify(self, user_id) -> None:
+        """
+        Wake up every waiter of the user in this process.
+        """
+
+        with self.lock:
+            user_events = list(self.events.get(user_id, []))
+
+        for event in user_events:
+            event.set()
+
+    def get_number_of_waiters(self) -> int:
+
+        with self.lock:
+            return sum(len(user_events) for user_events in self.events.values())
@@ -1,6 +1,9 @@
 
 from typing import Optional, Tuple, Dict, Any, List
+import concurrent.futures
+import functools
 import threading
+import logging
 import time
 import datetime
 
@@ -9,77 +12,65 @@ import uuid
 import numpy as np
 
 from pymongo import ASCENDING as PY_MONGO_ASCENDING
+from pymongo import DESCENDING as PY_MONGO_DESCENDING
+from pymongo import ReturnDocument
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 
-from ..util.constants import (NUMBER_OF_ATTEMPTS_TO_CREATE_EXERCISE,
-                              SUPPORTED_LANGUAGES,
-                              NEXT_WORD_TEMPERATURE, 
+from ..util.constants import (SUPPORTED_LANGUAGES,
                               MAX_HISTORY_LENGTH,
                               MAX_NUMBER_OF_EXERCISES,
                               MIN_THUMB_VOLUME,
-                              MAX_WORD_LENGTH,
+                              MIN_EXERCISE_APPROVAL,
+                              NEW_WORD_PROMPT_SAMPLE_SIZE,
+                              NEW_WORDS_PER_REVISION,
                               VOCABULARY_REVISION_ITERATIONS,
                               VOCABULARY_REVISION_INTERVAL,
                               MAX_CONCURRENT_EXERCISE_CREATIONS,
+                              EXERCISE_CREATION_QUEUE_SIZE,
+                              MAX_IN_FLIGHT_EXERCISE_GENERATIONS,
+                              EXERCISE_COMPLETION_WORKERS,
+                              READY_EXERCISE_QUEUE_SIZE,
+                              EXERCISE_POOL_WARMER_INTERVAL,
+                              EXERCISE_POOL_WARMER_KEYS_PER_LEVEL,
+                              EXERCISE_POOL_WARMER_LLM_BUDGET,
+                              DATABASE_INDEXES_VERSION,
                               DELETE_SERVER_TIMEOUT,
                               ALLOW_MAIN_SERVER_TIMEOUT,
                               BACKGROUND_THREAD_SLEEP_TIME,
                               TIMEOUT_TO_CREATE_NEW_EXERCISE,
+                              WAIT_FOR_CREATED_EXERCISE_TIMEOUT,
+                              WAIT_FOR_CREATED_EXERCISE_CHECK_INTERVAL,
+                              EXERCISE_GENERATION_LEASE_TIMEOUT,
+                              EXERCISE_GENERATION_LEASE_CHECK_INTERVAL,
+                              LEARNER_STATE_CACHE_MAX_ENTRIES,
+                              LEARNER_STATE_CACHE_TTL,
+                              USE_VOCABULARY_BATCH_JOBS,
+                              MONGO_ROUND_TRIPS_PER_TASK_WARNING,
+                              RETIRED_EXERCISE_GRACE_PERIOD,
+                              RETIRED_EXERCISES_PER_CLEAN_UP,
                               POSSIBLE_CRITERIA)
+from ..util.scheduler import (pack_user_words,
+                              next_words)
+from ..util.cache import LRUCache
+from ..util.ranking import wilson_lower_bound
+from ..util.metrics import (increment_counter,
+                            set_gauge,
+                            register_gauge_function,
+                            register_cache_gauges)
+from ..util.futures import (completed_future,
+                            chain_future)
+from ..util.round_trips import track_round_trips
+from .UserContext import UserContext
+from .LearnerWords import LearnerWords
+from .WorkerPool import WorkerPool
+from .ExerciseNotifier import ExerciseNotifier
+from .SingleFlight import SingleFlight
+from .VocabularyBatchJobs import VocabularyBatchJobs
+from .VocabularyIndex import VocabularyIndex
+
+logger = logging.getLogger("language_app_backend.obj.GlobalContainer")
 
-def next_word(word_ids, 
-              word_scores, 
-              word_last_visited_times,
-              temperature=NEXT_WORD_TEMPERATURE) -> str:
-    
-    """
-    Select the next word to show to the user based on their last visited times and scores.
-    """
-
-    assert len(word_ids) == len(word_scores) == len(word_last_visited_times), "All lists must be of the same length."
-    assert len(word_ids) > 0, "No words available to select from."
-
-    # adjusted score = (1 - score) * (1 + time_since_last_visit)
-    print(f"word_last_visited_times: {word_last_visited_times}")
-    print(f"word_scores: {word_scores}")
-
-    word_last_visited_times = [datetime.datetime.fromtimestamp(times[-1], tz=datetime.timezone.utc) if len(times) > 0 else datetime.datetime.fromtimestamp(0, tz=datetime.timezone.utc)
-                               for times in word_last_visited_times ]
-    current_time = datetime.datetime.now(datetime.timezone.utc)
-
-    oldest_time = min(word_last_visited_times) if len(word_last_visited_times) else current_time
-    time_since_oldest_visit = (current_time - oldest_time).total_seconds() / 3600  # in hours
-
-    if time_since_oldest_visit <= 0:
-        print("No words have been visited yet, returning random word.")
-        return np.random.choice(word_ids)
-
-    word_last_visited_times = [(current_time - time).total_seconds() for time in word_last_visited_times]
-
-    word_last_visited_times = np.array(word_last_visited_times) / 3600
-    word_last_visited_times = word_last_visited_times / time_since_oldest_visit
-
-    word_scores = [scores[-1] if len(scores) > 0 else 0 for scores in word_scores]
-
-    scores = np.array(word_scores)
-    # average along 1st axis
-
-    adjusted_scores = (1 - scores) * (1 + word_last_visited_times) - 1
-
-    best_word_index_before_noise = np.argmax(adjusted_scores)
-
-    # apply temperature noise
-    noise = np.random.normal(0, temperature, size=adjusted_scores.shape)
-    adjusted_scores = np.array(adjusted_scores) + noise
-
-    best_word_index_after_noise = np.argmax(adjusted_scores)
-
-    if not best_word_index_before_noise == best_word_index_after_noise:
-        print(f"Best word before noise: {word_ids[best_word_index_before_noise]}")
-        print(f"Best word after noise: {word_ids[best_word_index_after_noise]}")
-        print(f"Temperature: {temperature}, number of words: {len(word_ids)}")
-
-    return word_ids[best_word_index_after_noise]
-    
 def empty_user(user_id) -> Dict[Any, Any]:
     """
     Create an empty user document for the database.
@@ -94,20 +85,12 @@ def empty_user(user_id) -> Dict[Any, Any]:
         "last_time_checked_subscription": 0,
         "last_created_exercise_id": "",
         "last_created_exercise_time": 0,
+        "ready_exercise_ids": [],
         "learning_languages": {}
     }
 
     return user_entry
 
-def empty_exercise_id_list_doc(exercise_key) -> Dict[Any, Any]:
-    """
-    Create an empty exercise document for the database.
-    """
-    return {
-        "_id": exercise_key,
-        "exercise_id_list": [],
-    }
-
 def empty_user_word_entry(word_id,
                             user_id,
                             word_value,
@@ -161,28 +144,46 @@ class GlobalContainer:
         "users_collection",
         "exercises_id_lists_collection",
         "exercises_collection",
-        "exercise_thumbs_up_collection",
-        "exercise_thumbs_down_collection",
+        "exercise_stats_collection",
+        "exercise_generation_leases_collection",
 
         "llm",
+        "vocabulary_batch_jobs",
+        "vocabulary_index",
         "possible_criteria",
         
         "last_time_revised_vocabulary",
+        "last_time_warmed_exercise_pools",
+        "learner_state_cache",
 
         "vocabulary_background_thread",
+        "exercise_pool_background_thread",
         "clean_up_background_thread",
         "update_server_heartbeat_thread",
-        "create_exercise_threads",
+        "exercise_creation_pool",
+        "exercise_completion_pool",
+        "exercise_generations_in_flight",
+        "exercise_generations_lock",
+        "exercise_notifier",
+        "exercise_generation_flight",
+        "preparing_user_ids",
+        "preparing_user_ids_lock",
         
         "is_running",
     ]
     def __init__(self, 
                  db_client,
-                 llm) -> None:
+                 llm,
+                 run_background_threads: bool = True) -> None:
+        """
+        Without run_background_threads the server is not registered and no background work runs,
+        exercise creation tasks (and the completions of generated exercises) are queued but never run
+        (used by the benchmarks).
+        """
         
-        print("Initializing GlobalContainer...")
+        logger.info("Initializing GlobalContainer...")
         self.server_id = str(uuid.uuid4())
-        print(f"Server ID: {self.server_id}")
+        logger.info("Server ID: %s", self.server_id)
 
         self.is_main_server = False
         self.startup_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
@@ -197,22 +198,47 @@ class GlobalContainer:
         self.users_collection = self.db["users"]
         self.exercises_id_lists_collection = self.db["exercise_id_lists"]
         self.exercises_collection = self.db["exercises"]
-        self.exercise_thumbs_up_collection = self.db["exercise_thumbs_up"]
-        self.exercise_thumbs_down_collection = self.db["exercise_thumbs_down"]
+        self.exercise_stats_collection = self.db["exercise_stats"]
+        self.exercise_generation_leases_collection = self.db["exercise_generation_leases"]
 
         self.llm = llm
+        self.vocabulary_batch_jobs = VocabularyBatchJobs(llm,
+                                                         self.db["vocabulary_batch_jobs"],
+                                                         self.words_collection,
+                                                         self.settings_collection)
+        self.vocabulary_index = VocabularyIndex()
         self.possible_criteria = POSSIBLE_CRITERIA
         self.last_time_revised_vocabulary = {}
+        self.last_time_warmed_exercise_pools = 0
+        self.learner_state_cache = LRUCache(LEARNER_STATE_CACHE_MAX_ENTRIES,
+                                            LEARNER_STATE_CACHE_TTL)
+        register_cache_gauges("learner_state", self.learner_state_cache)
 
         self.vocabulary_background_thread = None
+        self.exercise_pool_background_thread = None
         self.clean_up_background_thread = None
         self.update_server_heartbeat_thread = None
-        self.create_exercise_threads = []
+        self.exercise_creation_pool = None
+        self.exercise_completion_pool = None
+        self.exercise_generations_in_flight = 0
+        self.exercise_generations_lock = threading.Lock()
+        register_gauge_function("language_app_exercise_generations_in_flight", self.get_exercise_generations_in_flight)
+        self.exercise_notifier = ExerciseNotifier()
+        self.exercise_generation_flight = SingleFlight()
+        self.preparing_user_ids = set()
+        self.preparing_user_ids_lock = threading.Lock()
 
         self.is_running = True
 
         self.create_indexes()
 
+        if not run_background_threads:
+            self.exercise_creation_pool = WorkerPool("exercise-creation",
+                                                     0,
+                                                     EXERCISE_CREATION_QUEUE_SIZE)
+            self.exercise_completion_pool = WorkerPool("exercise-completion", 0, 0)
+            return
+
         self.register_server()
 
         self.start_background_threads()
@@ -222,14 +248,24 @@ class GlobalContainer:
         Destructor to clean up the database connection.
         """
         self.is_running = False
-        print("Stopping background threads...")
-        print("Joining vocabulary background thread...")
+
+        if self.vocabulary_background_thread is None:
+            return
+
+        logger.info("Stopping background threads...")
+        logger.info("Joining vocabulary background thread...")
         self.vocabulary_background_thread.join()
-        print("Joining clean up background thread...")
+        logger.info("Joining exercise pool background thread...")
+        self.exercise_pool_background_thread.join()
+        logger.info("Joining clean up background thread...")
         self.clean_up_background_thread.join()
-        print("Joining update server heartbeat thread...")
+        logger.info("Joining update server heartbeat thread...")
         self.update_server_heartbeat_thread.join()
-        print("Threads stopped.")
+        logger.info("Stopping exercise creation pool...")
+        self.exercise_creation_pool.stop()
+        logger.info("Stopping exercise completion pool...")
+        self.exercise_completion_pool.stop()
+        logger.info("Threads stopped.")
 
     def check_if_is_main_server(self) -> bool:
         """
@@ -241,7 +277,7 @@ class GlobalContainer:
         servers = list(servers)
 
         if not len(servers):
-            print("No servers found in the database.")
+            logger.debug("No servers found in the database.")
             return False
         
         # get all servers with time since last heartbeat less than 1 minute old
@@ -251,19 +287,21 @@ class GlobalContainer:
 
         servers = [server for server in servers if current_time - server["last_heartbeat"] < DELETE_SERVER_TIMEOUT]
 
+        set_gauge("language_app_live_servers", len(servers))
+
         server_ids = [server["_id"] for server in servers]
 
         old_server_ids = [server_id for server_id in original_server_ids if server_id not in server_ids]
 
         if not len(servers):
-            print("No servers found with recent heartbeats.")
+            logger.debug("No servers found with recent heartbeats.")
             return False
         
         # get all servers with time since startup time more than 1 minute old
         servers = [server for server in servers if current_time - server["startup_time"] > ALLOW_MAIN_SERVER_TIMEOUT]
 
         if not len(servers):
-            print("No servers found with old enough startup times.")
+            logger.debug("No servers found with old enough startup times.")
             return False
         
         # get the server with the alpha-numeric id that is the lowest
@@ -274,18 +312,18 @@ class GlobalContainer:
         main_server_id = server_ids[0]
 
         if main_server_id == self.server_id:
-            print(f"Server {self.server_id} is the main server.")
+            logger.info("Server %s is the main server.", self.server_id)
             
             if len(old_server_ids):
-                print(f"Removing old servers from the database: {old_server_ids}.")
+                logger.info("Removing old servers from the database: %s.", old_server_ids)
                 try:
                     self.servers_collection.delete_many({"_id": {"$in": old_server_ids}})
                 except Exception as e:
-                    print(f"Error removing old servers from the database: {e}")
+                    logger.error("Error removing old servers from the database: %s", e)
 
             return True
         else:
-            print(f"Server {self.server_id} is not the main server. Main server is {main_server_id}.")
+            logger.info("Server %s is not the main server. Main server is %s.", self.server_id, main_server_id)
             return False
 
     def register_server(self) -> None:
@@ -303,7 +341,7 @@ class GlobalContainer:
             {"$set": server_entry},
             upsert=True
         )
-        print(f"Server {self.server_id} registered in the database.")
+        logger.info("Server %s registered in the database.", self.server_id)
 
     def start_background_threads(self) -> None:
         """
@@ -312,67 +350,135 @@ class GlobalContainer:
         self.vocabulary_background_thread = threading.Thread(target=self.vocabulary_background_function, daemon=True)
         self.vocabulary_background_thread.start()
 
-        print("Vocabulary background thread started.")
+        logger.info("Vocabulary background thread started.")
+
+        self.exercise_pool_background_thread = threading.Thread(target=self.exercise_pool_background_function, daemon=True)
+        self.exercise_pool_background_thread.start()
+
+        logger.info("Exercise pool background thread started.")
 
         self.clean_up_background_thread = threading.Thread(target=self.clean_up_background_function, daemon=True)
         self.clean_up_background_thread.start()
 
-        print("Clean up background thread started.")
+        logger.info("Clean up background thread started.")
 
         self.update_server_heartbeat_thread = threading.Thread(target=self.update_server_heartbeat_function, daemon=True)
         self.update_server_heartbeat_thread.start()
 
-        print("Server heartbeat background thread started.")
+        logger.info("Server heartbeat background thread started.")
+
+        self.exercise_creation_pool = WorkerPool("exercise-creation",
+                                                 MAX_CONCURRENT_EXERCISE_CREATIONS,
+                                                 EXERCISE_CREATION_QUEUE_SIZE)
+
+        logger.info("Exercise creation pool started.")
+
+        # unbounded, a generated exercise is always stored (the creation pool bounds how many are started)
+        self.exercise_completion_pool = WorkerPool("exercise-completion",
+                                                   EXERCISE_COMPLETION_WORKERS,
+                                                   0)
+
+        logger.info("Exercise completion pool started.")
+
+    def get_user_context(self, user_id) -> UserContext:
+        """
+        Create a request-scoped context for the user, the document is loaded lazily.
+        """
+
+        return UserContext(user_id)
+
+    def load_user(self,
+                  user_id,
+                  user_context: Optional[UserContext] = None) -> Optional[Dict[Any, Any]]:
+        """
+        Get the user document, reading it from the database only if the context has not loaded it yet.
+        """
+
+        if user_context is not None and user_context.is_loaded:
+            return user_context.user
+
+        user = self.users_collection.find_one({"_id": user_id})
+
+        if user_context is not None:
+            user_context.set_user(user)
+
+        return user
+
+    def update_user(self,
+                    user_id,
+                    fields,
+                    user_context: Optional[UserContext] = None) -> None:
+        """
+        $set fields on the user document and apply them to the context.
+        """
 
-    def set_last_time_checked_subscription(self, user_id, current_time) -> None:
-        current_time_unix = int(current_time.timestamp())
         self.users_collection.update_one(
             {"_id": user_id},
-            {"$set": {
-                "last_time_checked_subscription": current_time_unix
-            }}
+            {"$set": fields}
+        )
+
+        if user_context is not None:
+            user_context.apply_set(fields)
+
+    def increment_user(self,
+                       user_id,
+                       fields,
+                       user_context: Optional[UserContext] = None) -> None:
+        """
+        $inc fields on the user document and apply them to the context.
+        """
+
+        self.users_collection.update_one(
+            {"_id": user_id},
+            {"$inc": fields}
         )
 
-    def get_user_subscription(self, user_id) -> bool:
+        if user_context is not None:
+            user_context.apply_inc(fields)
+
+    def set_last_time_checked_subscription(self, user_id, current_time, user_context=None) -> None:
+        current_time_unix = int(current_time.timestamp())
+        self.update_user(user_id,
+                         {"last_time_checked_subscription": current_time_unix},
+                         user_context)
+
+    def get_user_subscription(self, user_id, user_context=None) -> bool:
         """
         Get the user's subscription status from the database.
         """
 
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return False
 
         subscription_status = user.get("subscription_status", False)
         
         if not isinstance(subscription_status, bool):
-            print(f"Invalid subscription status for user {user_id}.")
+            logger.warning("Invalid subscription status for user %s.", user_id)
             return False
         
         return subscription_status
 
-    def set_user_subscription(self, user_id, is_active) -> None:
+    def set_user_subscription(self, user_id, is_active, user_context=None) -> None:
         """
         Set the user's subscription status in the database.
         """
 
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "subscription_status": is_active
-            }}
-        )
+        self.update_user(user_id,
+                         {"subscription_status": is_active},
+                         user_context)
 
-    def get_last_time_checked_subscription(self, user_id) -> int:
-        user = self.users_collection.find_one({"_id": user_id})
+    def get_last_time_checked_subscription(self, user_id, user_context=None) -> int:
+        user = self.load_user(user_id, user_context)
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return datetime.datetime.fromtimestamp(0, tz=datetime.timezone.utc)
 
         last_time_checked_subscription_unix = user.get("last_time_checked_subscription", 0)
         
         if not isinstance(last_time_checked_subscription_unix, int):
-            print(f"Invalid last time checked subscription value for user {user_id}.")
+            logger.warning("Invalid last time checked subscription value for user %s.", user_id)
             return datetime.datetime.fromtimestamp(0, tz=datetime.timezone.utc)
         
         last_time_checked_subscription = datetime.datetime.fromtimestamp(last_time_checked_subscription_unix, tz=datetime.timezone.utc)
@@ -386,8 +492,8 @@ class GlobalContainer:
         """
 
         has_created_indexes = self.settings_collection.find_one({"_id": "indexes_created"})
-        if has_created_indexes:
-            print("Indexes already created in the database.")
+        if has_created_indexes and has_created_indexes.get("version", 1) >= DATABASE_INDEXES_VERSION:
+            logger.info("Indexes already created in the database.")
             return
         
         ##################################################################
@@ -398,14 +504,23 @@ class GlobalContainer:
         self.user_thumbs_collection.create_index([('user_id', PY_MONGO_ASCENDING), ('exercise_id', PY_MONGO_ASCENDING)], unique=True)
         # self.users_collection.create_index([('_id', PY_MONGO_ASCENDING)], unique=True)
         # self.exercises_id_lists_collection.create_index([('_id', PY_MONGO_ASCENDING)], unique=True)
+        self.exercises_id_lists_collection.create_index([('language', PY_MONGO_ASCENDING), ('level', PY_MONGO_ASCENDING), ('request_count', PY_MONGO_DESCENDING)])
+        # retired exercises are deleted once no learner is given them
+        self.exercises_collection.create_index([('retired_at', PY_MONGO_ASCENDING)], sparse=True)
+        self.users_collection.create_index([('last_created_exercise_id', PY_MONGO_ASCENDING)])
+        self.users_collection.create_index([('ready_exercise_ids', PY_MONGO_ASCENDING)])
 
         ##################################################################
 
-        self.settings_collection.insert_one({
-            "_id": "indexes_created",
-            "created": True
-        })
-        print("Indexes created in the database.")
+        self.settings_collection.update_one(
+            {"_id": "indexes_created"},
+            {"$set": {
+                "created": True,
+                "version": DATABASE_INDEXES_VERSION
+            }},
+            upsert=True
+        )
+        logger.info("Indexes created in the database.")
 
     def populate_initial_words(self, 
                                language) -> bool:
@@ -415,19 +530,19 @@ class GlobalContainer:
         """
 
         if language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{language}' for initial words.")
+            logger.warning("Unsupported language '%s' for initial words.", language)
             return False
         
         has_populated_initial_words = self.settings_collection.find_one({"_id": f"initial_words_populated_{language}"})
 
         if has_populated_initial_words:
-            print("Initial words already populated in the database.")
+            logger.info("Initial words already populated in the database.")
             return False
         
         initial_words = self.llm.get_initial_words(language)
 
         if not initial_words:
-            print("No initial words found for the language.")
+            logger.warning("No initial words found for the language.")
             return False
 
         for level, word_values in initial_words[language].items():
@@ -445,7 +560,7 @@ class GlobalContainer:
             "_id": f"initial_words_populated_{language}",
             "populated": True
         })
-        print(f"Initial words populated in the database for language '{language}'.")
+        logger.info("Initial words populated in the database for language '%s'.", language)
 
         return True
     
@@ -458,11 +573,11 @@ class GlobalContainer:
         """
 
         if language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{language}' for initial words.")
+            logger.warning("Unsupported language '%s' for initial words.", language)
             return []
         
         if level not in [0, 1, 2]:
-            print(f"Unsupported level '{level}' for initial words.")
+            logger.warning("Unsupported level '%s' for initial words.", level)
             return []
         
         words = self.words_collection.find({"language": language, "level": level})
@@ -485,97 +600,96 @@ class GlobalContainer:
         return supported_languages
     
     def get_ui_language(self,
-                          user_id) -> Optional[str]:
+                          user_id,
+                          user_context=None) -> Optional[str]:
         
         """
         Get the user's ui_language from the database.
         """
         
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return None
         
         ui_language = user.get("ui_language", None)
 
         if ui_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported user language '{ui_language}' for user {user_id}.")
+            logger.debug("Unsupported user language '%s' for user %s.", ui_language, user_id)
             return None
         
         return ui_language
 
 
     def get_learning_language(self,
-                              user_id) -> Optional[str]:
+                              user_id,
+                              user_context=None) -> Optional[str]:
         
         """
         Get the user's learning_language from the database.
         """
 
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return None
         
         current_learning_language = user.get("current_learning_language", None)
 
         if current_learning_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{current_learning_language}' for user {user_id}.")
+            logger.debug("Unsupported language '%s' for user %s.", current_learning_language, user_id)
             return None
         
         return current_learning_language
     
     def set_ui_language(self,
                           user_id, 
-                          ui_language) -> bool:
+                          ui_language,
+                          user_context=None) -> bool:
         
         """
         Set the user's ui_language in the database.
         """
 
         if ui_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{ui_language}' for user {user_id}.")
+            logger.warning("Unsupported language '%s' for user %s.", ui_language, user_id)
             return False
         
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "ui_language": ui_language
-            }}
-        )
-        print(f"User {user_id} UI language set to '{ui_language}'.")
+        self.update_user(user_id,
+                         {"ui_language": ui_language},
+                         user_context)
+        logger.debug("User %s UI language set to '%s'.", user_id, ui_language)
 
         return True
     
     def set_learning_language(self,
                               user_id, 
-                              learning_language) -> bool:
+                              learning_language,
+                              user_context=None) -> bool:
         
         """
         Set the user's learning_language in the database.
         """
 
         if learning_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{learning_language}' for user {user_id}.")
+            logger.warning("Unsupported language '%s' for user %s.", learning_language, user_id)
             return False
         
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "current_learning_language": learning_language,
-                "last_created_exercise_id": "",
-                "last_created_exercise_time": 0
-            }}
-        )
-        print(f"User {user_id} learning language set to '{learning_language}'.")
+        self.update_user(user_id,
+                         {"current_learning_language": learning_language,
+                          "last_created_exercise_id": "",
+                          "last_created_exercise_time": 0,
+                          "ready_exercise_ids": []},
+                         user_context)
+        logger.debug("User %s learning language set to '%s'.", user_id, learning_language)
 
         # check if learning_language is in user["learning_languages"]:
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return False
         
         learning_languages = user.get("learning_languages", None)
@@ -583,45 +697,51 @@ class GlobalContainer:
         if learning_languages is None:
             learning_languages = {}
 
-        if learning_language not in learning_languages:
-            learning_languages[learning_language] = {
-                "current_level": 0,
-            }
+        if learning_language in learning_languages:
+            return True
 
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "learning_languages": learning_languages
-            }}
-        )
+        learning_languages = dict(learning_languages)
+        learning_languages[learning_language] = {
+            "current_level": 0,
+        }
+
+        self.update_user(user_id,
+                         {"learning_languages": learning_languages},
+                         user_context)
 
         return True
     
     def create_user_if_needed(self, 
-                              user_id) -> bool:
+                              user_id,
+                              user_context=None) -> bool:
         """
         Create a user in the database
         """
             
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.debug("User %s not found in the database.", user_id)
             new_user = empty_user(user_id)
             self.users_collection.insert_one(new_user)
-            print(f"User {user_id} created in the database.")
+            logger.info("User %s created in the database.", user_id)
+
+            if user_context is not None:
+                user_context.set_user(new_user)
+
+            return True
 
         return False
     
-    def redirect_if_new_user(self, user_id) -> Tuple[bool, str]:
+    def redirect_if_new_user(self, user_id, user_context=None) -> Tuple[bool, str]:
         """
         Redirect the user to the appropriate page based on their status.
         """
 
-        ui_language = self.get_ui_language(user_id)
+        ui_language = self.get_ui_language(user_id, user_context)
 
         if ui_language is not None and not ui_language in SUPPORTED_LANGUAGES:
-            print(f"Unsupported user language '{ui_language}' for user {user_id}.")
+            logger.warning("Unsupported user language '%s' for user %s.", ui_language, user_id)
             ui_language = None
 
         if ui_language is None:
@@ -629,10 +749,10 @@ class GlobalContainer:
             
         ######################
 
-        learning_language = self.get_learning_language(user_id)
+        learning_language = self.get_learning_language(user_id, user_context)
 
         if learning_language is not None and not learning_language in SUPPORTED_LANGUAGES:
-            print(f"Unsupported learning language '{learning_language}' for user {user_id}.")
+            logger.warning("Unsupported learning language '%s' for user %s.", learning_language, user_id)
             learning_language = None
         
         if learning_language is None:
@@ -655,13 +775,39 @@ class GlobalContainer:
             current_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
 
             if current_time - self.last_time_revised_vocabulary[language] > VOCABULARY_REVISION_INTERVAL:  # 24 hours
-                            
-                self.populate_initial_words(language)
 
-                self.revise_vocabulary(language)
+                if USE_VOCABULARY_BATCH_JOBS:
+                    self.submit_vocabulary_batch_jobs(language)
+
+                    # the levels are revised by the batch job, only the new word is added here
+                    self.revise_vocabulary(language, revise_levels=False)
+                else:
+                    self.populate_initial_words(language)
+
+                    self.revise_vocabulary(language)
             
                 self.last_time_revised_vocabulary[language] = current_time
 
+        if USE_VOCABULARY_BATCH_JOBS:
+            self.vocabulary_batch_jobs.poll_jobs()
+
+    def submit_vocabulary_batch_jobs(self,
+                                     language) -> None:
+        """
+        Submit the vocabulary work of the language as batch jobs, the whole vocabulary is re-levelled.
+        """
+
+        self.vocabulary_batch_jobs.submit_initial_words_job(language)
+
+        vocabulary = list(self.words_collection.find({"language": language},
+                                                     projection={"word_value": 1}))
+        
+        if not len(vocabulary):
+            return
+
+        self.vocabulary_batch_jobs.submit_word_levels_job(language,
+                                                          [word["word_value"] for word in vocabulary])
+
     def vocabulary_background_function(self) -> None:
 
         """
@@ -672,12 +818,100 @@ class GlobalContainer:
             
             if self.is_main_server:
                 try:
-                    self.vocabulary_background_function_inner()
+                    with track_round_trips("Vocabulary background function", MONGO_ROUND_TRIPS_PER_TASK_WARNING):
+                        self.vocabulary_background_function_inner()
+                except Exception as e:
+                    logger.error("Error in vocabulary background function: %s", e)
+
+            time.sleep(BACKGROUND_THREAD_SLEEP_TIME)
+
+    def exercise_pool_background_function(self) -> None:
+
+        """
+        Background thread to top up the most requested exercise pools periodically.
+        """
+    
+        while self.is_running:
+            
+            current_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+
+            if self.is_main_server and current_time - self.last_time_warmed_exercise_pools > EXERCISE_POOL_WARMER_INTERVAL:
+                try:
+                    with track_round_trips("Exercise pool warmer", MONGO_ROUND_TRIPS_PER_TASK_WARNING):
+                        self.warm_exercise_pools()
                 except Exception as e:
-                    print(f"Error in vocabulary background function: {e}")
+                    logger.error("Error in exercise pool background function: %s", e)
+
+                self.last_time_warmed_exercise_pools = current_time
 
             time.sleep(BACKGROUND_THREAD_SLEEP_TIME)
 
+    def warm_exercise_pools(self,
+                            llm_budget=EXERCISE_POOL_WARMER_LLM_BUDGET) -> int:
+        
+        """
+        Top up the most requested exercise keys of every language and level to MAX_NUMBER_OF_EXERCISES,
+        generating at most llm_budget exercises. Returns the number of exercises generated.
+        """
+
+        candidates = []
+
+        for language in SUPPORTED_LANGUAGES:
+            for level in [0, 1, 2]:
+
+                exercise_id_list_docs = self.exercises_id_lists_collection.find(
+                    {"language": language,
+                     "level": level},
+                    projection={"exercise_id_list": 1,
+                                "word_ids": 1,
+                                "request_count": 1}
+                ).sort("request_count", PY_MONGO_DESCENDING).limit(EXERCISE_POOL_WARMER_KEYS_PER_LEVEL)
+
+                for exercise_id_list_doc in exercise_id_list_docs:
+
+                    number_missing = MAX_NUMBER_OF_EXERCISES - len(exercise_id_list_doc.get("exercise_id_list", []))
+
+                    if number_missing <= 0 or not exercise_id_list_doc.get("word_ids", None):
+                        continue
+
+                    candidates.append((exercise_id_list_doc.get("request_count", 0),
+                                       number_missing,
+                                       exercise_id_list_doc,
+                                       language,
+                                       level))
+
+        # spend the budget on the most requested keys first, across all languages
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        number_generated = 0
+
+        for (request_count,
+             number_missing,
+             exercise_id_list_doc,
+             language,
+             level) in candidates:
+
+            for _ in range(number_missing):
+
+                if number_generated >= llm_budget:
+                    logger.info("Exercise pool warmer used its budget of %s exercises.", llm_budget)
+                    return number_generated
+                
+                number_generated += 1
+
+                exercise_id_list = self.add_to_exercise_id_list(exercise_id_list_doc["_id"],
+                                                                exercise_id_list_doc["word_ids"],
+                                                                language,
+                                                                level)
+
+                if exercise_id_list is None:
+                    logger.warning("Exercise pool warmer failed to top up key '%s'.", exercise_id_list_doc['_id'])
+                    break
+
+        logger.info("Exercise pool warmer generated %s exercises.", number_generated)
+
+        return number_generated
+
     def clean_up_background_function(self) -> None:
 
         """
@@ -686,9 +920,54 @@ class GlobalContainer:
 
         while self.is_running:
 
-            # ...
+            if self.is_main_server:
+                try:
+                    with track_round_trips("Clean up", MONGO_ROUND_TRIPS_PER_TASK_WARNING):
+                        self.delete_retired_exercises()
+                except Exception as e:
+                    logger.error("Error in clean up background function: %s", e)
 
             time.sleep(BACKGROUND_THREAD_SLEEP_TIME)
+
+    def delete_retired_exercises(self) -> int:
+        """
+        Delete the exercises retired from their pool for longer than the grace period, with their stats,
+        unless they are still the current or a prepared exercise of a learner. Returns the number deleted.
+        """
+
+        current_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+
+        retired_exercises = self.exercises_collection.find({"retired_at": {"$lt": current_time - RETIRED_EXERCISE_GRACE_PERIOD}},
+                                                           projection={"exercise_id": 1}).sort("retired_at", PY_MONGO_ASCENDING).limit(RETIRED_EXERCISES_PER_CLEAN_UP)
+        retired_exercise_ids = [exercise["exercise_id"] for exercise in retired_exercises]
+
+        if not len(retired_exercise_ids):
+            return 0
+
+        referencing_users = self.users_collection.find({"$or": [{"last_created_exercise_id": {"$in": retired_exercise_ids}},
+                                                                {"ready_exercise_ids": {"$in": retired_exercise_ids}}]},
+                                                       projection={"last_created_exercise_id": 1, "ready_exercise_ids": 1})
+
+        referenced_exercise_ids = set()
+        for user in referencing_users:
+            referenced_exercise_ids.add(user.get("last_created_exercise_id", None))
+            referenced_exercise_ids.update(user.get("ready_exercise_ids", []))
+
+        unreferenced_exercise_ids = [exercise_id for exercise_id in retired_exercise_ids if exercise_id not in referenced_exercise_ids]
+        still_referenced_exercise_ids = [exercise_id for exercise_id in retired_exercise_ids if exercise_id in referenced_exercise_ids]
+
+        if len(unreferenced_exercise_ids):
+            self.exercises_collection.delete_many({"exercise_id": {"$in": unreferenced_exercise_ids}})
+            self.exercise_stats_collection.delete_many({"_id": {"$in": unreferenced_exercise_ids}})
+
+        if len(still_referenced_exercise_ids):
+            # checked again after the others, so they do not hold up the exercises retired after them
+            self.exercises_collection.update_many({"exercise_id": {"$in": still_referenced_exercise_ids}},
+                                                  {"$set": {"retired_at": current_time}})
+
+        logger.info("Deleted %s retired exercises, %s are still in use.", len(unreferenced_exercise_ids), len(still_referenced_exercise_ids))
+
+        return len(unreferenced_exercise_ids)
     
     def update_server_heartbeat_function_inner(self):
     
@@ -701,30 +980,43 @@ class GlobalContainer:
             }}
         )
 
-        print(f"Server {self.server_id} heartbeat updated in the database.")
+        logger.debug("Server %s heartbeat updated in the database.", self.server_id)
+        set_gauge("language_app_server_last_heartbeat_timestamp_seconds", current_time)
 
         self.is_main_server = self.check_if_is_main_server()
+        set_gauge("language_app_server_is_main", int(self.is_main_server))
+
+        if self.exercise_creation_pool is not None:
+            stats = self.exercise_creation_pool.get_stats()
+            logger.info("Exercise creation pool: %s queued, %s in flight, %s rejected, queue wait p50/p95/p99 %.2f/%.2f/%.2f s, run p50/p95/p99 %.2f/%.2f/%.2f s.",
+                        stats["queue_depth"], stats["in_flight"], stats["rejected"],
+                        stats["queue_latency_p50"], stats["queue_latency_p95"], stats["queue_latency_p99"],
+                        stats["run_latency_p50"], stats["run_latency_p95"], stats["run_latency_p99"])
+            logger.info("Exercise generations in flight on the LLM event loop: %s.", self.get_exercise_generations_in_flight())
 
     def update_server_heartbeat_function(self):
 
         while self.is_running:
 
             try:
-                self.update_server_heartbeat_function_inner()
+                with track_round_trips("Server heartbeat", MONGO_ROUND_TRIPS_PER_TASK_WARNING):
+                    self.update_server_heartbeat_function_inner()
             except Exception as e:
-                print(f"Error in server heartbeat function: {e}")
+                logger.error("Error in server heartbeat function: %s", e)
+                increment_counter("language_app_server_heartbeat_failures_total")
 
             time.sleep(BACKGROUND_THREAD_SLEEP_TIME)
     
     def revise_vocabulary(self,
-                            language) -> bool:
+                            language,
+                            revise_levels=True) -> bool:
         
         """
         Revise the vocabulary for the given language.
         """
 
         if language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{language}' for revising vocabulary.")
+            logger.warning("Unsupported language '%s' for revising vocabulary.", language)
             return False
         
         vocabulary = self.words_collection.find({"language": language})
@@ -732,108 +1024,114 @@ class GlobalContainer:
         vocabulary = list(vocabulary)
 
         if not len(vocabulary):
-            print(f"No vocabulary found for language '{language}'.")
+            logger.debug("No vocabulary found for language '%s'.", language)
             return False
         
         ########################################################################
 
         shuffled_word_indices = np.random.permutation(len(vocabulary))
 
-        selected_word_indices = shuffled_word_indices[:VOCABULARY_REVISION_ITERATIONS]
+        selected_word_indices = shuffled_word_indices[:VOCABULARY_REVISION_ITERATIONS] if revise_levels else []
+
+        # one query per WORD_LEVEL_BATCH_SIZE words
+        revised_levels = self.llm.get_word_levels([vocabulary[word_i]["word_value"] for word_i in selected_word_indices],
+                                                  language)
+
+        level_updates = []
 
         for word_i in selected_word_indices:
             word_doc = vocabulary[word_i]
 
             word_value = word_doc["word_value"]
 
-            revised_level = self.llm.get_word_level(word_value,
-                                                    language)
+            revised_level = revised_levels.get(word_value, None)
 
             if revised_level is None:
-                print(f"Failed to get word level for word '{word_value}' in language '{language}'.")
+                logger.warning("Failed to get word level for word '%s' in language '%s'.", word_value, language)
                 continue
 
             previous_level = word_doc["level"]
 
             if revised_level == previous_level:
-                print(f"Word '{word_value}' already at level {revised_level} in language '{language}'.")
                 continue
 
             vocabulary[word_i]["level"] = revised_level
 
             word_id = word_doc["_id"]
 
-            self.words_collection.update_one(
+            level_updates.append(UpdateOne(
                 {"_id": word_id},
                 {"$set": {
                     "level": revised_level
                 }}
-            )
+            ))
 
-            print(f"Revised word '{word_value}' to level {revised_level} in language '{language}'.")
+            logger.info("Revised word '%s' to level %s in language '%s'.", word_value, revised_level, language)
 
-        vocabulary_word_values = [word["word_value"] for word in vocabulary]
+        if len(level_updates):
+            self.words_collection.bulk_write(level_updates, ordered=False)
 
-        new_word_value = self.llm.get_new_word(language, vocabulary_word_values)
+        # the index is used for duplicate checks, only a sample of one level goes in the prompt
+        self.vocabulary_index.set_vocabulary(language, vocabulary)
 
-        if new_word_value is None:
-            print(f"Failed to get new word for language '{language}'.")
-            return False
-        
-        if not isinstance(new_word_value, str):
-            print(f"New word value is not a string: {new_word_value}.")
-            return False
-        
-        if new_word_value == "":
-            print(f"New word value is empty.")
-            return False
-        
-        if " " in new_word_value:
-            print(f"New word value '{new_word_value}' contains spaces.")
-            return False
-        
-        if len(new_word_value) > MAX_WORD_LENGTH:
-            print(f"New word value '{new_word_value}' is too long.")
+        level = self.vocabulary_index.get_smallest_level(language, [0, 1, 2])
+
+        sample_word_values = self.vocabulary_index.sample(language,
+                                                          level,
+                                                          NEW_WORD_PROMPT_SAMPLE_SIZE)
+
+        new_word_values = self.llm.get_new_words(language,
+                                                 level,
+                                                 sample_word_values,
+                                                 NEW_WORDS_PER_REVISION)
+
+        if new_word_values is None:
+            logger.warning("Failed to get new words for language '%s'.", language)
             return False
         
-        if new_word_value in [word["word_value"] for word in vocabulary]:
-            print(f"New word value '{new_word_value}' already exists in the vocabulary.")
+        word_docs = []
+        for new_word_value in new_word_values:
+
+            if not self.vocabulary_index.add(language, new_word_value, level):
+                logger.debug("New word value '%s' already exists in the vocabulary.", new_word_value)
+                continue
+
+            word_docs.append(empty_word_document(str(uuid.uuid4()),
+                                                 new_word_value,
+                                                 language,
+                                                 level))
+
+        if not len(word_docs):
+            logger.debug("No new words for language '%s'.", language)
             return False
         
-        # create a new word document
+        self.words_collection.insert_many(word_docs)
 
-        level = self.llm.get_word_level(new_word_value,
-                                        language)
-        
-        if level is None:
-            print(f"Failed to get word level for new word '{new_word_value}' in language '{language}'.")
-            return False
+        logger.info("New words %s added to the vocabulary at level %s in language '%s'.", [word_doc['word_value'] for word_doc in word_docs], level, language)
 
-        word_id = str(uuid.uuid4())
-        word_doc = empty_word_document(word_id,
-                                        new_word_value,
-                                        language,
-                                        level)
-        
-        self.words_collection.insert_one(word_doc)
+        response_cache_stats = self.llm.get_response_cache_stats()
+        if response_cache_stats is not None:
+            logger.info("LLM response cache: %s.", response_cache_stats)
 
-        print(f"New word '{new_word_value}' added to the vocabulary in language '{language}'.")
+        logger.info("LLM retries: %s.", self.llm.get_retry_stats())
+        logger.info("LLM rate governor: %s.", self.llm.get_rate_governor_stats())
         
         return True
 
     def get_user_object(self,
-                        user_id) -> Optional[Dict[Any, Any]]:
+                        user_id,
+                        user_context=None) -> Optional[Dict[Any, Any]]:
         """
         Get the user object from the database.
         """
 
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return None
         
-        print("User object found in the database.")
+        logger.debug("User object found in the database.")
         
         return user
     
@@ -847,13 +1145,13 @@ class GlobalContainer:
         exercise_id_list_doc = self.exercises_id_lists_collection.find_one({"_id": exercise_key})
         
         if not exercise_id_list_doc:
-            print(f"No exercises generated for key: {exercise_key}")
+            logger.debug("No exercises generated for key: %s", exercise_key)
             return []
         
         exercise_id_list = exercise_id_list_doc.get("exercise_id_list", None)
 
         if exercise_id_list is None or not len(exercise_id_list):
-            print(f"Exercise list not found for key '{exercise_key}'.")
+            logger.debug("Exercise list not found for key '%s'.", exercise_key)
             return []
         
         output_exercise_ids = []
@@ -872,7 +1170,7 @@ class GlobalContainer:
             exercise = self.exercises_collection.find_one({"exercise_id": exercise_id})
 
             if not exercise:
-                print(f"Exercise ID '{exercise_id}' not found in the database.")
+                logger.warning("Exercise ID '%s' not found in the database.", exercise_id)
                 continue
 
             light_exercise = {}
@@ -894,46 +1192,104 @@ class GlobalContainer:
         """
 
         if not language in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{language}' for user {user_id}.")
+            logger.warning("Unsupported language '%s' for user %s.", language, user_id)
             return None
         
         if not isinstance(is_locked, bool):
-            print(f"Invalid is_locked value '{is_locked}' for user {user_id}.")
+            logger.warning("Invalid is_locked value '%s' for user %s.", is_locked, user_id)
             return None
 
-        # Get the words list from the user words collection
-        user_words = self.user_words_collection.find({"user_id": user_id, 
-                                                      "language": language,
-                                                      "is_locked": is_locked})
-        
-        user_words = list(user_words)
+        learner_words = self.get_learner_words(user_id, language)
+
+        user_words = learner_words.get_words(is_locked)
         
         if not len(user_words):
-            print(f"No words found for user {user_id}.")
+            logger.debug("No words found for user %s.", user_id)
             return None
         
         return user_words
+
+    def get_learner_words(self,
+                          user_id,
+                          language) -> LearnerWords:
+        """
+        Get all of the user's words (locked and unlocked) for a language, keyed by word_id.
+        Served from the per-process learner state cache when possible.
+        """
+
+        cache_key = (user_id, language)
+
+        learner_words = self.learner_state_cache.get(cache_key)
+
+        if learner_words is not None:
+            return learner_words
+
+        # Get the words list from the user words collection
+        user_words = self.user_words_collection.find({"user_id": user_id, 
+                                                      "language": language})
+
+        learner_words = LearnerWords({word["word_id"]: word for word in user_words})
+
+        self.learner_state_cache.put(cache_key, learner_words)
+
+        return learner_words
+
+    def update_cached_user_word(self,
+                                user_id,
+                                language,
+                                word_id,
+                                fields) -> None:
+        """
+        Write-through: apply fields to the cached copy of a user word, if the user's words are cached.
+        """
+
+        learner_words = self.learner_state_cache.peek((user_id, language))
+
+        if learner_words is not None:
+            learner_words.update(word_id, lambda user_word: {**user_word, **fields})
+
+    def unlock_user_word(self,
+                         user_id,
+                         word_id,
+                         language) -> None:
+        """
+        Unlock a word in the user's word list.
+        """
+
+        self.user_words_collection.update_one(
+            {"word_id": word_id,
+             "user_id": user_id},
+            {"$set": {
+                "is_locked": False
+            }}
+        )
+
+        self.update_cached_user_word(user_id,
+                                     language,
+                                     word_id,
+                                     {"is_locked": False})
         
     def check_if_should_unlock_new_word(self, 
-                                        user_id) -> int:
+                                        user_id,
+                                        user_context=None) -> int:
         """
         Check if the user should unlock a new word based on their score.
         """
         
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
         
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return -1
         
         current_learning_language = user.get("current_learning_language", None)
         if current_learning_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{current_learning_language}' for user {user_id}.")
+            logger.warning("Unsupported language '%s' for user %s.", current_learning_language, user_id)
             return -1
 
         language_data = user.get("learning_languages", {}).get(current_learning_language, None)
         if language_data is None:
-            print(f"No language data found for user {user_id} in language '{current_learning_language}'.")
+            logger.debug("No language data found for user %s in language '%s'.", user_id, current_learning_language)
             return -1
         
         words = self.get_user_words(user_id, 
@@ -941,7 +1297,7 @@ class GlobalContainer:
                                     False)
 
         if words is None:
-            print(f"No words found for user {user_id}.")
+            logger.debug("No words found for user %s.", user_id)
             words = []
 
         locked_words = self.get_user_words(user_id, 
@@ -949,17 +1305,17 @@ class GlobalContainer:
                                            True)
 
         if locked_words is None:
-            print(f"No locked words found for user {user_id}.")
+            logger.debug("No locked words found for user %s.", user_id)
             locked_words = []
 
         if not len(locked_words):
 
-            print(f"No locked words found for user {user_id}.")
+            logger.debug("No locked words found for user %s.", user_id)
             # check if the user is at the max level
             current_level = language_data.get("current_level", 0)
             supported_levels = [0, 1, 2]
             if current_level >= len(supported_levels) - 1:
-                print(f"User {user_id} is at the max level for language '{current_learning_language}'.")
+                logger.debug("User %s is at the max level for language '%s'.", user_id, current_learning_language)
                 return 4
             
             # add next set of words to locked words
@@ -967,25 +1323,22 @@ class GlobalContainer:
                                                         current_level)
 
             if not this_level_words or not len(this_level_words):
-                print(f"No words found for level {current_level} in language '{current_learning_language}'.")
+                logger.warning("No words found for level %s in language '%s'.", current_level, current_learning_language)
                 return -1
 
-            this_level_word_ids = [word["_id"] for word in this_level_words]
+            learner_words = self.get_learner_words(user_id, 
+                                                   current_learning_language)
 
-            word_ids = [word["_id"] for word in words]
-            this_level_word_ids_not_in_words = [word for word in this_level_word_ids if word not in word_ids]
+            this_level_word_ids_not_in_words = [word["_id"] for word in this_level_words if word["_id"] not in learner_words]
             
             if not len(this_level_word_ids_not_in_words):
-                print(f"User {user_id} already has all words for level {current_level}.")
+                logger.debug("User %s already has all words for level %s.", user_id, current_level)
                 current_level += 1
                 # increase level
-                self.users_collection.update_one(
-                    {"_id": user_id},
-                    {"$set": {
-                        "learning_languages." + current_learning_language + ".current_level": current_level
-                    }}
-                )
-                print(f"User {user_id} is now at level {current_level}.")
+                self.update_user(user_id,
+                                 {"learning_languages." + current_learning_language + ".current_level": current_level},
+                                 user_context)
+                logger.info("User %s is now at level %s.", user_id, current_level)
                 return 3
             
             random_word_id = np.random.choice(this_level_word_ids_not_in_words)
@@ -995,7 +1348,7 @@ class GlobalContainer:
                                                         random_word_id,
                                                         current_learning_language)
             if not success:
-                print(f"Failed to add word '{random_word_id}' to locked words for user {user_id}.")
+                logger.warning("Failed to add word '%s' to locked words for user %s.", random_word_id, user_id)
                 return -1
             
             locked_words.append(random_word)
@@ -1003,15 +1356,11 @@ class GlobalContainer:
         if not len(words):
             unlocked_word = locked_words.pop(0)
             word_id = unlocked_word["word_id"]
-            self.user_words_collection.update_one(
-                {"word_id": word_id,
-                 "user_id": user_id},
-                {"$set": {
-                    "is_locked": False
-                }}
-            )
+            self.unlock_user_word(user_id,
+                                  word_id,
+                                  current_learning_language)
 
-            print(f"Unlocked new word for user {user_id}: {unlocked_word}.")
+            logger.debug("Unlocked new word for user %s: %s.", user_id, unlocked_word)
             return 1
         
         # count the number of words that need work
@@ -1019,7 +1368,7 @@ class GlobalContainer:
         for word in words:
             last_scores = word.get("last_scores", [])
             if not len(last_scores):
-                print(f"Word ID '{word['_id']}' has no last scores.")
+                logger.debug("Word ID '%s' has no last scores.", word['word_id'])
                 continue
             average_score = sum(last_scores) / len(last_scores)
             if average_score < 0.5:
@@ -1027,82 +1376,114 @@ class GlobalContainer:
 
         percentage_needs_work = needs_work_count / len(words) * 100
 
-        print(f"User {user_id} has {percentage_needs_work:.2f}% of words needing work.")
+        logger.debug("User %s has %.2f%% of words needing work.", user_id, percentage_needs_work)
 
         if percentage_needs_work > 50:
             # unlock a new word if more than 50% of words need work
             unlocked_word = locked_words.pop(0)
             word_id = unlocked_word["word_id"]
-            self.user_words_collection.update_one(
-                {"word_id": word_id,
-                 "user_id": user_id},
-                {"$set": {
-                    "is_locked": False
-                }}
-            )
-            print(f"Unlocked new word for user {user_id}: {unlocked_word}.")
+            self.unlock_user_word(user_id,
+                                  word_id,
+                                  current_learning_language)
+            logger.debug("Unlocked new word for user %s: %s.", user_id, unlocked_word)
             return 2
 
         else:
 
-            print(f"User {user_id} does not need to unlock a new word.")
+            logger.debug("User %s does not need to unlock a new word.", user_id)
             return 0
 
     def update_word_in_user_words(self, 
                                   user_id, 
                                   word_id, 
-                                  score) -> bool:
+                                  score,
+                                  user_context=None) -> bool:
         """
         Update the word in the user's word list in the database.
         """
         
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
         
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return False
         
         current_learning_language = user.get("current_learning_language", None)
         if current_learning_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{current_learning_language}' for user {user_id}.")
+            logger.warning("Unsupported language '%s' for user %s.", current_learning_language, user_id)
             return False
 
-        selected_word = self.user_words_collection.find_one({"word_id": word_id,
-                                                            "user_id": user_id})
+        return self.add_user_word_visit(user_id,
+                                        current_learning_language,
+                                        word_id,
+                                        score)
 
-        if not selected_word:
-            print(f"Word ID '{word_id}' not found in user's word list.")
-            return False
+    def add_user_word_visit(self,
+                            user_id,
+                            language,
+                            word_id,
+                            score) -> bool:
+        """
+        Append a score and visit time to a user word, keeping the last MAX_HISTORY_LENGTH entries.
+        """
 
         time_now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
 
-        selected_word["last_visited_times"].append(time_now)
-        selected_word["last_scores"].append(score)
-
-        # Limit the history size
-        if len(selected_word["last_visited_times"]) > MAX_HISTORY_LENGTH:
-            selected_word["last_visited_times"].pop(0)
-            selected_word["last_scores"].pop(0)
-
-        self.user_words_collection.update_one(
+        result = self.user_words_collection.update_one(
             {"word_id": word_id,
              "user_id": user_id},
-            {"$set": {
-                "last_visited_times": selected_word["last_visited_times"],
-                "last_scores": selected_word["last_scores"]
+            {"$push": {
+                "last_scores": {"$each": [score], "$slice": -MAX_HISTORY_LENGTH},
+                "last_visited_times": {"$each": [time_now], "$slice": -MAX_HISTORY_LENGTH}
             }}
         )
-        print(f"Updated word ID '{word_id}' for user {user_id}.")
 
-        return True
-    
-    def get_exercise_id(self,
-                        word_ids,
-                        current_learning_language,
-                        current_level) -> str:
-        """
-        Get an exercise id for the user from the database.
-        """
+        if not result.matched_count:
+            logger.warning("Word ID '%s' not found in user's word list.", word_id)
+            return False
+
+        learner_words = self.learner_state_cache.peek((user_id, language))
+
+        learner_words = self.learner_state_cache.peek((user_id, language))
+
+        if learner_words is not None:
+
+            def add_visit(user_word):
+                return {**user_word,
+                        "last_scores": (list(user_word.get("last_scores", [])) + [score])[-MAX_HISTORY_LENGTH:],
+                        "last_visited_times": (list(user_word.get("last_visited_times", [])) + [time_now])[-MAX_HISTORY_LENGTH:]}
+
+            if not learner_words.update(word_id, add_visit):
+                # added by another worker, read the whole list again next time
+                self.learner_state_cache.pop((user_id, language))
+
+        logger.debug("Updated word ID '%s' for user %s.", word_id, user_id)
+
+        return True
+    
+    def get_exercise_id(self,
+                        word_ids,
+                        current_learning_language,
+                        current_level,
+                        count_request=True) -> str:
+        """
+        Get an exercise id for the user from the database, waiting for it to be generated if needed.
+        """
+
+        return self.get_exercise_id_future(word_ids,
+                                           current_learning_language,
+                                           current_level,
+                                           count_request).result()
+
+    def get_exercise_id_future(self,
+                               word_ids,
+                               current_learning_language,
+                               current_level,
+                               count_request=True) -> concurrent.futures.Future:
+        """
+        Get a future of an exercise id for the user, done right away unless a new exercise is generated for it.
+        count_request is False for exercises prepared in advance, which the pool warmer should not count as demand.
+        """
 
         sorted_word_ids = sorted([str(word_id) for word_id in word_ids], key=lambda x: x.lower())
         sorted_word_ids_combined = "_".join(sorted_word_ids)
@@ -1111,36 +1492,58 @@ class GlobalContainer:
 
         exercise_key = f"{number_of_words_needed}__{current_learning_language}__{current_level}__{sorted_word_ids_combined}"
 
-        exercise_id_list_doc = self.exercises_id_lists_collection.find_one({"_id": exercise_key})
+        update = {"$set": {
+            "language": current_learning_language,
+            "level": current_level,
+            "word_ids": list(word_ids)
+        }}
 
-        if not exercise_id_list_doc:
-            print(f"Excersize document not found for key '{exercise_key}'.")
-            exercise_id_list_doc = empty_exercise_id_list_doc(exercise_key)
+        if count_request:
+            # count the request so the pool warmer knows which keys are hot, in the same round trip as the read
+            update["$inc"] = {"request_count": 1}
+            update["$set"]["last_requested_time"] = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
 
-        print(f"Excersize document found for key '{exercise_key}'.")
+        exercise_id_list_doc = self.exercises_id_lists_collection.find_one_and_update(
+            {"_id": exercise_key},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        logger.debug("Excersize document found for key '%s'.", exercise_key)
         exercise_id_list = exercise_id_list_doc.get("exercise_id_list", None)
 
         if exercise_id_list is None:
-            print(f"Exercise list not found for key '{exercise_key}'.")
+            logger.debug("Exercise list not found for key '%s'.", exercise_key)
             exercise_id_list = []
 
         if len(exercise_id_list) < MAX_NUMBER_OF_EXERCISES:
-            print("Not enough exercises found, creating new one.")
-            exercise_id_list = self.add_to_exercise_id_list(exercise_key,
-                                                            word_ids,
-                                                            current_learning_language,
-                                                            current_level)
+            logger.debug("Not enough exercises found, creating new one.")
+            increment_counter("language_app_exercise_pool_lookups_total", {"result": "miss"})
+            exercise_id_list_future = self.add_to_exercise_id_list_future(exercise_key,
+                                                                          word_ids,
+                                                                          current_learning_language,
+                                                                          current_level)
 
         else:
-            print("Enough exercises found, selecting one.")
-            exercise_id_list = self.revise_exercise_id_list(exercise_id_list)
+            logger.debug("Enough exercises found, selecting one.")
+            increment_counter("language_app_exercise_pool_lookups_total", {"result": "hit"})
+            exercise_id_list_future = completed_future(self.revise_exercise_id_list(exercise_key,
+                                                                                    exercise_id_list))
+
+        return chain_future(exercise_id_list_future,
+                            functools.partial(self.choose_exercise_id, exercise_key))
+
+    def choose_exercise_id(self,
+                           exercise_key,
+                           exercise_id_list) -> Optional[str]:
 
         if not exercise_id_list or not len(exercise_id_list):
-            print(f"No exercise id found for key '{exercise_key}'.")
+            logger.debug("No exercise id found for key '%s'.", exercise_key)
             return None
 
         exercise_id = np.random.choice(exercise_id_list)
-        print(f"Excersize found for key '{exercise_key}': {exercise_id}.")
+        logger.debug("Excersize found for key '%s': %s.", exercise_key, exercise_id)
 
         return exercise_id
     
@@ -1148,42 +1551,237 @@ class GlobalContainer:
                                 exercise_key,
                                 word_ids,
                                 current_learning_language,
-                                current_level) -> None:
+                                current_level) -> Optional[list]:
         
         """
-        Add a new exercise to the exercise list in the database.
+        Add a new exercise to the exercise list in the database and wait for the new list.
+        """
+
+        return self.add_to_exercise_id_list_future(exercise_key,
+                                                   word_ids,
+                                                   current_learning_language,
+                                                   current_level).result()
+
+    def add_to_exercise_id_list_future(self,
+                                       exercise_key,
+                                       word_ids,
+                                       current_learning_language,
+                                       current_level) -> concurrent.futures.Future:
+        
+        """
+        Start adding a new exercise to the exercise list in the database, returns a future of the new list.
+
+        Concurrent calls for the same key in this process share one generation,
+        and a lease in the database keeps other servers from generating for the
+        same key at the same time (they wait for its result instead).
+        """
+
+        return self.exercise_generation_flight.do_future(exercise_key,
+                                                         self.start_exercise_generation,
+                                                         exercise_key,
+                                                         word_ids,
+                                                         current_learning_language,
+                                                         current_level)
+
+    def acquire_exercise_generation_lease(self,
+                                          exercise_key) -> bool:
+        """
+        Try to become the only server generating an exercise for the key.
+        """
+
+        current_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+
+        try:
+            # matches only a missing or expired lease, otherwise the upsert collides with the held one
+            self.exercise_generation_leases_collection.update_one(
+                {"_id": exercise_key,
+                 "expires_at": {"$lt": current_time}},
+                {"$set": {
+                    "owner": self.server_id,
+                    "expires_at": current_time + EXERCISE_GENERATION_LEASE_TIMEOUT
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+
+        return True
+
+    def release_exercise_generation_lease(self,
+                                          exercise_key) -> None:
+
+        try:
+            self.exercise_generation_leases_collection.delete_one({"_id": exercise_key,
+                                                                   "owner": self.server_id})
+        except Exception as e:
+            logger.error("Error releasing exercise generation lease for key '%s': %s", exercise_key, e)
+
+    def wait_for_exercise_generation_lease(self,
+                                           exercise_key) -> Optional[list]:
+        """
+        Wait until the server holding the lease for the key has finished, then return the exercise list.
+        """
+
+        deadline = time.monotonic() + EXERCISE_GENERATION_LEASE_TIMEOUT
+
+        while time.monotonic() < deadline:
+
+            time.sleep(EXERCISE_GENERATION_LEASE_CHECK_INTERVAL)
+
+            lease = self.exercise_generation_leases_collection.find_one({"_id": exercise_key})
+
+            if lease is None:
+                break
+
+        exercise_id_list_doc = self.exercises_id_lists_collection.find_one({"_id": exercise_key},
+                                                                           projection={"exercise_id_list": 1})
+        
+        if exercise_id_list_doc is None:
+            return None
+        
+        return exercise_id_list_doc.get("exercise_id_list", None)
+
+    def start_exercise_generation(self,
+                                  exercise_key,
+                                  word_ids,
+                                  current_learning_language,
+                                  current_level) -> concurrent.futures.Future:
+        
+        if not self.acquire_exercise_generation_lease(exercise_key):
+            # rare (another server generates the same key), this waits on the calling thread
+            logger.debug("Exercise for key '%s' is being created by another server, waiting for it.", exercise_key)
+            return completed_future(self.wait_for_exercise_generation_lease(exercise_key))
+
+        try:
+            future = self.generate_exercise_for_key(exercise_key,
+                                                    word_ids,
+                                                    current_learning_language,
+                                                    current_level)
+        except Exception:
+            self.release_exercise_generation_lease(exercise_key)
+            raise
+
+        # the exercise is stored (or the generation failed) by the time the future is done
+        future.add_done_callback(lambda _: self.release_exercise_generation_lease(exercise_key))
+
+        return future
+
+    def get_exercise_generations_in_flight(self) -> int:
+
+        with self.exercise_generations_lock:
+            return self.exercise_generations_in_flight
+
+    def reserve_exercise_generation(self) -> bool:
+        """
+        Count a generation on the LLM event loop, False if MAX_IN_FLIGHT_EXERCISE_GENERATIONS are in flight.
+        """
+
+        with self.exercise_generations_lock:
+
+            if self.exercise_generations_in_flight >= MAX_IN_FLIGHT_EXERCISE_GENERATIONS:
+                return False
+
+            self.exercise_generations_in_flight += 1
+
+            return True
+
+    def generate_exercise_for_key(self,
+                                  exercise_key,
+                                  word_ids,
+                                  current_learning_language,
+                                  current_level) -> concurrent.futures.Future:
+        """
+        Generate an exercise for the key, returns a future of the new exercise list.
+
+        With the LLM's event loop the generation is scheduled on it and the
+        calling thread returns right away, the exercise is stored by the
+        exercise completion pool once the LLM has answered. Without it (or
+        with MAX_IN_FLIGHT_EXERCISE_GENERATIONS in flight) the calling thread
+        waits for the LLM.
         """
                          
-        print(f"Needs to create new exercise for key '{exercise_key}'.")
+        logger.debug("Needs to create new exercise for key '%s'.", exercise_key)
 
         word_values = [self.words_collection.find_one({"_id": word_id}) for word_id in word_ids]
         word_values = [word["word_value"] for word in word_values if word is not None]
         if not len(word_values) == len(word_ids):
-            print(f"Not all word keys found in the database for key '{exercise_key}' (word_values: {word_values}, word_ids: {word_ids}).")
-            return None
+            logger.warning("Not all word keys found in the database for key '%s' (word_values: %s, word_ids: %s).", exercise_key, word_values, word_ids)
+            return completed_future(None)
                 
         inspiration_exercises = self.get_inspiration_exercises(exercise_key)
         
-        exercise = None
-        exercise_id_list = []
-        num_tries = 0
-        while num_tries < NUMBER_OF_ATTEMPTS_TO_CREATE_EXERCISE:
-            num_tries += 1
-            try:
-                exercise = self.llm.create_exercise(word_values,
-                                                    current_learning_language,
-                                                    current_level,
-                                                    inspiration_exercises)
-                if exercise is not None:
-                    break
-                else:
-                    print(f"Failed to create exercise for key '{exercise_key}' on attempt {num_tries}. Retrying...")
-            except Exception as e:
-                print(f"Error creating exercise for key '{exercise_key}': {e}. Retrying... (Probably OpenAI API rate limit exceeded)")
-                time.sleep(10)
+        # retries (backoff, Retry-After, invalid outputs) are done by the LLM's retry policy
+        if self.llm.event_loop is None or not self.reserve_exercise_generation():
+            exercise = self.llm.create_exercise(word_values,
+                                                current_learning_language,
+                                                current_level,
+                                                inspiration_exercises)
+
+            return completed_future(self.store_generated_exercise(exercise_key,
+                                                                  word_ids,
+                                                                  exercise))
+
+        future = concurrent.futures.Future()
+
+        llm_future = self.llm.submit(self.llm.create_exercise_async(word_values,
+                                                                    current_learning_language,
+                                                                    current_level,
+                                                                    inspiration_exercises))
+        llm_future.add_done_callback(functools.partial(self.on_exercise_generated,
+                                                       exercise_key,
+                                                       word_ids,
+                                                       future))
+
+        return future
+
+    def on_exercise_generated(self,
+                              exercise_key,
+                              word_ids,
+                              future,
+                              llm_future) -> None:
+        """
+        Runs on the LLM event loop thread, the database writes are handed to the exercise completion pool.
+        """
+
+        with self.exercise_generations_lock:
+            self.exercise_generations_in_flight -= 1
+
+        was_queued = self.exercise_completion_pool.submit(self.complete_exercise_generation,
+                                                          exercise_key,
+                                                          word_ids,
+                                                          future,
+                                                          llm_future)
+
+        if not was_queued:
+            logger.warning("Exercise completion pool is stopped, dropping the exercise generated for key '%s'.", exercise_key)
+            future.set_result(None)
+
+    def complete_exercise_generation(self,
+                                     exercise_key,
+                                     word_ids,
+                                     future,
+                                     llm_future) -> None:
+
+        try:
+            exercise_id_list = self.store_generated_exercise(exercise_key,
+                                                             word_ids,
+                                                             llm_future.result())
+        except Exception as e:
+            future.set_exception(e)
+            raise
+
+        future.set_result(exercise_id_list)
+
+    def store_generated_exercise(self,
+                                 exercise_key,
+                                 word_ids,
+                                 exercise) -> Optional[list]:
+        """
+        Store a generated exercise and add it to the pool of its key, returns the new exercise list.
+        """
         
         if exercise is None:
-            print(f"Failed to create exercise for key '{exercise_key}'.")
+            logger.warning("Failed to create exercise for key '%s'.", exercise_key)
             return None
         
         exercise_id = str(uuid.uuid4())
@@ -1192,67 +1790,96 @@ class GlobalContainer:
         exercise["exercise_id"] = exercise_id
         exercise["created_at"] = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
 
-        exercise_id_list.append(exercise_id)
-        self.exercises_id_lists_collection.update_one(
-            {"_id": exercise_key},
-            {"$set": {
-                "exercise_id_list": exercise_id_list
-            }},
-            upsert=True
-        )
-        print(f"Created new exercise for key '{exercise_key}': {exercise}.")
-
+        # store the exercise before its id is visible in the pool
         self.exercises_collection.update_one(
             {"exercise_id": exercise["exercise_id"]},
             {"$set": exercise},
             upsert=True
         )
 
-        return exercise_id_list
+        # append atomically so concurrent appends and removals are not overwritten, keeping the newest exercises
+        previous_exercise_id_list_doc = self.exercises_id_lists_collection.find_one_and_update(
+            {"_id": exercise_key},
+            {"$push": {
+                "exercise_id_list": {
+                    "$each": [exercise_id],
+                    "$slice": -MAX_NUMBER_OF_EXERCISES
+                }
+            }},
+            projection={"exercise_id_list": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        logger.debug("Created new exercise for key '%s': %s.", exercise_key, exercise)
+
+        previous_exercise_id_list = (previous_exercise_id_list_doc or {}).get("exercise_id_list", [])
+        exercise_id_list = previous_exercise_id_list + [exercise_id]
+
+        # the pool was filled concurrently, the oldest exercises were dropped from it by the $slice
+        evicted_exercise_ids = exercise_id_list[:-MAX_NUMBER_OF_EXERCISES]
+
+        if len(evicted_exercise_ids):
+            logger.debug("Evicted %s exercises from the pool of key '%s'.", len(evicted_exercise_ids), exercise_key)
+            self.retire_exercises(evicted_exercise_ids)
+
+        return exercise_id_list[-MAX_NUMBER_OF_EXERCISES:]
+
+    def retire_exercises(self,
+                         exercise_ids) -> None:
+        """
+        Mark exercises removed from their pool, they are deleted by the clean up thread
+        once no learner has them as their current or prepared exercise.
+        """
+
+        self.exercises_collection.update_many({"exercise_id": {"$in": list(exercise_ids)}},
+                                              {"$set": {"retired_at": int(datetime.datetime.now(datetime.timezone.utc).timestamp())}})
     
     def revise_exercise_id_list(self,
+                                exercise_key,
                                 exercise_id_list) -> list:
         
-        thumbs_up_values = []
-        thumbs_down_values = []
-        thumb_volumes = []
-        thumb_averages = []
+        # one read for the stats of the whole pool
+        exercise_stats = self.exercise_stats_collection.find({"_id": {"$in": list(exercise_id_list)}})
+        exercise_stats = {stats["_id"]: stats for stats in exercise_stats}
+
+        # exercises with enough votes and an approval of at most MIN_EXERCISE_APPROVAL can be removed,
+        # the one with the lowest quality score (Wilson lower bound) first
+        quality_scores = []
         for exercise_id in exercise_id_list:
-            # exercise_id = exercise["exercise_id"]
-            thumbs_up = self.get_exercise_thumbs_up_or_down(exercise_id, True)
-            thumbs_down = self.get_exercise_thumbs_up_or_down(exercise_id, False)
-            thumbs_up_values.append(thumbs_up)
-            thumbs_down_values.append(thumbs_down)
-            thumb_volume = thumbs_up + thumbs_down
-            thumb_volumes.append(thumb_volume)
-
-            if thumb_volume < MIN_THUMB_VOLUME:
-                thumb_averages.append(1)
+            stats = exercise_stats.get(exercise_id, {})
+            thumbs_up = stats.get("thumbs_up", 0)
+            thumb_volume = thumbs_up + stats.get("thumbs_down", 0)
+
+            if thumb_volume < MIN_THUMB_VOLUME or thumbs_up / thumb_volume > MIN_EXERCISE_APPROVAL:
+                quality_scores.append(np.inf)
             else:
-                thumb_averages.append(thumbs_up / thumb_volume)
+                quality_scores.append(stats.get("quality_score", wilson_lower_bound(thumbs_up, thumb_volume)))
 
-        worst_exercise_index = np.argmin(thumb_averages)
-        worst_exercise_average = thumb_averages[worst_exercise_index]
+        worst_exercise_index = int(np.argmin(quality_scores))
 
-        if worst_exercise_average > 0.5:
-            print(f"All exercises are good, no need to revise.")
+        if quality_scores[worst_exercise_index] == np.inf:
+            logger.debug("All exercises are good, no need to revise.")
             return exercise_id_list
         
         # remove the worst exercise from the list
         worst_exercise_id = exercise_id_list.pop(worst_exercise_index)
-        print(f"Removing worst exercise id: {worst_exercise_id}.")
+        logger.debug("Removing worst exercise id: %s.", worst_exercise_id)
 
-        if 1:
-            # remove from the exercises_by_id collection
-            # worst_exercise_id = worst_exercise["exercise_id"]
-            self.exercises_collection.delete_one({"exercise_id": worst_exercise_id})
+        # remove only this id so exercises appended concurrently are kept
+        self.exercises_id_lists_collection.update_one(
+            {"_id": exercise_key},
+            {"$pull": {"exercise_id_list": worst_exercise_id}}
+        )
+
+        self.retire_exercises([worst_exercise_id])
             
         return exercise_id_list
         
     def submit_answer(self,
                       user_id,
                       exercise_id,
-                      answer) -> Tuple[bool, str, bool]:
+                      answer,
+                      user_context=None) -> Tuple[bool, str, bool]:
         
         """
         Submit the answer to the exercise in the database.
@@ -1261,17 +1888,20 @@ class GlobalContainer:
         if not exercise_id or not answer:
             return False, "Missing exercise_id or answer.", False
         
+        if user_context is None:
+            user_context = self.get_user_context(user_id)
+
         # get current user exercise
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return False, "User not found in the database.", False
         
         last_created_exercise_id = user.get("last_created_exercise_id", "")
 
         if not last_created_exercise_id == exercise_id:
-            print(f"Exercise ID '{exercise_id}' does not match user's last created exercise ID '{last_created_exercise_id}'.")
+            logger.warning("Exercise ID '%s' does not match user's last created exercise ID '%s'.", exercise_id, last_created_exercise_id)
             return False, "Exercise ID does not match user's last created exercise ID.", False
         
         # Validate the exercise_id and answer
@@ -1297,33 +1927,43 @@ class GlobalContainer:
         exercise = self.exercises_collection.find_one({"exercise_id": exercise_id})
 
         if not exercise:
-            print(f"Exercise ID '{exercise_id}' not found in the database.")
+            logger.warning("Exercise ID '%s' not found in the database.", exercise_id)
             return False, "Exercise ID not found in the database.", False
         
         exercise_criteria = exercise.get("criteria", None)
 
         if exercise_criteria is None:
-            print(f"Exercise ID '{exercise_id}' has no criteria.")
+            logger.warning("Exercise ID '%s' has no criteria.", exercise_id)
             return False, "Exercise ID has no criteria.", False
         
         word_ids = exercise.get("word_ids", None)
 
         if word_ids is None:
-            print(f"Exercise ID '{exercise_id}' has no word keys.")
+            logger.warning("Exercise ID '%s' has no word keys.", exercise_id)
             return False, "Exercise ID has no word keys.", False
         
         was_correct = True
 
         if exercise_criteria != answer:
-            print(f"Exercise ID '{exercise_id}' has wrong answer: {exercise_criteria} != {answer}.")
+            logger.debug("Exercise ID '%s' has wrong answer: %s != %s.", exercise_id, exercise_criteria, answer)
             was_correct = False
         
         self.update_user_word_score(user_id,
                                     word_ids,
-                                    was_correct)
+                                    was_correct,
+                                    exercise.get("language", user.get("current_learning_language", None)))
         
         if was_correct:
-            self.increase_user_xp(user_id, 1)
+            self.increase_user_xp(user_id, 1, user_context)
+
+        # exercises prepared before this answer were chosen with the old scores
+        if len(user.get("ready_exercise_ids", [])):
+            self.update_user(user_id,
+                             {"ready_exercise_ids": []},
+                             user_context)
+
+        # prepare the next exercise with the updated scores while the user reads the result
+        self.queue_next_exercise_preparation(user_id, user_context)
 
         if was_correct:
             message = "Correct answer."
@@ -1335,132 +1975,133 @@ class GlobalContainer:
 
     def increase_user_xp(self,
                             user_id,
-                            xp) -> bool:
+                            xp,
+                            user_context=None) -> bool:
         
         """
         Increase the user's XP in the database.
         """
 
-        user = self.users_collection.find_one({"_id": user_id})
-
-        if not user:
-            print(f"User {user_id} not found in the database.")
-            return False
-        
-        user_xp = user.get("xp", 0)
-        
-        if user_xp is None:
-            print(f"User {user_id} has no XP.")
-            user_xp = 0
-
-        user_xp += xp
-
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "xp": user_xp
-            }}
-        )
-        print(f"User {user_id} XP increased by {xp}. New XP: {user_xp}.")
+        self.increment_user(user_id,
+                            {"xp": xp},
+                            user_context)
+        logger.debug("User %s XP increased by %s.", user_id, xp)
 
         return True
         
     def update_user_word_score(self,
                                 user_id,
                                 word_ids,
-                                was_correct) -> bool:
+                                was_correct,
+                                language) -> bool:
         
         """
         Update the user's word score in the database.
         """
 
-        for word_id in word_ids:
-
-            user_word = self.user_words_collection.find_one({"word_id": word_id,
-                                                             "user_id": user_id})
-            
-            if not user_word:
-                print(f"Word ID '{word_id}' not found in user's word list.")
-                continue
-            
-            last_scores = user_word.get("last_scores", None)
-
-            if last_scores is None:
-                print(f"Word ID '{word_id}' has no last scores.")
-                last_scores = []
-
-            last_visited_times = user_word.get("last_visited_times", None)
+        success = True
 
-            if last_visited_times is None:
-                print(f"Word ID '{word_id}' has no last visited times.")
-                last_visited_times = []
-
-            # append new score and time
-
-            time_now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
-
-            last_scores.append(1 if was_correct else 0)
-            last_visited_times.append(time_now)
-
-            # Limit the history size
+        for word_id in word_ids:
 
-            if len(last_scores) > MAX_HISTORY_LENGTH:
-                last_scores.pop(0)
-                last_visited_times.pop(0)
+            if not self.add_user_word_visit(user_id,
+                                            language,
+                                            word_id,
+                                            1 if was_correct else 0):
+                success = False
 
-            self.user_words_collection.update_one(
-                {"word_id": word_id,
-                 "user_id": user_id},
-                {"$set": {
-                    "last_scores": last_scores,
-                    "last_visited_times": last_visited_times
-                }}
-            )
-            print(f"Updated word ID '{word_id}' for user {user_id}.")
+        return success
 
     def get_created_exercise(self,
-                             user_id) -> Tuple[Optional[Dict[Any, Any]], bool]:
+                             user_id,
+                             user_context=None) -> Tuple[Optional[Dict[Any, Any]], bool]:
         
         """
         Get the created exercise for the user from the database.
         """
 
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return None, False
         
         last_created_exercise_id = user.get("last_created_exercise_id", "")
 
         if not last_created_exercise_id:
-            print(f"User {user_id} has no last created exercise ID.")
+            logger.debug("User %s has no last created exercise ID.", user_id)
             return None, False
         
         if last_created_exercise_id == "PROCESSING":
-            print(f"User {user_id} is currently creating a new exercise.")
+            logger.debug("User %s is currently creating a new exercise.", user_id)
             return None, True# also return True to indicate that the user is currently creating a new exercise
 
+        if last_created_exercise_id == "FAILED":
+            logger.debug("Creating a new exercise failed for user %s.", user_id)
+            return None, False
+
         exercise = self.exercises_collection.find_one({"exercise_id": last_created_exercise_id})
 
         if not exercise:
-            print(f"Exercise ID '{last_created_exercise_id}' not found in the database.")
+            logger.warning("Exercise ID '%s' not found in the database.", last_created_exercise_id)
             return None, False
         
         return exercise, True
+
+    def wait_for_created_exercise(self,
+                                  user_id,
+                                  user_context=None,
+                                  timeout=WAIT_FOR_CREATED_EXERCISE_TIMEOUT) -> Tuple[Optional[Dict[Any, Any]], bool]:
+        
+        """
+        Like get_created_exercise, but while the exercise is being created wait for it
+        (up to timeout seconds) instead of returning right away.
+        """
+
+        # subscribe before reading so a notification between the read and the wait is not missed
+        event = self.exercise_notifier.subscribe(user_id)
+
+        try:
+            deadline = time.monotonic() + timeout
+
+            (exercise, 
+             success) = self.get_created_exercise(user_id, user_context)
+
+            while exercise is None and success:
+
+                remaining_time = deadline - time.monotonic()
+
+                if remaining_time <= 0:
+                    break
+
+                # woken up by this process, or check the database in case another worker created it
+                event.wait(min(remaining_time, WAIT_FOR_CREATED_EXERCISE_CHECK_INTERVAL))
+                event.clear()
+
+                (exercise, 
+                 success) = self.get_created_exercise(user_id, self.get_user_context(user_id))
+
+            return exercise, success
+        
+        finally:
+            self.exercise_notifier.unsubscribe(user_id, event)
     
     def create_new_exercise(self,
-                            user_id) -> bool:
+                            user_id,
+                            user_context=None) -> Tuple[bool, bool]:
         
         """
         Get a new exercise for the user from the database.
+        Returns (success, is_overloaded), is_overloaded is True if the creation queue is full.
         """
 
-        user = self.users_collection.find_one({"_id": user_id})
+        if user_context is None:
+            user_context = self.get_user_context(user_id)
+
+        user = self.load_user(user_id, user_context)
 
         if not user:
-            print(f"User {user_id} not found in the database.")
-            return False
+            logger.warning("User %s not found in the database.", user_id)
+            return False, False
         
         last_created_exercise_id = user.get("last_created_exercise_id", "")
 
@@ -1470,96 +2111,278 @@ class GlobalContainer:
 
             current_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
             if current_time - last_created_exercise_time < TIMEOUT_TO_CREATE_NEW_EXERCISE:  # 1 minute
-                print(f"User {user_id} is already creating a new exercise.")
-                return False
+                logger.debug("User %s is already creating a new exercise.", user_id)
+                return False, False
+
+        ready_exercise_id = self.pop_ready_exercise_id(user_id, user_context)
+
+        if ready_exercise_id is not None:
+            logger.debug("Using prepared exercise '%s' for user %s.", ready_exercise_id, user_id)
+            self.update_user(user_id,
+                             {"last_created_exercise_id": ready_exercise_id,
+                              "last_created_exercise_time": int(datetime.datetime.now(datetime.timezone.utc).timestamp())},
+                             user_context)
+            # the next one is prepared once this one is answered, with the updated scores
+            return True, False
         
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "last_created_exercise_id": "PROCESSING",
-                "last_created_exercise_time": int(datetime.datetime.now(datetime.timezone.utc).timestamp())
-            }}
-        )
+        self.update_user(user_id,
+                         {"last_created_exercise_id": "PROCESSING",
+                          "last_created_exercise_time": int(datetime.datetime.now(datetime.timezone.utc).timestamp())},
+                         user_context)
 
         ##################
 
-        while len(self.create_exercise_threads) > MAX_CONCURRENT_EXERCISE_CREATIONS:
-            # wait for a thread to finish
-            time.sleep(1)
-            print(f"Waiting for a thread to finish. Current threads: {len(self.create_exercise_threads)}.")
-            for thread in self.create_exercise_threads:
-                if not thread.is_alive():
-                    self.create_exercise_threads.remove(thread)
-
-        print(f"creating new exercise for {user_id}")
-        create_exercise_thread = threading.Thread(target=self.create_new_exercise_inner,
-                                                    args=(user_id, user),
-                                                    daemon=True)
-        create_exercise_thread.start()
-        self.create_exercise_threads.append(create_exercise_thread)
+        logger.debug("creating new exercise for %s", user_id)
+        was_queued = self.exercise_creation_pool.submit(self.create_new_exercise_inner,
+                                                        user_id,
+                                                        dict(user))
 
-        return True
+        if not was_queued:
+            logger.warning("Too many exercises being created, could not create exercise for %s.", user_id)
+            self.update_user(user_id,
+                             {"last_created_exercise_id": "",
+                              "last_created_exercise_time": 0},
+                             user_context)
+            return False, True
+
+        return True, False
 
     def create_new_exercise_inner(self, 
                                   user_id,
-                                  user) -> bool:
+                                  user) -> None:
         
         """
         Create a new exercise for the user.
+
+        The worker does not wait for a generated exercise, the user is updated
+        and notified by the thread that completes it (see generate_exercise_for_key).
+        """
+
+        # the exercise is created outside of the request, so it gets its own context
+        user_context = UserContext(user_id, user)
+
+        try:
+            exercise_id_future = self.select_exercise_id(user_id, user_context)
+        except Exception as e:
+            logger.error("Error creating exercise for user %s: %s", user_id, e)
+            exercise_id_future = completed_future(None)
+
+        exercise_id_future.add_done_callback(functools.partial(self.finish_new_exercise,
+                                                               user_id,
+                                                               user_context))
+
+    def finish_new_exercise(self,
+                            user_id,
+                            user_context,
+                            exercise_id_future) -> bool:
+
+        try:
+            exercise_id = exercise_id_future.result()
+        except Exception as e:
+            logger.error("Error creating exercise for user %s: %s", user_id, e)
+            exercise_id = None
+
+        if not exercise_id:
+            logger.warning("Failed to get exercise ID for user %s.", user_id)
+
+            # waiters stop waiting right away instead of at their timeout, unless a newer request took over
+            self.users_collection.update_one(
+                {"_id": user_id,
+                 "last_created_exercise_id": "PROCESSING"},
+                {"$set": {"last_created_exercise_id": "FAILED"}}
+            )
+            self.exercise_notifier.notify(user_id)
+
+            return False
+        
+        logger.debug("Generated new exercise for user %s: %s.", user_id, exercise_id)
+
+        self.update_user(user_id,
+                         {"last_created_exercise_id": exercise_id},
+                         user_context)
+        logger.debug("User %s's last created exercise ID set to '%s'.", user_id, exercise_id)
+
+        self.exercise_notifier.notify(user_id)
+
+        return True
+
+    def select_exercise_id(self,
+                           user_id,
+                           user_context,
+                           count_request=True) -> concurrent.futures.Future:
+        
+        """
+        Select the words for the user's next exercise and get (or create) an exercise for them,
+        returns a future of the exercise id (None if there is none).
         """
 
+        user = user_context.user
+
         current_learning_language = user.get("current_learning_language", None)
         if current_learning_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{current_learning_language}' for user {user_id}.")
-            return False
+            logger.warning("Unsupported language '%s' for user %s.", current_learning_language, user_id)
+            return completed_future(None)
         
         current_level = user.get("learning_languages", {}).get(current_learning_language, {}).get("current_level", None)
         if current_level is None:
-            print(f"No current level found for user {user_id}.")
-            return False
+            logger.debug("No current level found for user %s.", user_id)
+            return completed_future(None)
         
         number_of_words_needed = 2
         if np.random.rand() < 0.5:
             number_of_words_needed = 1
 
-        print(f"searching for {number_of_words_needed} words for a new exercise for {user_id}")
-
-        word_ids = []
+        logger.debug("searching for %s words for a new exercise for %s", number_of_words_needed, user_id)
 
-        for _ in range(number_of_words_needed):
+        (word_ids,
+         success) = self.get_next_words(user_id,
+                                        number_of_words_needed,
+                                        user_context)
 
-            (word_id, 
-             success) = self.get_next_word(user_id)
-            
-            if not success:
-                print(f"Failed to get next word for user {user_id}.")
-                continue
-            
-            word_ids.append(word_id)
+        if not success:
+            logger.warning("Failed to get next words for user %s.", user_id)
+            return completed_future(None)
 
         if not len(word_ids):
-            print(f"No word IDs found for user {user_id}.")
+            logger.debug("No word IDs found for user %s.", user_id)
+            return completed_future(None)
+        
+        return self.get_exercise_id_future(word_ids,
+                                           current_learning_language,
+                                           current_level,
+                                           count_request)
+
+    def queue_next_exercise_preparation(self,
+                                        user_id,
+                                        user_context) -> bool:
+        
+        """
+        Prepare one more exercise for the user in the background if their ready queue is not full.
+        Skipped when the creation pool is busy, requested exercises go first.
+        """
+
+        user = user_context.user
+
+        if not user:
             return False
         
-        exercise_id = self.get_exercise_id(word_ids, 
-                                            current_learning_language,
-                                            current_level)
+        if len(user.get("ready_exercise_ids", [])) >= READY_EXERCISE_QUEUE_SIZE:
+            return False
         
-        if not exercise_id:
-            print(f"Failed to get exercise ID for user {user_id}.")
+        if self.exercise_creation_pool.get_queue_depth() > EXERCISE_CREATION_QUEUE_SIZE // 2:
+            logger.warning("Exercise creation pool is busy, not preparing an exercise for %s.", user_id)
             return False
+
+        with self.preparing_user_ids_lock:
+            if user_id in self.preparing_user_ids:
+                return False
+            self.preparing_user_ids.add(user_id)
+
+        was_queued = self.exercise_creation_pool.submit(self.prepare_next_exercise,
+                                                        user_id,
+                                                        dict(user))
         
-        print(f"Generated new exercise for user {user_id}: {exercise_id}.")
+        if not was_queued:
+            with self.preparing_user_ids_lock:
+                self.preparing_user_ids.discard(user_id)
 
-        self.users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "last_created_exercise_id": exercise_id
-            }}
-        )
-        print(f"User {user_id}'s last created exercise ID set to '{exercise_id}'.")
+        return was_queued
 
-        return True
+    def prepare_next_exercise(self,
+                              user_id,
+                              user) -> None:
+        
+        """
+        Select an exercise for the user and add it to their ready queue once it exists.
+        """
+
+        try:
+            exercise_id_future = self.select_exercise_id(user_id,
+                                                         UserContext(user_id, user),
+                                                         count_request=False)
+        except Exception:
+            with self.preparing_user_ids_lock:
+                self.preparing_user_ids.discard(user_id)
+            raise
+
+        exercise_id_future.add_done_callback(functools.partial(self.finish_prepared_exercise,
+                                                               user_id,
+                                                               user))
+
+    def finish_prepared_exercise(self,
+                                 user_id,
+                                 user,
+                                 exercise_id_future) -> bool:
+
+        try:
+            try:
+                exercise_id = exercise_id_future.result()
+            except Exception as e:
+                logger.error("Error preparing an exercise for user %s: %s", user_id, e)
+                exercise_id = None
+
+            if not exercise_id:
+                logger.warning("Failed to prepare an exercise for user %s.", user_id)
+                return False
+            
+            # only keep it if the user is still learning the same language and has not
+            # moved on to another exercise (it was chosen with the scores of the last answer)
+            self.users_collection.update_one(
+                {"_id": user_id,
+                 "current_learning_language": user.get("current_learning_language", None),
+                 "last_created_exercise_id": user.get("last_created_exercise_id", None)},
+                {"$push": {
+                    "ready_exercise_ids": {"$each": [exercise_id], "$slice": -READY_EXERCISE_QUEUE_SIZE}
+                }}
+            )
+
+            logger.debug("Prepared exercise '%s' for user %s.", exercise_id, user_id)
+
+            return True
+        
+        finally:
+            with self.preparing_user_ids_lock:
+                self.preparing_user_ids.discard(user_id)
+
+    def pop_ready_exercise_id(self,
+                              user_id,
+                              user_context) -> Optional[str]:
+        
+        """
+        Take the oldest prepared exercise from the user's ready queue, None if there is none.
+        """
+
+        user = user_context.user
+
+        if not user or not len(user.get("ready_exercise_ids", [])):
+            return None
+        
+        for _ in range(READY_EXERCISE_QUEUE_SIZE):
+
+            previous_user = self.users_collection.find_one_and_update(
+                {"_id": user_id,
+                 "ready_exercise_ids.0": {"$exists": True}},
+                {"$pop": {"ready_exercise_ids": -1}},
+                projection={"ready_exercise_ids": 1}
+            )
+
+            if not previous_user:
+                user_context.apply_set({"ready_exercise_ids": []})
+                return None
+            
+            ready_exercise_ids = previous_user.get("ready_exercise_ids", [])
+            user_context.apply_set({"ready_exercise_ids": ready_exercise_ids[1:]})
+
+            ready_exercise_id = ready_exercise_ids[0]
+
+            # the exercise may have been removed from its pool since it was prepared
+            if self.exercises_collection.find_one({"exercise_id": ready_exercise_id,
+                                                   "retired_at": {"$exists": False}}, {"_id": 1}):
+                return ready_exercise_id
+            
+            logger.debug("Prepared exercise '%s' was removed from its pool.", ready_exercise_id)
+
+        return None
     
     def apply_thumbs_up_or_down(self,
                                  user_id,
@@ -1572,76 +2395,66 @@ class GlobalContainer:
 
         # validate exercise_id
         if not exercise_id or not isinstance(exercise_id, str):
-            print(f"Invalid exercise_id '{exercise_id}' for user {user_id}.")
+            logger.warning("Invalid exercise_id '%s' for user %s.", exercise_id, user_id)
             return False
         
         try:
             uuid.UUID(exercise_id, version=4)
         except ValueError:
-            print(f"Exercise ID '{exercise_id}' is not a valid UUID for user {user_id}.")
-            return False
-        
-        # check if user already has thumbs up or down for this exercise
-        user_exercise_thumbs_up_or_down = self.user_thumbs_collection.find_one({
-            "user_id": user_id,
-            "exercise_id": exercise_id
-        })
-
-        if user_exercise_thumbs_up_or_down:
-            print(f"User {user_id} already has thumbs up or down for exercise ID '{exercise_id}'.")
+            logger.warning("Exercise ID '%s' is not a valid UUID for user %s.", exercise_id, user_id)
             return False
         
         # validate thumbs_up
         if not isinstance(thumbs_up, bool):
-            print(f"Invalid thumbs_up value '{thumbs_up}' for user {user_id}.")
+            logger.warning("Invalid thumbs_up value '%s' for user %s.", thumbs_up, user_id)
             return False
 
-        if thumbs_up:
-            exercise_thumbs_up_or_down = self.exercise_thumbs_up_collection.find_one({"exercise_id": exercise_id})
-        else:
-            exercise_thumbs_up_or_down = self.exercise_thumbs_down_collection.find_one({"exercise_id": exercise_id})
-
-        if not exercise_thumbs_up_or_down:
-            print(f"Exercise thumbs up or down not found for exercise ID '{exercise_id}'.")
-            exercise_thumbs_up_or_down = {
+        # the unique (user_id, exercise_id) index allows only one vote per user
+        try:
+            self.user_thumbs_collection.insert_one({
+                "user_id": user_id,
                 "exercise_id": exercise_id,
-                "up_or_down_value": 0
-            }
-
-        up_or_down_value = exercise_thumbs_up_or_down.get("up_or_down_value", None)
-
-        if not up_or_down_value:
-            up_or_down_value = 0
-
-        up_or_down_value += 1
+                "thumbs_up": thumbs_up
+            })
+        except DuplicateKeyError:
+            logger.debug("User %s already has thumbs up or down for exercise ID '%s'.", user_id, exercise_id)
+            return False
 
         if thumbs_up:
-            self.exercise_thumbs_up_collection.update_one(
-                {"exercise_id": exercise_id},
-                {"$set": {
-                    "exercise_id": exercise_id,
-                    "up_or_down_value": up_or_down_value
-                }},
-                upsert=True
-            )
+            increment_key, other_key = "thumbs_up", "thumbs_down"
         else:
-            self.exercise_thumbs_down_collection.update_one(
-                {"exercise_id": exercise_id},
-                {"$set": {
-                    "exercise_id": exercise_id,
-                    "up_or_down_value": up_or_down_value
-                }},
-                upsert=True
+            increment_key, other_key = "thumbs_down", "thumbs_up"
+
+        try:
+            exercise_stats = self.exercise_stats_collection.find_one_and_update(
+                {"_id": exercise_id},
+                {"$inc": {increment_key: 1},
+                 "$setOnInsert": {other_key: 0}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
+        except Exception as e:
+            # undo the vote, otherwise it is never counted and the unique index blocks a retry
+            self.user_thumbs_collection.delete_one({"user_id": user_id,
+                                                    "exercise_id": exercise_id})
+            logger.error("Error counting thumbs %s for exercise %s: %s", 'up' if thumbs_up else 'down', exercise_id, e)
+            return False
 
-        # add to user exercise thumbs up or down collection
-        self.user_thumbs_collection.insert_one({
-            "user_id": user_id,
-            "exercise_id": exercise_id,
-            "thumbs_up": thumbs_up
-        })
+        thumbs_up_count = exercise_stats.get("thumbs_up", 0)
+        thumbs_down_count = exercise_stats.get("thumbs_down", 0)
 
-        print(f"Applied thumbs {'up' if thumbs_up else 'down'} to exercise {exercise_id} for user {user_id}.")
+        # only set the score if no other vote came in since, that vote will set it instead
+        self.exercise_stats_collection.update_one(
+            {"_id": exercise_id,
+             "thumbs_up": thumbs_up_count,
+             "thumbs_down": thumbs_down_count},
+            {"$set": {
+                "quality_score": wilson_lower_bound(thumbs_up_count,
+                                                    thumbs_up_count + thumbs_down_count)
+            }}
+        )
+
+        logger.debug("Applied thumbs %s to exercise %s for user %s.", 'up' if thumbs_up else 'down', exercise_id, user_id)
 
         return True
 
@@ -1653,22 +2466,13 @@ class GlobalContainer:
         Get the thumbs up or down count for the exercise in the database.
         """
 
-        if thumbs_up:
-            exercise_thumbs_up_or_down = self.exercise_thumbs_up_collection.find_one({"exercise_id": exercise_id})
-        else:
-            exercise_thumbs_up_or_down = self.exercise_thumbs_down_collection.find_one({"exercise_id": exercise_id})
+        exercise_stats = self.exercise_stats_collection.find_one({"_id": exercise_id})
 
-        if not exercise_thumbs_up_or_down:
-            print(f"Exercise {exercise_id} not found in the database.")
+        if not exercise_stats:
+            logger.warning("Exercise %s not found in the database.", exercise_id)
             return 0
         
-        up_or_down_value = exercise_thumbs_up_or_down.get("up_or_down_value", None)
-
-        if not up_or_down_value:
-            print(f"Exercise {exercise_id} has no thumbs up or down value.")
-            return 0
-            
-        return up_or_down_value
+        return exercise_stats.get("thumbs_up" if thumbs_up else "thumbs_down", 0)
         
     def add_word_to_locked_words(self, 
                                  user_id, 
@@ -1678,22 +2482,16 @@ class GlobalContainer:
         Add a word to the user's word list in the database.
         """
         
-        current_user_word = self.user_words_collection.find_one({"word_id": word_id,
-                                                                 "user_id": user_id})
-        if current_user_word:
-            print(f"Word ID '{word_id}' already exists in user {user_id}'s word list.")
-            return None, False
-        
         word_doc = self.words_collection.find_one({"_id": word_id})
 
         if not word_doc:
-            print(f"Word ID '{word_id}' not found in the words collection.")
+            logger.warning("Word ID '%s' not found in the words collection.", word_id)
             return None, False
         
         word_value = word_doc.get("word_value", None)
 
         if not word_value:
-            print(f"Word ID '{word_id}' has no word value.")
+            logger.warning("Word ID '%s' has no word value.", word_id)
             return None, False
 
         user_word_entry = empty_user_word_entry(word_id,
@@ -1701,57 +2499,90 @@ class GlobalContainer:
                                                 word_value,
                                                 current_learning_language)
 
-        self.user_words_collection.update_one(
+        # only insert if the word is not in the user's word list yet
+        result = self.user_words_collection.update_one(
             {"word_id": word_id,
              "user_id": user_id},
-            {"$set": user_word_entry},
+            {"$setOnInsert": user_word_entry},
             upsert=True
         )
+
+        if result.upserted_id is None:
+            logger.debug("Word ID '%s' already exists in user %s's word list.", word_id, user_id)
+            self.learner_state_cache.pop((user_id, current_learning_language))
+            return None, False
+
+        learner_words = self.learner_state_cache.peek((user_id, current_learning_language))
+
+        if learner_words is not None:
+            learner_words.add(word_id, {"_id": result.upserted_id, **user_word_entry})
         
-        print(f"Word ID '{word_id}' added to user {user_id}'s word list.")
+        logger.debug("Word ID '%s' added to user %s's word list.", word_id, user_id)
 
         return user_word_entry, True
 
-    def get_next_word(self, user_id) -> Tuple[Optional[str], bool]:
+    def get_next_word(self, user_id, user_context=None) -> Tuple[Optional[str], bool]:
         """
         Get the next word for the user from the database.
         """
+
+        (next_word_ids,
+         success) = self.get_next_words(user_id, 1, user_context)
+
+        if not success:
+            return None, False
+
+        return next_word_ids[0], True
+
+    def get_next_words(self,
+                       user_id,
+                       number_of_words,
+                       user_context=None) -> Tuple[Optional[List[str]], bool]:
+        """
+        Get the next words for the user from the database, loading the user's words only once.
+        """
         
-        user = self.users_collection.find_one({"_id": user_id})
+        user = self.load_user(user_id, user_context)
         
         if not user:
-            print(f"User {user_id} not found in the database.")
+            logger.warning("User %s not found in the database.", user_id)
             return None, False
         
         current_learning_language = user.get("current_learning_language", None)
         if current_learning_language not in SUPPORTED_LANGUAGES:
-            print(f"Unsupported language '{current_learning_language}' for user {user_id}.")
+            logger.warning("Unsupported language '%s' for user %s.", current_learning_language, user_id)
             return None, False
         
-        unlock_word_response = self.check_if_should_unlock_new_word(user_id)
+        for _ in range(number_of_words):
 
-        print(f"Unlock word response: {unlock_word_response}.")
+            unlock_word_response = self.check_if_should_unlock_new_word(user_id, user_context)
+
+            logger.debug("Unlock word response: %s.", unlock_word_response)
         
         user_words = self.get_user_words(user_id,
                                          current_learning_language,
                                          False)
         
         if user_words is None:
-            print(f"No user_words found for user {user_id}.")
+            logger.debug("No user_words found for user %s.", user_id)
             return None, False
         
         if not len(user_words):
-            print(f"No user_words found for user {user_id}.")
+            logger.debug("No user_words found for user %s.", user_id)
             return None, False
         
-        # calculate the next word based on the last visited times and scores
+        # calculate the next words based on the last visited times and scores
+
+        (word_ids,
+         last_scores,
+         last_visited_times) = pack_user_words(user_words)
 
-        next_word_id = next_word(word_ids=[word["word_id"] for word in user_words],
-                                  word_scores=[word["last_scores"] for word in user_words],
-                                  word_last_visited_times=[word["last_visited_times"] for word in user_words])
+        next_word_ids = next_words(users_word_ids=[word_ids] * number_of_words,
+                                   users_word_scores=[last_scores] * number_of_words,
+                                   users_word_last_visited_times=[last_visited_times] * number_of_words)
 
-        if next_word_id is None:
-            print(f"No next word found for user {user_id}.")
+        if not len(next_word_ids):
+            logger.debug("No next word found for user %s.", user_id)
             return None, False
         
-        return next_word_id, True
\ No newline at end of file
+        return next_word_ids, True
@@ -1,7 +1,12 @@
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Coroutine
+import concurrent.futures
+import logging
+import asyncio
 import json
+import time
 from unidecode import unidecode
+import openai
 
 import numpy as np
 
@@ -12,9 +17,27 @@ from ..util.prompts.two_blank import inspiration_exercises as TWO_BLANK_EXERCISE
 from ..util.prompts.vocabulary import INITIAL_WORD_PROMPT
 from ..util.constants import (SUPPORTED_LANGUAGES,
                               OPENAI_MODEL_NAME,
+                              USE_ASYNC_LLM_CLIENT,
+                              NUMBER_OF_ATTEMPTS_TO_CREATE_EXERCISE,
+                              LLM_RETRY_MAX_ATTEMPTS,
+                              LLM_RETRY_BASE_DELAY,
+                              LLM_RETRY_MAX_DELAY,
+                              LLM_RETRY_DEADLINE,
+                              STREAM_EXERCISE_GENERATION,
                               MAX_WORD_LENGTH,
+                              WORD_LEVEL_BATCH_SIZE,
                               POSSIBLE_CRITERIA)
-from ..util.inference import get_inference_client
+from ..util.inference import (get_inference_client,
+                              get_async_inference_client)
+from ..util.metrics import (increment_counter,
+                            observe_histogram)
+from .LLMResponseCache import LLMResponseCache
+from .EventLoopThread import EventLoopThread
+from .StreamingExerciseValidator import StreamingExerciseValidator
+from .RetryPolicy import RetryPolicy
+from .LLMRateGovernor import LLMRateGovernor
+
+logger = logging.getLogger("language_app_backend.obj.LLM")
 
 def get_language_string(language: str) -> str:
 
@@ -29,11 +52,13 @@ def remove_duplicate_words(json_data: Dict[str, Any]) -> Dict[str, Any]:
     words_so_far = set()
 
     for level, word_list in json_data.items():
+        # rebuilt instead of removing while iterating, which skipped words and was quadratic
+        unique_word_list = []
         for word in word_list:
-            if word in words_so_far:
-                json_data[level].remove(word)
-            else:
+            if word not in words_so_far:
                 words_so_far.add(word)
+                unique_word_list.append(word)
+        json_data[level] = unique_word_list
 
     return json_data
 
@@ -60,11 +85,11 @@ def validate_exercise(exercise: Dict[str, Any],
     number_of_keys = len(exercise.keys())
 
     if number_of_keys != 4:
-        print(f"Invalid number of keys in JSON: {number_of_keys}")
+        logger.warning("Invalid number of keys in JSON: %s", number_of_keys)
         return False
     
     if not "initial_strings" in exercise or not "middle_strings" in exercise or not "final_strings" in exercise or not "criteria" in exercise:
-        print(f"Invalid keys in JSON: {exercise.keys()}")
+        logger.warning("Invalid keys in JSON: %s", exercise.keys())
         return False
     
     output_initial_strings = exercise["initial_strings"]
@@ -74,57 +99,57 @@ def validate_exercise(exercise: Dict[str, Any],
 
     # check if the number of initial strings is correct
     if len(output_initial_strings) != 1:
-        print(f"Invalid number of initial strings in output: {len(output_initial_strings)}")
+        logger.warning("Invalid number of initial strings in output: %s", len(output_initial_strings))
         return False
     
     for initial_string in output_initial_strings:
         if not isinstance(initial_string, str):
-            print(f"Invalid initial string in output: {initial_string}")
+            logger.warning("Invalid initial string in output: %s", initial_string)
             return False
         
         if len(initial_string) < 1 or len(initial_string) > 100:
-            print(f"Invalid initial string length in output: {len(initial_string)}")
+            logger.warning("Invalid initial string length in output: %s", len(initial_string))
             return False
     
     # check if the number of middle strings is correct
     if len(output_middle_strings) != 1:
-        print(f"Invalid number of middle strings in output: {len(output_middle_strings)}")
+        logger.warning("Invalid number of middle strings in output: %s", len(output_middle_strings))
         return False
     
     for middle_string in output_middle_strings:
         if not isinstance(middle_string, str):
-            print(f"Invalid middle string in output: {middle_string}")
+            logger.warning("Invalid middle string in output: %s", middle_string)
             return False
         
         if len(middle_string) < 1 or len(middle_string) > 100:
-            print(f"Invalid middle string length in output: {len(middle_string)}")
+            logger.warning("Invalid middle string length in output: %s", len(middle_string))
             return False
     
     # check if the number of final strings is correct
     if len(output_final_strings) < 2 or len(output_final_strings) > 4:
-        print(f"Invalid number of final strings in output: {len(output_final_strings)}")
+        logger.warning("Invalid number of final strings in output: %s", len(output_final_strings))
         return False
     
     for final_string in output_final_strings:
         if not isinstance(final_string, str):
-            print(f"Invalid final string in output: {final_string}")
+            logger.warning("Invalid final string in output: %s", final_string)
             return False
         
         if len(final_string) < 1 or len(final_string) > 100:
-            print(f"Invalid final string length in output: {len(final_string)}")
+            logger.warning("Invalid final string length in output: %s", len(final_string))
             return False
 
     if isinstance(output_criteria, list) and len(output_criteria) >= 1:
         output_criteria = output_criteria[0]
     
     if not isinstance(output_criteria, str):
-        print(f"Invalid criteria in output: {output_criteria}")
+        logger.warning("Invalid criteria in output: %s", output_criteria)
         return False
     
     output_criteria = unidecode(output_criteria).strip().lower()
     
     if not output_criteria in possible_criteria:
-        print(f"Invalid criteria in output: {output_criteria} not in {possible_criteria}")
+        logger.warning("Invalid criteria in output: %s not in %s", output_criteria, possible_criteria)
         return False
     
     return True
@@ -146,17 +171,344 @@ def get_inspiration_prompt(inspiration_exercises, is_one_blank):
 
 class LLM:
 
+    """
+    Queries to the LLM.
+
+    Every query has a blocking method (create_exercise, ...) and an awaitable
+    one (create_exercise_async, ...). With use_async_client the awaitables run
+    on a dedicated event loop thread: callers that must not hold a thread for
+    the whole query schedule them with submit (the GlobalContainer does for
+    exercise generation), the blocking methods are a bridge that waits for them.
+    """
+
     __slots__ = [
         "client",
+        "async_client",
+        "event_loop",
         "possible_criteria",
+        "response_cache",
+        "retry_policy",
+        "rate_governor",
     ]
-    def __init__(self) -> None:
+    def __init__(self,
+                 response_cache: Optional[LLMResponseCache] = None,
+                 use_async_client: bool = USE_ASYNC_LLM_CLIENT,
+                 rate_governor: Optional[LLMRateGovernor] = None) -> None:
         """
         Initialize the LLM class.
+
+        response_cache is used for deterministic queries (word levels, initial words),
+        rate_governor keeps all processes under the provider's rate limits.
         """
 
         self.client = get_inference_client()
         self.possible_criteria = POSSIBLE_CRITERIA
+        self.response_cache = response_cache
+        self.rate_governor = rate_governor
+        self.retry_policy = RetryPolicy(LLM_RETRY_MAX_ATTEMPTS,
+                                        LLM_RETRY_BASE_DELAY,
+                                        LLM_RETRY_MAX_DELAY,
+                                        LLM_RETRY_DEADLINE)
+
+        if use_async_client:
+            self.async_client = get_async_inference_client()
+            self.event_loop = EventLoopThread("llm-event-loop")
+        else:
+            self.async_client = None
+            self.event_loop = None
+
+    def run_sync(self,
+                 coroutine: Coroutine) -> Any:
+        """
+        Run an awaitable query on the event loop thread and wait for its result, the calling thread is blocked meanwhile.
+        """
+
+        return self.event_loop.run(coroutine)
+
+    def submit(self,
+               coroutine: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedule an awaitable query on the event loop thread without waiting for it.
+        Callbacks added to the future run on the loop thread, they must hand blocking work to another thread.
+        """
+
+        return self.event_loop.submit(coroutine)
+
+    def acquire_rate_budget(self,
+                            query_input,
+                            method) -> None:
+
+        if self.rate_governor is not None:
+            self.rate_governor.acquire(query_input, method)
+
+    async def acquire_rate_budget_async(self,
+                                        query_input,
+                                        method) -> None:
+
+        if self.rate_governor is not None:
+            await self.rate_governor.acquire_async(query_input, method)
+
+    def record_call_result(self,
+                           method,
+                           start_time,
+                           error=None,
+                           is_aborted=False) -> None:
+        """
+        Tell the rate governor how a call went, rate limits make it slow down and fast calls let it speed up.
+        is_aborted is True for streams stopped early because the output became invalid.
+        """
+
+        if error is not None:
+            status = type(error).__name__
+        elif is_aborted:
+            status = "aborted"
+        else:
+            status = "success"
+
+        observe_histogram("language_app_llm_request_duration_seconds",
+                          time.monotonic() - start_time,
+                          {"method": method, "status": status})
+
+        # the duration of an aborted stream says nothing about how fast the provider is
+        if self.rate_governor is None or is_aborted:
+            return
+        
+        if isinstance(error, openai.RateLimitError):
+            self.rate_governor.record_rate_limited()
+        elif error is None:
+            self.rate_governor.record_success(time.monotonic() - start_time)
+
+    def record_token_usage(self,
+                           method,
+                           query_input,
+                           output_text,
+                           usage=None) -> None:
+        """
+        Count the tokens of a call, estimated from the text (about 4 characters per token) when there is no usage (streams stopped early).
+        The reported output tokens also update the rate governor's estimate for the method.
+        """
+
+        if usage is not None:
+            input_tokens = usage.input_tokens
+            output_tokens = usage.output_tokens
+
+            if self.rate_governor is not None:
+                self.rate_governor.record_output_tokens(method, output_tokens)
+        else:
+            input_tokens = len(query_input) // 4
+            output_tokens = len(output_text) // 4
+
+        increment_counter("language_app_llm_tokens_total", {"method": method, "type": "input"}, input_tokens)
+        increment_counter("language_app_llm_tokens_total", {"method": method, "type": "output"}, output_tokens)
+
+    def get_rate_governor_stats(self) -> Optional[Dict[str, Any]]:
+
+        if self.rate_governor is None:
+            return None
+
+        return self.rate_governor.get_stats()
+
+    def get_output_text(self,
+                        query_input,
+                        method) -> str:
+
+        self.acquire_rate_budget(query_input, method)
+        start_time = time.monotonic()
+
+        try:
+            response = self.client.responses.create(
+                model=OPENAI_MODEL_NAME,
+                input=query_input
+            )
+        except Exception as e:
+            self.record_call_result(method, start_time, e)
+            raise
+
+        self.record_call_result(method, start_time)
+        self.record_token_usage(method, query_input, response.output_text, response.usage)
+
+        return response.output_text
+
+    async def get_output_text_async(self,
+                                    query_input,
+                                    method) -> str:
+
+        if self.async_client is None:
+            # created lazily so the awaitable methods also work without use_async_client
+            self.async_client = get_async_inference_client()
+
+        await self.acquire_rate_budget_async(query_input, method)
+        start_time = time.monotonic()
+
+        try:
+            response = await self.async_client.responses.create(
+                model=OPENAI_MODEL_NAME,
+                input=query_input
+            )
+        except Exception as e:
+            self.record_call_result(method, start_time, e)
+            raise
+
+        self.record_call_result(method, start_time)
+        self.record_token_usage(method, query_input, response.output_text, response.usage)
+
+        return response.output_text
+
+    def get_streamed_exercise_output_text(self,
+                                          query_input,
+                                          method) -> Optional[str]:
+        """
+        Stream the output of an exercise query, None if it was aborted because the output became invalid.
+        """
+
+        validator = StreamingExerciseValidator()
+        output_text = ""
+
+        self.acquire_rate_budget(query_input, method)
+        start_time = time.monotonic()
+
+        try:
+            stream = self.client.responses.create(
+                model=OPENAI_MODEL_NAME,
+                input=query_input,
+                stream=True
+            )
+        except Exception as e:
+            self.record_call_result(method, start_time, e)
+            raise
+
+        error = None
+        is_aborted = False
+
+        try:
+            for event in stream:
+
+                if event.type != "response.output_text.delta":
+                    continue
+
+                output_text += event.delta
+
+                if not validator.feed(event.delta):
+                    logger.warning("Aborted exercise generation after %s characters: %s", len(output_text), validator.error)
+                    is_aborted = True
+                    return None
+                
+                # anything after the exercise object is not needed
+                if validator.is_complete:
+                    break
+        except Exception as e:
+            # errors in the middle of the stream (rate limits included) are not successes
+            error = e
+            raise
+        finally:
+            stream.close()
+            self.record_call_result(method, start_time, error, is_aborted)
+            self.record_token_usage(method, query_input, output_text)
+
+        return output_text
+
+    async def get_streamed_exercise_output_text_async(self,
+                                                      query_input,
+                                                      method) -> Optional[str]:
+
+        if self.async_client is None:
+            self.async_client = get_async_inference_client()
+
+        validator = StreamingExerciseValidator()
+        output_text = ""
+
+        await self.acquire_rate_budget_async(query_input, method)
+        start_time = time.monotonic()
+
+        try:
+            stream = await self.async_client.responses.create(
+                model=OPENAI_MODEL_NAME,
+                input=query_input,
+                stream=True
+            )
+        except Exception as e:
+            self.record_call_result(method, start_time, e)
+            raise
+
+        error = None
+        is_aborted = False
+
+        try:
+            async for event in stream:
+
+                if event.type != "response.output_text.delta":
+                    continue
+
+                output_text += event.delta
+
+                if not validator.feed(event.delta):
+                    logger.warning("Aborted exercise generation after %s characters: %s", len(output_text), validator.error)
+                    is_aborted = True
+                    return None
+                
+                if validator.is_complete:
+                    break
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await stream.close()
+            self.record_call_result(method, start_time, error, is_aborted)
+            self.record_token_usage(method, query_input, output_text)
+
+        return output_text
+
+    def get_cached_output_text(self,
+                               query_input) -> Optional[str]:
+        """
+        Get the output text of a previously validated response to the query, None if not cached.
+        """
+
+        if self.response_cache is None:
+            return None
+
+        return self.response_cache.get(OPENAI_MODEL_NAME, query_input)
+
+    def cache_output_text(self,
+                          query_input,
+                          output_text) -> None:
+
+        if self.response_cache is None:
+            return
+
+        self.response_cache.put(OPENAI_MODEL_NAME, query_input, output_text)
+
+    def get_cached_output_texts(self,
+                                query_inputs) -> Dict[str, str]:
+        """
+        Get the output texts of many cached queries at once, keyed by query, queries that are not cached are missing.
+        """
+
+        if self.response_cache is None:
+            return {}
+
+        return self.response_cache.get_many(OPENAI_MODEL_NAME, query_inputs)
+
+    def cache_output_texts(self,
+                           output_texts) -> None:
+
+        if self.response_cache is None:
+            return
+
+        self.response_cache.put_many(OPENAI_MODEL_NAME, output_texts)
+
+    def get_response_cache_stats(self) -> Optional[Dict[str, Any]]:
+
+        if self.response_cache is None:
+            return None
+
+        return self.response_cache.get_stats()
+
+    def get_retry_stats(self) -> Dict[str, Dict[str, int]]:
+
+        return self.retry_policy.get_stats()
+
+    ##################################################################
 
     def create_exercise(self,
                         word_values,
@@ -167,16 +519,91 @@ class LLM:
         Create an exercise for the user from the database.
         """
 
-        exercise = {
-            "word_values": word_values,
-            "number_of_words": len(word_values),
-            "language": language,
-            "level": level,
-            "initial_strings": [],
-            "middle_strings": [],
-            "final_strings": [],
-            "criteria": []
-        }
+        if self.event_loop is not None:
+            return self.run_sync(self.create_exercise_async(word_values,
+                                                            language,
+                                                            level,
+                                                            inspiration_exercises))
+
+        return self.retry_policy.call("create_exercise",
+                                      self.try_create_exercise,
+                                      word_values,
+                                      language,
+                                      level,
+                                      inspiration_exercises,
+                                      max_attempts=NUMBER_OF_ATTEMPTS_TO_CREATE_EXERCISE)
+
+    def try_create_exercise(self,
+                            word_values,
+                            language,
+                            level,
+                            inspiration_exercises) -> Optional[Dict[Any, Any]]:
+
+        query_input = self.build_exercise_query(word_values,
+                                                language,
+                                                level,
+                                                inspiration_exercises)
+
+        if query_input is None:
+            return None
+
+        if STREAM_EXERCISE_GENERATION:
+            output_text = self.get_streamed_exercise_output_text(query_input, "create_exercise")
+            if output_text is None:
+                return None
+        else:
+            output_text = self.get_output_text(query_input, "create_exercise")
+
+        return self.parse_exercise_output(output_text,
+                                          word_values,
+                                          language,
+                                          level)
+
+    async def create_exercise_async(self,
+                                    word_values,
+                                    language,
+                                    level,
+                                    inspiration_exercises) -> Dict[Any, Any]:
+
+        return await self.retry_policy.call_async("create_exercise",
+                                                  self.try_create_exercise_async,
+                                                  word_values,
+                                                  language,
+                                                  level,
+                                                  inspiration_exercises,
+                                                  max_attempts=NUMBER_OF_ATTEMPTS_TO_CREATE_EXERCISE)
+
+    async def try_create_exercise_async(self,
+                                        word_values,
+                                        language,
+                                        level,
+                                        inspiration_exercises) -> Optional[Dict[Any, Any]]:
+
+        query_input = self.build_exercise_query(word_values,
+                                                language,
+                                                level,
+                                                inspiration_exercises)
+
+        if query_input is None:
+            return None
+
+        if STREAM_EXERCISE_GENERATION:
+            output_text = await self.get_streamed_exercise_output_text_async(query_input, "create_exercise")
+            if output_text is None:
+                return None
+        else:
+            output_text = await self.get_output_text_async(query_input, "create_exercise")
+
+        return self.parse_exercise_output(output_text,
+                                          word_values,
+                                          language,
+                                          level)
+
+    def build_exercise_query(self,
+                             word_values,
+                             language,
+                             level,
+                             inspiration_exercises) -> Optional[str]:
 
         is_one_blank = False
 
@@ -188,7 +615,7 @@ class LLM:
             query_input = TWO_BLANK_EXERCISE_START_PROMPT
             query_input += get_inspiration_prompt(inspiration_exercises, False)
         else:
-            print("Invalid number of words for exercise.")
+            logger.warning("Invalid number of words for exercise.")
             return None
 
         language_str = get_language_string(language)
@@ -204,25 +631,39 @@ class LLM:
         query_input = query_input.replace("[TARGET LEVEL]", level_str)
         query_input = query_input.replace("[TARGET WORDS]", words_str)
 
-        response = self.client.responses.create(
-            model=OPENAI_MODEL_NAME,
-            input=query_input
-        )
+        return query_input
+
+    def parse_exercise_output(self,
+                              output_text,
+                              word_values,
+                              language,
+                              level) -> Optional[Dict[Any, Any]]:
+
+        exercise = {
+            "word_values": word_values,
+            "number_of_words": len(word_values),
+            "language": language,
+            "level": level,
+            "initial_strings": [],
+            "middle_strings": [],
+            "final_strings": [],
+            "criteria": []
+        }
 
-        print(response.output_text)
+        logger.debug("LLM output: %s", output_text)
 
-        if not "{" in response.output_text or not "}" in response.output_text:
-            print("Invalid response format")
+        if not "{" in output_text or not "}" in output_text:
+            logger.warning("Invalid response format")
             return None
         
-        start_index = response.output_text.find("{")
-        end_index = response.output_text.rfind("}")
+        start_index = output_text.find("{")
+        end_index = output_text.rfind("}")
 
-        json_string = response.output_text[start_index:end_index + 1]
+        json_string = output_text[start_index:end_index + 1]
         try:
             json_data = json.loads(json_string)
         except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
+            logger.warning("Error decoding JSON: %s", e)
             return None
         
         is_valid = validate_exercise(json_data, 
@@ -230,7 +671,7 @@ class LLM:
                                      possible_criteria=self.possible_criteria)
 
         if not is_valid:
-            print("Invalid exercise format")
+            logger.warning("Invalid exercise format")
             return None
         
         exercise["initial_strings"] = json_data["initial_strings"]
@@ -246,49 +687,160 @@ class LLM:
         
         return exercise
     
-    def get_new_word(self,
-                     language,
-                     vocabulary_word_values) -> Optional[str]:
+    ##################################################################
+
+    def get_new_words(self,
+                      language,
+                      level,
+                      sample_word_values,
+                      number_of_words) -> Optional[List[str]]:
         
         """
-        Get a new word for the given language which is not already in the vocabulary.
+        Get candidate new words of the given level for the language.
+
+        Only sample_word_values (a few words of the level) are sent, so the prompt
+        does not grow with the vocabulary. The candidates must still be checked
+        for duplicates against the whole vocabulary.
         """
 
+        if self.event_loop is not None:
+            return self.run_sync(self.get_new_words_async(language,
+                                                          level,
+                                                          sample_word_values,
+                                                          number_of_words))
+
+        return self.retry_policy.call("get_new_words",
+                                      self.try_get_new_words,
+                                      language,
+                                      level,
+                                      sample_word_values,
+                                      number_of_words)
+
+    def try_get_new_words(self,
+                          language,
+                          level,
+                          sample_word_values,
+                          number_of_words) -> Optional[List[str]]:
+
+        query_input = self.build_new_words_query(language,
+                                                 level,
+                                                 sample_word_values,
+                                                 number_of_words)
+
+        if query_input is None:
+            return None
+
+        output_text = self.get_output_text(query_input, "get_new_words")
+
+        return self.parse_new_words_output(output_text,
+                                           sample_word_values)
+
+    async def get_new_words_async(self,
+                                  language,
+                                  level,
+                                  sample_word_values,
+                                  number_of_words) -> Optional[List[str]]:
+
+        return await self.retry_policy.call_async("get_new_words",
+                                                  self.try_get_new_words_async,
+                                                  language,
+                                                  level,
+                                                  sample_word_values,
+                                                  number_of_words)
+
+    async def try_get_new_words_async(self,
+                                      language,
+                                      level,
+                                      sample_word_values,
+                                      number_of_words) -> Optional[List[str]]:
+
+        query_input = self.build_new_words_query(language,
+                                                 level,
+                                                 sample_word_values,
+                                                 number_of_words)
+
+        if query_input is None:
+            return None
+
+        output_text = await self.get_output_text_async(query_input, "get_new_words")
+
+        return self.parse_new_words_output(output_text,
+                                           sample_word_values)
+
+    def build_new_words_query(self,
+                              language,
+                              level,
+                              sample_word_values,
+                              number_of_words) -> Optional[str]:
+
         if not language in SUPPORTED_LANGUAGES:
-            print(f"Language '{language}' is not supported.")
+            logger.warning("Language '%s' is not supported.", language)
             return None
         
         language_str = get_language_string(language)
+        level_str = ["A1", "A2", "B1"][level]
 
-        words_str = ", ".join(vocabulary_word_values)
-        query_input = f"Please suggest a new word in {language_str} that is not already in the vocabulary: {words_str}."
-        query_input += "\n\nPlease respond with only one word."
-        query_input += "\n\nNo explanation is needed, just the word."
+        query_input = f"Please suggest {number_of_words} common words in {language_str} at the CEFR level {level_str}."
+        query_input += f"\n\nThe vocabulary is large, these are some of the {level_str} words already in it, do not suggest them: {json.dumps(list(sample_word_values), ensure_ascii=False)}."
+        query_input += "\n\nPlease respond with only a JSON list of single words (no spaces)."
+        query_input += "\n\nNo explanation is needed, just the JSON list."
 
-        response = self.client.responses.create(
-            model=OPENAI_MODEL_NAME,
-            input=query_input
-        )
+        return query_input
 
-        print(response.output_text)
+    def parse_new_words_output(self,
+                               output_text,
+                               sample_word_values) -> Optional[List[str]]:
+        """
+        Get the valid candidate words from the output, None if there are none.
+        """
+
+        logger.debug("LLM output: %s", output_text)
 
-        if not isinstance(response.output_text, str):
-            print("Invalid response format")
+        if not "[" in output_text or not "]" in output_text:
+            logger.warning("Invalid response format")
             return None
-        
 
-        output_value = response.output_text.strip()
-        if len(output_value) < 1 or len(output_value) > MAX_WORD_LENGTH:
-            print(f"Invalid output value: {output_value}")
+        start_index = output_text.find("[")
+        end_index = output_text.rfind("]")
+
+        json_string = output_text[start_index:end_index + 1]
+
+        try:
+            json_data = json.loads(json_string)
+        except json.JSONDecodeError as e:
+            logger.warning("Error decoding JSON: %s", e)
             return None
-        
 
-        if output_value in vocabulary_word_values:
-            print(f"Word '{output_value}' is already in the vocabulary.")
+        if not isinstance(json_data, list):
+            logger.warning("Invalid JSON format: %s", json_data)
+            return None
+
+        new_word_values = []
+        for word_value in json_data:
+
+            if not isinstance(word_value, str):
+                logger.warning("Invalid word format: %s", word_value)
+                continue
+
+            word_value = word_value.strip()
+            
+            if len(word_value) < 1 or len(word_value) > MAX_WORD_LENGTH or " " in word_value:
+                logger.warning("Invalid output value: %s", word_value)
+                continue
+
+            if word_value in sample_word_values or word_value in new_word_values:
+                continue
+
+            new_word_values.append(word_value)
+
+        if not len(new_word_values):
+            logger.warning("No valid new words in output.")
             return None
         
-        return output_value
+        return new_word_values
     
+    ##################################################################
+
     def get_word_level(self,
                        word_value,
                        language) -> Optional[int]:
@@ -297,8 +849,77 @@ class LLM:
         Get the level of the word for the given language.
         """
 
+        if self.event_loop is not None:
+            return self.run_sync(self.get_word_level_async(word_value,
+                                                           language))
+
+        return self.retry_policy.call("get_word_level",
+                                      self.try_get_word_level,
+                                      word_value,
+                                      language)
+
+    def try_get_word_level(self,
+                           word_value,
+                           language) -> Optional[int]:
+
+        query_input = self.build_word_level_query(word_value,
+                                                  language)
+
+        if query_input is None:
+            return None
+
+        output_text = self.get_cached_output_text(query_input)
+
+        if output_text is not None:
+            return self.parse_word_level_output(output_text)
+
+        output_text = self.get_output_text(query_input, "get_word_level")
+        output_value = self.parse_word_level_output(output_text)
+
+        if output_value is not None:
+            self.cache_output_text(query_input, output_text)
+
+        return output_value
+
+    async def get_word_level_async(self,
+                                   word_value,
+                                   language) -> Optional[int]:
+
+        return await self.retry_policy.call_async("get_word_level",
+                                                  self.try_get_word_level_async,
+                                                  word_value,
+                                                  language)
+
+    async def try_get_word_level_async(self,
+                                       word_value,
+                                       language) -> Optional[int]:
+
+        query_input = self.build_word_level_query(word_value,
+                                                  language)
+
+        if query_input is None:
+            return None
+
+        # the cache is read and written in a worker thread, pymongo would block the event loop
+        output_text = await asyncio.to_thread(self.get_cached_output_text, query_input)
+
+        if output_text is not None:
+            return self.parse_word_level_output(output_text)
+
+        output_text = await self.get_output_text_async(query_input, "get_word_level")
+        output_value = self.parse_word_level_output(output_text)
+
+        if output_value is not None:
+            await asyncio.to_thread(self.cache_output_text, query_input, output_text)
+
+        return output_value
+
+    def build_word_level_query(self,
+                               word_value,
+                               language) -> Optional[str]:
+
         if not language in SUPPORTED_LANGUAGES:
-            print(f"Language '{language}' is not supported.")
+            logger.warning("Language '%s' is not supported.", language)
             return None
         
         language_str = get_language_string(language)
@@ -307,26 +928,216 @@ class LLM:
         query_input += "\n\nPlease respond with only one integer value, 0-2, where 0 = A1, 1 = A2, 2 = B1."
         query_input += "\n\nNo explanation is needed, just the number."
 
+        return query_input
 
+    def parse_word_level_output(self,
+                                output_text) -> Optional[int]:
 
-        response = self.client.responses.create(
-            model=OPENAI_MODEL_NAME,
-            input=query_input
-        )
+        logger.debug("LLM output: %s", output_text)
 
-        print(response.output_text)
-
-        if not response.output_text.isdigit():
-            print("Invalid response format")
+        if not output_text.isdigit():
+            logger.warning("Invalid response format")
             return None
         
-        output_value = int(response.output_text)
+        output_value = int(output_text)
         if output_value < 0 or output_value > 2:
-            print(f"Invalid output value: {output_value}")
+            logger.warning("Invalid output value: %s", output_value)
             return None
         
         return output_value
 
+    def get_word_levels(self,
+                        word_values,
+                        language) -> Dict[str, int]:
+
+        """
+        Get the levels of many words for the given language, WORD_LEVEL_BATCH_SIZE words per query.
+        Words whose level could not be classified are missing from the result.
+        """
+
+        if self.event_loop is not None:
+            return self.run_sync(self.get_word_levels_async(word_values,
+                                                            language))
+
+        word_levels, uncached_word_values = self.get_cached_word_levels(word_values,
+                                                                        language)
+
+        for batch_i in range(0, len(uncached_word_values), WORD_LEVEL_BATCH_SIZE):
+
+            batch_word_values = uncached_word_values[batch_i:batch_i + WORD_LEVEL_BATCH_SIZE]
+
+            query_input = self.build_word_levels_query(batch_word_values,
+                                                       language)
+
+            if query_input is None:
+                break
+
+            output_text = self.retry_policy.call("get_word_levels",
+                                                 self.get_output_text,
+                                                 query_input,
+                                                 "get_word_levels")
+
+            if output_text is None:
+                continue
+
+            batch_word_levels = self.parse_word_levels_output(output_text,
+                                                              batch_word_values)
+            
+            self.cache_word_levels(batch_word_levels, language)
+            word_levels.update(batch_word_levels)
+
+        return word_levels
+
+    async def get_word_levels_async(self,
+                                    word_values,
+                                    language) -> Dict[str, int]:
+
+        # the cache is read and written in a worker thread, pymongo would block the event loop
+        word_levels, uncached_word_values = await asyncio.to_thread(self.get_cached_word_levels,
+                                                                    word_values,
+                                                                    language)
+
+        query_inputs = []
+        batches = []
+        for batch_i in range(0, len(uncached_word_values), WORD_LEVEL_BATCH_SIZE):
+
+            batch_word_values = uncached_word_values[batch_i:batch_i + WORD_LEVEL_BATCH_SIZE]
+
+            query_input = self.build_word_levels_query(batch_word_values,
+                                                       language)
+
+            if query_input is None:
+                break
+
+            query_inputs.append(query_input)
+            batches.append(batch_word_values)
+
+        # the batches are independent, so they are asked concurrently
+        output_texts = await asyncio.gather(*[self.retry_policy.call_async("get_word_levels",
+                                                                           self.get_output_text_async,
+                                                                           query_input,
+                                                                           "get_word_levels") for query_input in query_inputs])
+
+        new_word_levels = {}
+
+        for output_text, batch_word_values in zip(output_texts, batches):
+
+            if output_text is None:
+                continue
+
+            batch_word_levels = self.parse_word_levels_output(output_text,
+                                                              batch_word_values)
+            
+            word_levels.update(batch_word_levels)
+            new_word_levels.update(batch_word_levels)
+
+        await asyncio.to_thread(self.cache_word_levels, new_word_levels, language)
+
+        return word_levels
+
+    def get_cached_word_levels(self,
+                               word_values,
+                               language) -> Tuple[Dict[str, int], List[str]]:
+        """
+        Split the words into the ones with a cached level and the ones that still need a query.
+        Levels are cached under the single word query so both methods share them.
+        """
+
+        word_levels = {}
+        uncached_word_values = []
+
+        if not language in SUPPORTED_LANGUAGES:
+            logger.warning("Language '%s' is not supported.", language)
+            return word_levels, uncached_word_values
+
+        query_inputs = {word_value: self.build_word_level_query(word_value, language) for word_value in dict.fromkeys(word_values)}
+
+        # one query for all of the words
+        output_texts = self.get_cached_output_texts(list(query_inputs.values()))
+
+        for word_value, query_input in query_inputs.items():
+
+            output_text = output_texts.get(query_input, None)
+            output_value = None if output_text is None else self.parse_word_level_output(output_text)
+
+            if output_value is None:
+                uncached_word_values.append(word_value)
+            else:
+                word_levels[word_value] = output_value
+
+        return word_levels, uncached_word_values
+
+    def cache_word_levels(self,
+                          word_levels,
+                          language) -> None:
+
+        self.cache_output_texts({self.build_word_level_query(word_value, language): str(level)
+                                 for word_value, level in word_levels.items()})
+
+    def build_word_levels_query(self,
+                                word_values,
+                                language) -> Optional[str]:
+
+        if not language in SUPPORTED_LANGUAGES:
+            logger.warning("Language '%s' is not supported.", language)
+            return None
+        
+        language_str = get_language_string(language)
+
+        query_input = f"Please estimate the CEFR level of each of these words in {language_str}: {json.dumps(list(word_values), ensure_ascii=False)}."
+        query_input += "\n\nPlease respond with only a JSON object mapping each word, exactly as given, to one integer value, 0-2, where 0 = A1, 1 = A2, 2 = B1."
+        query_input += "\n\nNo explanation is needed, just the JSON object."
+
+        return query_input
+
+    def parse_word_levels_output(self,
+                                 output_text,
+                                 word_values) -> Dict[str, int]:
+        """
+        Get the valid levels from the output, invalid or missing words are left out.
+        """
+
+        if not "{" in output_text or not "}" in output_text:
+            logger.warning("Invalid response format")
+            return {}
+
+        start_index = output_text.find("{")
+        end_index = output_text.rfind("}")
+
+        json_string = output_text[start_index:end_index + 1]
+
+        try:
+            json_data = json.loads(json_string)
+        except json.JSONDecodeError as e:
+            logger.warning("Error decoding JSON: %s", e)
+            return {}
+        
+        if not isinstance(json_data, dict):
+            logger.warning("Invalid JSON format: %s", json_data)
+            return {}
+
+        word_levels = {}
+
+        for word_value in word_values:
+
+            output_value = json_data.get(word_value, None)
+
+            if isinstance(output_value, str) and output_value.strip().isdigit():
+                output_value = int(output_value.strip())
+
+            # bool is a subclass of int
+            if not isinstance(output_value, int) or isinstance(output_value, bool) or output_value < 0 or output_value > 2:
+                logger.warning("Invalid level for word '%s': %s", word_value, output_value)
+                continue
+
+            word_levels[word_value] = output_value
+
+        logger.debug("Got levels of %s of %s words.", len(word_levels), len(word_values))
+
+        return word_levels
+
+    ##################################################################
+
     def get_initial_words(self,
                           language):
         
@@ -334,42 +1145,103 @@ class LLM:
         Get the initial words for the given language.
         """
 
+        if self.event_loop is not None:
+            return self.run_sync(self.get_initial_words_async(language))
+
+        return self.retry_policy.call("get_initial_words",
+                                      self.try_get_initial_words,
+                                      language)
+
+    def try_get_initial_words(self,
+                              language):
+
+        query_input = self.build_initial_words_query(language)
+
+        if query_input is None:
+            return None
+
+        output_text = self.get_cached_output_text(query_input)
+
+        if output_text is not None:
+            return self.parse_initial_words_output(output_text, language)
+
+        output_text = self.get_output_text(query_input, "get_initial_words")
+        initial_words = self.parse_initial_words_output(output_text, language)
+
+        if initial_words is not None:
+            self.cache_output_text(query_input, output_text)
+
+        return initial_words
+
+    async def get_initial_words_async(self,
+                                      language):
+
+        return await self.retry_policy.call_async("get_initial_words",
+                                                  self.try_get_initial_words_async,
+                                                  language)
+
+    async def try_get_initial_words_async(self,
+                                          language):
+
+        query_input = self.build_initial_words_query(language)
+
+        if query_input is None:
+            return None
+
+        # the cache is read and written in a worker thread, pymongo would block the event loop
+        output_text = await asyncio.to_thread(self.get_cached_output_text, query_input)
+
+        if output_text is not None:
+            return self.parse_initial_words_output(output_text, language)
+
+        output_text = await self.get_output_text_async(query_input, "get_initial_words")
+        initial_words = self.parse_initial_words_output(output_text, language)
+
+        if initial_words is not None:
+            await asyncio.to_thread(self.cache_output_text, query_input, output_text)
+
+        return initial_words
+
+    def build_initial_words_query(self,
+                                  language) -> Optional[str]:
+
         if not language in SUPPORTED_LANGUAGES:
-            print(f"Language '{language}' is not supported.")
+            logger.warning("Language '%s' is not supported.", language)
             return None
         
         language_str = get_language_string(language)
 
         query_input = INITIAL_WORD_PROMPT.replace("[TARGET LANGUAGE]", language_str)
 
-        print(f"query_input: {query_input}")
+        logger.debug("query_input: %s", query_input)
+
+        return query_input
 
-        response = self.client.responses.create(
-            model=OPENAI_MODEL_NAME,
-            input=query_input
-        )
+    def parse_initial_words_output(self,
+                                   output_text,
+                                   language):
 
-        print(f"response.output_text: {response.output_text}")
+        logger.debug("response.output_text: %s", output_text)
 
-        if not "{" in response.output_text or not "}" in response.output_text:
-            print("Invalid response format")
+        if not "{" in output_text or not "}" in output_text:
+            logger.warning("Invalid response format")
             return None
 
-        start_index = response.output_text.find("{")
-        end_index = response.output_text.rfind("}")
+        start_index = output_text.find("{")
+        end_index = output_text.rfind("}")
 
-        json_string = response.output_text[start_index:end_index + 1]
+        json_string = output_text[start_index:end_index + 1]
 
         try:
             json_data = json.loads(json_string)
         except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
+            logger.warning("Error decoding JSON: %s", e)
             return None
         
         number_of_keys = len(json_data.keys())
         
         if number_of_keys != 3:
-            print(f"Invalid number of keys in JSON: {number_of_keys}")
+            logger.warning("Invalid number of keys in JSON: %s", number_of_keys)
             return None
         
         parsed_data = {}
@@ -378,16 +1250,16 @@ class LLM:
         for level, word_list in json_data.items():
 
             if not level.lower() in cefr_levels:
-                print(f"Invalid level in JSON: {level}")
+                logger.warning("Invalid level in JSON: %s", level)
                 return None
 
             if len(word_list) < 5:
-                print(f"Invalid number of words in level {level}: {len(word_list)}")
+                logger.warning("Invalid number of words in level %s: %s", level, len(word_list))
                 return None
             
             for word in word_list:
                 if not isinstance(word, str):
-                    print(f"Invalid word format in level {level}: {word}")
+                    logger.warning("Invalid word format in level %s: %s", level, word)
                     return None
                 
             cefr_level_index = cefr_levels.index(level.lower())
@@ -397,5 +1269,3 @@ class LLM:
         parsed_data = remove_duplicate_words(parsed_data)
 
         return {language: parsed_data}
-
-        
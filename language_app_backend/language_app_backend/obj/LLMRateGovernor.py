@@ -0,0 +1,346 @@
+
+from typing import Dict, Any
+from collections import deque
+import concurrent.futures
+import threading
+import logging
+import datetime
+import asyncio
+import time
+
+from pymongo import ASCENDING as PY_MONGO_ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from ..util.metrics import increment_counter
+from ..util.constants import (LLM_GOVERNOR_ADJUST_INTERVAL,
+                              LLM_GOVERNOR_OUTPUT_TOKENS_SMOOTHING,
+                              LLM_GOVERNOR_MIN_RATE_FACTOR,
+                              LLM_GOVERNOR_DECREASE_FACTOR,
+                              LLM_GOVERNOR_INCREASE_STEP,
+                              LLM_GOVERNOR_LATENCY_THRESHOLD)
+
+logger = logging.getLogger("language_app_backend.obj.LLMRateGovernor")
+
+RATE_FACTOR_ID = "rate_factor"
+
+class RateBudgetExhausted(Exception):
+
+    """
+    The shared rate budget stayed used up for the whole wait timeout.
+
+    Not retried: the budget is still used up, and retrying would only stack
+    another wait on top of this one.
+    """
+
+def estimate_tokens(query_input,
+                    estimated_output_tokens) -> int:
+
+    # about 4 characters per token
+    return len(query_input) // 4 + estimated_output_tokens
+
+class LLMRateGovernor:
+
+    """
+    Requests and tokens per minute budget shared by every worker and server through the database.
+
+    Each LLM call reserves one request and its estimated tokens in the
+    document of the current minute before it is sent, and waits for the next
+    minute when the budget is used up. The output tokens are estimated per
+    method, starting from estimated_output_tokens and following the usage the
+    provider reports. The budget is the provider limit times
+    a shared rate factor adapted with AIMD: it is cut when a call is rate
+    limited (429) or becomes slow, and raised a step at a time while calls
+    succeed quickly.
+    """
+
+    __slots__ = [
+        "collection",
+        "requests_per_minute",
+        "tokens_per_minute",
+        "estimated_output_tokens",
+        "default_estimated_output_tokens",
+        "wait_timeout",
+        "lock",
+        "rate_factor",
+        "last_time_read_rate_factor",
+        "last_time_adjusted",
+        "was_rate_limited",
+        "latencies",
+        "number_of_waits",
+        "number_of_rate_limits",
+        "number_of_database_errors",
+        "last_time_logged_database_error",
+        "adjust_executor",
+    ]
+    def __init__(self,
+                 collection,
+                 requests_per_minute: int,
+                 tokens_per_minute: int,
+                 estimated_output_tokens: Dict[str, int],
+                 default_estimated_output_tokens: int,
+                 wait_timeout: float) -> None:
+        """
+        estimated_output_tokens are the initial estimates of the output tokens per method,
+        default_estimated_output_tokens is used for other methods.
+        """
+
+        self.collection = collection
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.estimated_output_tokens = dict(estimated_output_tokens)
+        self.default_estimated_output_tokens = default_estimated_output_tokens
+        self.wait_timeout = wait_timeout
+
+        self.lock = threading.Lock()
+        self.rate_factor = 1.0
+        self.last_time_read_rate_factor = 0.0
+        self.last_time_adjusted = time.monotonic()
+        self.was_rate_limited = False
+        self.latencies = deque(maxlen=100)
+
+        self.number_of_waits = 0
+        self.number_of_rate_limits = 0
+        self.number_of_database_errors = 0
+        self.last_time_logged_database_error = 0.0
+
+        # the shared rate factor is updated in this thread, calls are recorded from the LLM event loop too
+        self.adjust_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                     thread_name_prefix="llm-rate-governor")
+
+        # window documents are removed by the database once expire_at has passed
+        self.collection.create_index([('expire_at', PY_MONGO_ASCENDING)], expireAfterSeconds=0)
+
+        try:
+            self.collection.update_one({"_id": RATE_FACTOR_ID},
+                                       {"$setOnInsert": {"value": 1.0,
+                                                         "last_decrease_time": 0,
+                                                         "last_increase_time": 0}},
+                                       upsert=True)
+        except DuplicateKeyError:
+            # created by another process at the same time
+            pass
+
+    def get_rate_factor(self) -> float:
+        """
+        Get the shared rate factor, read from the database at most every LLM_GOVERNOR_ADJUST_INTERVAL seconds.
+        """
+
+        if time.monotonic() - self.last_time_read_rate_factor < LLM_GOVERNOR_ADJUST_INTERVAL:
+            return self.rate_factor
+
+        try:
+            rate_factor_doc = self.collection.find_one({"_id": RATE_FACTOR_ID})
+        except Exception as e:
+            logger.error("Error reading LLM rate factor: %s", e)
+            rate_factor_doc = None
+
+        with self.lock:
+            if rate_factor_doc is not None:
+                self.rate_factor = rate_factor_doc.get("value", 1.0)
+            self.last_time_read_rate_factor = time.monotonic()
+
+        return self.rate_factor
+
+    def try_acquire(self,
+                    tokens) -> bool:
+        """
+        Reserve one request and the tokens in the current minute, False if its budget is used up.
+        """
+
+        rate_factor = self.get_rate_factor()
+        allowed_requests = max(1, int(self.requests_per_minute * rate_factor))
+        allowed_tokens = max(tokens, int(self.tokens_per_minute * rate_factor))
+
+        current_time = datetime.datetime.now(datetime.timezone.utc)
+        window_start = int(current_time.timestamp()) // 60 * 60
+
+        try:
+            # matches only a window with budget left, otherwise the upsert collides with the existing window
+            self.collection.update_one(
+                {"_id": f"window_{window_start}",
+                 "requests": {"$lt": allowed_requests},
+                 "tokens": {"$lte": allowed_tokens - tokens}},
+                {"$inc": {"requests": 1,
+                          "tokens": tokens},
+                 "$setOnInsert": {"expire_at": current_time + datetime.timedelta(minutes=5)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            # the provider still enforces its own limit, so do not stop generating when the database is unavailable
+            self.record_database_error(e)
+
+        return True
+
+    def record_database_error(self,
+                              error) -> None:
+        """
+        Count a failed reservation, logged at most every LLM_GOVERNOR_ADJUST_INTERVAL seconds with the number of failures since.
+        """
+
+        increment_counter("language_app_llm_rate_governor_database_errors_total")
+
+        with self.lock:
+
+            self.number_of_database_errors += 1
+
+            if time.monotonic() - self.last_time_logged_database_error < LLM_GOVERNOR_ADJUST_INTERVAL:
+                return
+
+            self.last_time_logged_database_error = time.monotonic()
+            number_of_database_errors = self.number_of_database_errors
+
+        logger.error("Error reserving LLM rate budget, calls are not limited while the database fails (%s failures so far): %s",
+                     number_of_database_errors, error)
+
+    def get_estimated_output_tokens(self,
+                                    method) -> int:
+
+        with self.lock:
+            return self.estimated_output_tokens.get(method, self.default_estimated_output_tokens)
+
+    def record_output_tokens(self,
+                             method,
+                             output_tokens) -> None:
+        """
+        Move the estimate of the method towards the output tokens the provider reported for a call.
+        """
+
+        with self.lock:
+            estimate = self.estimated_output_tokens.get(method, self.default_estimated_output_tokens)
+            estimate += LLM_GOVERNOR_OUTPUT_TOKENS_SMOOTHING * (output_tokens - estimate)
+            self.estimated_output_tokens[method] = max(1, int(round(estimate)))
+
+    def get_wait_time(self) -> float:
+
+        # until the next window, at most a few seconds so a raised rate factor is noticed
+        return min(5.0, 60 - time.time() % 60 + 0.05)
+
+    def acquire(self,
+                query_input,
+                method) -> None:
+        """
+        Wait until the call fits in the shared budget, raises RateBudgetExhausted after wait_timeout seconds.
+        """
+
+        tokens = estimate_tokens(query_input, self.get_estimated_output_tokens(method))
+        deadline = time.monotonic() + self.wait_timeout
+
+        while not self.try_acquire(tokens):
+
+            with self.lock:
+                self.number_of_waits += 1
+
+            wait_time = self.get_wait_time()
+
+            if time.monotonic() + wait_time > deadline:
+                raise RateBudgetExhausted("Shared LLM rate budget is used up.")
+
+            time.sleep(wait_time)
+
+    async def acquire_async(self,
+                            query_input,
+                            method) -> None:
+
+        tokens = estimate_tokens(query_input, self.get_estimated_output_tokens(method))
+        deadline = time.monotonic() + self.wait_timeout
+
+        # the database round trip runs in a thread so the event loop is not blocked
+        while not await asyncio.to_thread(self.try_acquire, tokens):
+
+            with self.lock:
+                self.number_of_waits += 1
+
+            wait_time = self.get_wait_time()
+
+            if time.monotonic() + wait_time > deadline:
+                raise RateBudgetExhausted("Shared LLM rate budget is used up.")
+
+            await asyncio.sleep(wait_time)
+
+    def record_success(self,
+                       latency) -> None:
+
+        with self.lock:
+            self.latencies.append(latency)
+
+        self.adjust_rate_factor()
+
+    def record_rate_limited(self) -> None:
+
+        with self.lock:
+            self.was_rate_limited = True
+            self.number_of_rate_limits += 1
+
+        self.adjust_rate_factor()
+
+    def adjust_rate_factor(self) -> None:
+        """
+        Apply what this process observed since its last adjustment to the shared rate factor, without waiting for the database.
+        """
+
+        with self.lock:
+
+            if not self.was_rate_limited and time.monotonic() - self.last_time_adjusted < LLM_GOVERNOR_ADJUST_INTERVAL:
+                return
+
+            # median latency of the calls since the last adjustment
+            is_slow = len(self.latencies) > 0 and sorted(self.latencies)[len(self.latencies) // 2] > LLM_GOVERNOR_LATENCY_THRESHOLD
+            should_decrease = self.was_rate_limited or is_slow
+
+            self.was_rate_limited = False
+            self.latencies.clear()
+            self.last_time_adjusted = time.monotonic()
+
+        self.adjust_executor.submit(self.update_shared_rate_factor, should_decrease)
+
+    def update_shared_rate_factor(self,
+                                  should_decrease) -> None:
+
+        current_time = time.time()
+
+        try:
+            rate_factor_doc = self.collection.find_one({"_id": RATE_FACTOR_ID})
+
+            if rate_factor_doc is None:
+                return
+
+            rate_factor = rate_factor_doc.get("value", 1.0)
+
+            # conditional on the value read and on the last change, so concurrent processes apply one change per interval
+            if should_decrease:
+                self.collection.update_one(
+                    {"_id": RATE_FACTOR_ID,
+                     "value": rate_factor,
+                     "last_decrease_time": {"$lt": current_time - LLM_GOVERNOR_ADJUST_INTERVAL}},
+                    {"$set": {"value": max(LLM_GOVERNOR_MIN_RATE_FACTOR, rate_factor * LLM_GOVERNOR_DECREASE_FACTOR),
+                              "last_decrease_time": current_time}}
+                )
+            elif rate_factor < 1.0:
+                self.collection.update_one(
+                    {"_id": RATE_FACTOR_ID,
+                     "value": rate_factor,
+                     "last_decrease_time": {"$lt": current_time - LLM_GOVERNOR_ADJUST_INTERVAL},
+                     "last_increase_time": {"$lt": current_time - LLM_GOVERNOR_ADJUST_INTERVAL}},
+                    {"$set": {"value": min(1.0, rate_factor + LLM_GOVERNOR_INCREASE_STEP),
+                              "last_increase_time": current_time}}
+                )
+        except Exception as e:
+            logger.error("Error adjusting LLM rate factor: %s", e)
+            return
+
+        # read the new value on the next call
+        with self.lock:
+            self.last_time_read_rate_factor = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+
+        with self.lock:
+            return {
+                "rate_factor": self.rate_factor,
+                "waits": self.number_of_waits,
+                "rate_limits": self.number_of_rate_limits,
+                "database_errors": self.number_of_database_errors,
+                "estimated_output_tokens": dict(self.estimated_output_tokens),
+            }
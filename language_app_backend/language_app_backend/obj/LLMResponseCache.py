@@ -0,0 +1,211 @@
+
+from typing import Optional, Dict, Any, List
+import threading
+import logging
+import hashlib
+import datetime
+
+from pymongo import ASCENDING as PY_MONGO_ASCENDING
+from pymongo import UpdateOne
+
+from ..util.cache import LRUCache
+
+logger = logging.getLogger("language_app_backend.obj.LLMResponseCache")
+
+class LLMResponseCache:
+
+    """
+    Cache of validated LLM responses for deterministic prompts, keyed by a hash of the model name and prompt.
+
+    An in-process LRU sits in front of a database collection shared by all
+    servers, the collection has a TTL index so entries are asked again once
+    they expire.
+    """
+
+    __slots__ = [
+        "collection",
+        "memory_cache",
+        "ttl",
+        "lock",
+        "memory_hits",
+        "database_hits",
+        "misses",
+    ]
+    def __init__(self,
+                 collection,
+                 max_memory_entries: int,
+                 ttl: int) -> None:
+
+        self.collection = collection
+        self.memory_cache = LRUCache(max_memory_entries, ttl)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.misses = 0
+
+        # documents are removed by the database once expire_at has passed
+        self.collection.create_index([('expire_at', PY_MONGO_ASCENDING)], expireAfterSeconds=0)
+
+    def get_key(self,
+                model_name: str,
+                prompt: str) -> str:
+
+        return hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self,
+            model_name: str,
+            prompt: str) -> Optional[str]:
+        """
+        Get the cached response text for the prompt, None if it has not been cached.
+        """
+
+        key = self.get_key(model_name, prompt)
+
+        output_text = self.memory_cache.get(key)
+
+        if output_text is not None:
+            with self.lock:
+                self.memory_hits += 1
+            return output_text
+
+        try:
+            response_doc = self.collection.find_one({"_id": key})
+        except Exception as e:
+            logger.error("Error reading LLM response cache: %s", e)
+            response_doc = None
+
+        # the TTL monitor only runs periodically, so expired documents may still be returned
+        if response_doc is None or response_doc["expire_at"].replace(tzinfo=datetime.timezone.utc) < datetime.datetime.now(datetime.timezone.utc):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        output_text = response_doc["output_text"]
+        self.memory_cache.put(key, output_text)
+
+        with self.lock:
+            self.database_hits += 1
+
+        return output_text
+
+    def get_many(self,
+                 model_name: str,
+                 prompts: List[str]) -> Dict[str, str]:
+        """
+        Get the cached response texts of many prompts with one database query, prompts that are not cached are missing.
+        """
+
+        output_texts = {}
+        database_keys = {}
+
+        for prompt in prompts:
+
+            key = self.get_key(model_name, prompt)
+            output_text = self.memory_cache.get(key)
+
+            if output_text is not None:
+                output_texts[prompt] = output_text
+            else:
+                database_keys[key] = prompt
+
+        number_of_memory_hits = len(output_texts)
+
+        if len(database_keys):
+            try:
+                response_docs = list(self.collection.find({"_id": {"$in": list(database_keys.keys())}}))
+            except Exception as e:
+                logger.error("Error reading LLM response cache: %s", e)
+                response_docs = []
+
+            current_time = datetime.datetime.now(datetime.timezone.utc)
+
+            for response_doc in response_docs:
+
+                # the TTL monitor only runs periodically, so expired documents may still be returned
+                if response_doc["expire_at"].replace(tzinfo=datetime.timezone.utc) < current_time:
+                    continue
+
+                output_texts[database_keys[response_doc["_id"]]] = response_doc["output_text"]
+                self.memory_cache.put(response_doc["_id"], response_doc["output_text"])
+
+        with self.lock:
+            self.memory_hits += number_of_memory_hits
+            self.database_hits += len(output_texts) - number_of_memory_hits
+            self.misses += len(database_keys) - (len(output_texts) - number_of_memory_hits)
+
+        return output_texts
+
+    def put_many(self,
+                 model_name: str,
+                 output_texts: Dict[str, str]) -> None:
+        """
+        Cache the responses of many prompts with one database write, only call this once they have been validated.
+        """
+
+        if not len(output_texts):
+            return
+
+        expire_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.ttl)
+        updates = []
+
+        for prompt, output_text in output_texts.items():
+
+            key = self.get_key(model_name, prompt)
+            self.memory_cache.put(key, output_text)
+
+            updates.append(UpdateOne({"_id": key},
+                                     {"$set": {
+                                         "model_name": model_name,
+                                         "output_text": output_text,
+                                         "expire_at": expire_at
+                                     }},
+                                     upsert=True))
+
+        try:
+            self.collection.bulk_write(updates, ordered=False)
+        except Exception as e:
+            logger.error("Error writing LLM response cache: %s", e)
+
+    def put(self,
+            model_name: str,
+            prompt: str,
+            output_text: str) -> None:
+        """
+        Cache a response, only call this once the response has been validated.
+        """
+
+        key = self.get_key(model_name, prompt)
+
+        self.memory_cache.put(key, output_text)
+
+        try:
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "model_name": model_name,
+                    "output_text": output_text,
+                    "expire_at": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.ttl)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error("Error writing LLM response cache: %s", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the hit/miss counters of the cache.
+        """
+
+        with self.lock:
+
+            lookups = self.memory_hits + self.database_hits + self.misses
+
+            return {
+                "memory_hits": self.memory_hits,
+                "database_hits": self.database_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.database_hits) / lookups if lookups else 0.0,
+                "memory_entries": self.memory_cache.get_stats()["entries"],
+            }
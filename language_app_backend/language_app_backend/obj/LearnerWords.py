@@ -0,0 +1,70 @@
+
+from typing import Callable, Dict, Any, List, Optional
+import threading
+
+class LearnerWords:
+
+    """
+    Cached words of one learner in one language (locked and unlocked), keyed by word_id.
+
+    Writes replace or add single entries in place under the learner's own lock,
+    so scoring a word costs the same whatever the size of the vocabulary, and
+    readers that iterate the words take the same lock. Entries are never
+    mutated, a write swaps in a new dictionary for the word.
+    """
+
+    __slots__ = [
+        "lock",
+        "words",
+    ]
+    def __init__(self,
+                 words: Dict[Any, Dict[Any, Any]]) -> None:
+
+        self.lock = threading.Lock()
+        self.words = words
+
+    def __contains__(self, word_id) -> bool:
+
+        return word_id in self.words
+
+    def __len__(self) -> int:
+
+        return len(self.words)
+
+    def get(self, word_id) -> Optional[Dict[Any, Any]]:
+
+        return self.words.get(word_id, None)
+
+    def get_words(self,
+                  is_locked: bool) -> List[Dict[Any, Any]]:
+        """
+        Get the locked or unlocked words.
+        """
+
+        with self.lock:
+            return [word for word in self.words.values() if word.get("is_locked", True) == is_locked]
+
+    def update(self,
+               word_id,
+               function: Callable[[Dict[Any, Any]], Dict[Any, Any]]) -> bool:
+        """
+        Replace a word by function(word), False if the word is not cached.
+        """
+
+        with self.lock:
+
+            word = self.words.get(word_id, None)
+
+            if word is None:
+                return False
+
+            self.words[word_id] = function(word)
+
+            return True
+
+    def add(self,
+            word_id,
+            word: Dict[Any, Any]) -> None:
+
+        with self.lock:
+            self.words[word_id] = word
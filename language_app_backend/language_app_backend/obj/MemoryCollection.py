@@ -0,0 +1,691 @@
+
+from typing import Dict, Any, List, Optional, Tuple, Set, Iterator, Callable
+import functools
+import threading
+import datetime
+import time
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import (InsertOneResult,
+                             InsertManyResult,
+                             UpdateResult,
+                             DeleteResult,
+                             BulkWriteResult)
+
+from ..util.documents import (MISSING,
+                              copy_document,
+                              freeze,
+                              get_field,
+                              match_document,
+                              get_equality_fields,
+                              apply_update,
+                              apply_projection,
+                              sort_documents)
+from ..util.constants import MEMORY_STORAGE_TTL_SWEEP_INTERVAL
+from ..util.round_trips import record_round_trip
+from ..util.metrics import observe_histogram
+
+def record_command(command_name,
+                   collection,
+                   duration) -> None:
+
+    """
+    Count an operation as the MongoDB command it stands for, in the round trips of the
+    current request or task and in the command metrics, as the command listeners do with pymongo.
+    """
+
+    record_round_trip(command_name, collection, duration)
+    observe_histogram("language_app_mongo_command_duration_seconds", duration, {"command": command_name,
+                                                                                 "collection": collection})
+
+def counted_as(command_name) -> Callable:
+
+    """
+    Count each call of a collection method as the MongoDB command it stands for (see record_command).
+    """
+
+    def decorator(method) -> Callable:
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+
+            start_time = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                record_command(command_name, self.name, time.perf_counter() - start_time)
+
+        return wrapper
+
+    return decorator
+
+def get_update_result(old_document,
+                      new_document,
+                      upserted_id) -> UpdateResult:
+
+    if upserted_id is not None:
+        return UpdateResult({"n": 1, "nModified": 0, "upserted": upserted_id}, True)
+
+    if new_document is None:
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    return UpdateResult({"n": 1, "nModified": int(new_document != old_document)}, True)
+
+class MemoryIndex:
+
+    """
+    Hash index on one or more fields, from the values of every prefix of the fields to the ids of the documents.
+    """
+
+    __slots__ = [
+        "name",
+        "keys",
+        "unique",
+        "expire_after_seconds",
+        "entries",
+    ]
+    def __init__(self,
+                 keys: List[Tuple[str, int]],
+                 unique: bool = False,
+                 expire_after_seconds: Optional[int] = None) -> None:
+
+        self.name = "_".join(f"{field}_{direction}" for field, direction in keys)
+        self.keys = keys
+        self.unique = unique
+        self.expire_after_seconds = expire_after_seconds
+        # one dict per prefix length, so {"user_id": ...} can use the (user_id, word_id) index
+        self.entries: List[Dict[Any, Set[Any]]] = [{} for _ in keys]
+
+    def get_fields(self) -> List[str]:
+
+        return [field for field, _ in self.keys]
+
+    def get_index_keys(self,
+                       document) -> List[Any]:
+
+        values = []
+        for field in self.get_fields():
+            value = get_field(document, field)
+            # a missing field is indexed as null, as in MongoDB
+            values.append(None if value is MISSING else freeze(value))
+
+        return [tuple(values[:prefix_length + 1]) for prefix_length in range(len(values))]
+
+    def add(self,
+            document_id,
+            document) -> None:
+
+        for prefix_entries, index_key in zip(self.entries, self.get_index_keys(document)):
+            prefix_entries.setdefault(index_key, set()).add(document_id)
+
+    def remove(self,
+               document_id,
+               document) -> None:
+
+        for prefix_entries, index_key in zip(self.entries, self.get_index_keys(document)):
+
+            document_ids = prefix_entries.get(index_key, None)
+
+            if document_ids is None:
+                continue
+
+            document_ids.discard(document_id)
+
+            if not len(document_ids):
+                del prefix_entries[index_key]
+
+    def get_conflict(self,
+                     document_id,
+                     document) -> Optional[Any]:
+        """
+        Get the id of another document with the same values, for unique indexes.
+        """
+
+        if not self.unique:
+            return None
+
+        index_key = self.get_index_keys(document)[-1]
+
+        for other_document_id in self.entries[-1].get(index_key, set()):
+            if other_document_id != document_id:
+                return other_document_id
+
+        return None
+
+    def lookup(self,
+               equality_fields) -> Optional[Set[Any]]:
+        """
+        Get the ids of the documents matching the longest prefix of the fields the query is equal on, None if there is none.
+        """
+
+        values = []
+        for field in self.get_fields():
+            if field not in equality_fields:
+                break
+            values.append(freeze(equality_fields[field]))
+
+        if not len(values):
+            return None
+
+        return self.entries[len(values) - 1].get(tuple(values), set())
+
+class MemoryCursor:
+
+    """
+    Result of MemoryCollection.find, sort, skip and limit apply when it is iterated.
+    """
+
+    __slots__ = [
+        "collection",
+        "query",
+        "projection",
+        "sort_keys",
+        "number_to_skip",
+        "number_to_return",
+    ]
+    def __init__(self,
+                 collection,
+                 query,
+                 projection) -> None:
+
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self.sort_keys = []
+        self.number_to_skip = 0
+        self.number_to_return = 0
+
+    def sort(self,
+             key_or_list,
+             direction: int = 1) -> "MemoryCursor":
+
+        if isinstance(key_or_list, str):
+            self.sort_keys = [(key_or_list, direction)]
+        else:
+            self.sort_keys = list(key_or_list)
+
+        return self
+
+    def skip(self,
+             number_to_skip) -> "MemoryCursor":
+
+        self.number_to_skip = number_to_skip
+
+        return self
+
+    def limit(self,
+              number_to_return) -> "MemoryCursor":
+
+        self.number_to_return = number_to_return
+
+        return self
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+
+        # sent when iterated, as with pymongo
+        record_command("find", self.collection.name, 0.0)
+
+        documents = self.collection.find_documents(self.query)
+
+        if len(self.sort_keys):
+            documents = sort_documents(documents, self.sort_keys)
+
+        documents = documents[self.number_to_skip:]
+
+        if self.number_to_return > 0:
+            documents = documents[:self.number_to_return]
+
+        return iter([apply_projection(copy_document(document), self.projection) for document in documents])
+
+class MemoryCollection:
+
+    """
+    In-process, indexed stand-in for a pymongo collection, with the part of its API used by the app.
+
+    Documents are kept by _id and copied in and out, so callers never share
+    them. Queries with equality on the leading fields of an index (or on _id)
+    only look at the matching documents, unique indexes raise DuplicateKeyError
+    and TTL indexes are swept every MEMORY_STORAGE_TTL_SWEEP_INTERVAL seconds.
+    """
+
+    __slots__ = [
+        "name",
+        "lock",
+        "documents",
+        "indexes",
+        "last_time_swept",
+    ]
+    def __init__(self,
+                 name: str) -> None:
+
+        self.name = name
+        self.lock = threading.RLock()
+        self.documents: Dict[Any, Dict[str, Any]] = {}
+        self.indexes: Dict[str, MemoryIndex] = {}
+        self.last_time_swept = time.monotonic()
+
+    ######################################################################
+    ### indexes ##########################################################
+    ######################################################################
+
+    @counted_as("createIndexes")
+    def create_index(self,
+                     keys,
+                     unique: bool = False,
+                     expireAfterSeconds: Optional[int] = None,
+                     **kwargs) -> str:
+
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+
+        index = MemoryIndex([tuple(key) for key in keys], unique, expireAfterSeconds)
+
+        with self.lock:
+
+            if index.name in self.indexes:
+                return index.name
+
+            for document_id, document in self.documents.items():
+                if index.get_conflict(document_id, document) is not None:
+                    raise DuplicateKeyError(f"Duplicate key for index '{index.name}' in collection '{self.name}'.")
+                index.add(document_id, document)
+
+            self.indexes[index.name] = index
+
+        return index.name
+
+    def get_index_specs(self) -> List[Dict[str, Any]]:
+
+        with self.lock:
+            return [{"keys": [list(key) for key in index.keys],
+                     "unique": index.unique,
+                     "expire_after_seconds": index.expire_after_seconds} for index in self.indexes.values()]
+
+    def check_unique_indexes(self,
+                             document_id,
+                             document) -> None:
+
+        for index in self.indexes.values():
+            if index.get_conflict(document_id, document) is not None:
+                raise DuplicateKeyError(f"Duplicate key for index '{index.name}' in collection '{self.name}'.")
+
+    def add_document(self,
+                     document) -> None:
+
+        document_id = document["_id"]
+
+        if document_id in self.documents:
+            raise DuplicateKeyError(f"Duplicate _id '{document_id}' in collection '{self.name}'.")
+
+        for index in self.indexes.values():
+            index.add(document_id, document)
+
+        try:
+            self.check_unique_indexes(document_id, document)
+        except DuplicateKeyError:
+            for index in self.indexes.values():
+                index.remove(document_id, document)
+            raise
+
+        self.documents[document_id] = document
+
+    def remove_document(self,
+                        document_id) -> None:
+
+        document = self.documents.pop(document_id)
+
+        for index in self.indexes.values():
+            index.remove(document_id, document)
+
+    def replace_document(self,
+                         document_id,
+                         old_document,
+                         new_document) -> None:
+
+        if new_document.get("_id", document_id) != document_id:
+            raise ValueError("The _id of a document can not be changed.")
+
+        for index in self.indexes.values():
+            index.remove(document_id, old_document)
+            index.add(document_id, new_document)
+
+        try:
+            self.check_unique_indexes(document_id, new_document)
+        except DuplicateKeyError:
+            for index in self.indexes.values():
+                index.remove(document_id, new_document)
+                index.add(document_id, old_document)
+            raise
+
+        self.documents[document_id] = new_document
+
+    def sweep_expired_documents(self) -> None:
+        """
+        Remove the documents whose TTL index field is older than the index's expireAfterSeconds.
+        """
+
+        if time.monotonic() - self.last_time_swept < MEMORY_STORAGE_TTL_SWEEP_INTERVAL:
+            return
+
+        self.last_time_swept = time.monotonic()
+
+        current_time = datetime.datetime.now(datetime.timezone.utc)
+
+        for index in self.indexes.values():
+
+            if index.expire_after_seconds is None:
+                continue
+
+            field = index.get_fields()[0]
+            expire_before = current_time - datetime.timedelta(seconds=index.expire_after_seconds)
+
+            expired_document_ids = []
+            for document_id, document in self.documents.items():
+                value = get_field(document, field)
+                if isinstance(value, datetime.datetime):
+                    if value.tzinfo is None:
+                        value = value.replace(tzinfo=datetime.timezone.utc)
+                    if value < expire_before:
+                        expired_document_ids.append(document_id)
+
+            for document_id in expired_document_ids:
+                self.remove_document(document_id)
+
+    ######################################################################
+    ### queries ##########################################################
+    ######################################################################
+
+    def get_candidate_ids(self,
+                          query) -> Optional[Set[Any]]:
+        """
+        Get the ids of the documents that can match the query using _id or the most selective index, None to scan all.
+        """
+
+        id_condition = query.get("_id", MISSING)
+
+        if id_condition is not MISSING:
+            if isinstance(id_condition, dict) and "$in" in id_condition:
+                return set(id_condition["$in"])
+            if not isinstance(id_condition, dict):
+                return {id_condition}
+
+        equality_fields = get_equality_fields(query)
+
+        if not len(equality_fields):
+            return None
+
+        candidate_ids = None
+
+        for index in self.indexes.values():
+
+            document_ids = index.lookup(equality_fields)
+
+            if document_ids is not None and (candidate_ids is None or len(document_ids) < len(candidate_ids)):
+                candidate_ids = document_ids
+
+        return candidate_ids
+
+    def find_documents(self,
+                       query,
+                       number_to_return: int = 0) -> List[Dict[str, Any]]:
+        """
+        Get the stored documents matching the query, not copied (they are replaced on update, never changed).
+        """
+
+        query = query or {}
+
+        with self.lock:
+
+            self.sweep_expired_documents()
+
+            candidate_ids = self.get_candidate_ids(query)
+
+            if candidate_ids is None:
+                candidates = self.documents.values()
+            else:
+                candidates = [self.documents[document_id] for document_id in candidate_ids if document_id in self.documents]
+
+            documents = []
+            for document in candidates:
+                if match_document(document, query):
+                    documents.append(document)
+                    if number_to_return and len(documents) >= number_to_return:
+                        break
+
+            return documents
+
+    def find(self,
+             filter=None,
+             projection=None,
+             **kwargs) -> MemoryCursor:
+
+        return MemoryCursor(self, filter, projection)
+
+    @counted_as("find")
+    def find_one(self,
+                 filter=None,
+                 projection=None,
+                 **kwargs) -> Optional[Dict[str, Any]]:
+
+        documents = self.find_documents(filter, number_to_return=1)
+
+        if not len(documents):
+            return None
+
+        return apply_projection(copy_document(documents[0]), projection)
+
+    @counted_as("aggregate")
+    def count_documents(self,
+                        filter,
+                        **kwargs) -> int:
+
+        return len(self.find_documents(filter))
+
+    ######################################################################
+    ### writes ###########################################################
+    ######################################################################
+
+    @counted_as("insert")
+    def insert_one(self,
+                   document,
+                   **kwargs) -> InsertOneResult:
+
+        # like pymongo, the _id is added to the caller's document
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+
+        with self.lock:
+            self.add_document(copy_document(document))
+
+        return InsertOneResult(document["_id"], True)
+
+    @counted_as("insert")
+    def insert_many(self,
+                    documents,
+                    ordered: bool = True,
+                    **kwargs) -> InsertManyResult:
+
+        inserted_ids = []
+
+        for document in documents:
+
+            if "_id" not in document:
+                document["_id"] = ObjectId()
+
+            with self.lock:
+                self.add_document(copy_document(document))
+
+            inserted_ids.append(document["_id"])
+
+        return InsertManyResult(inserted_ids, True)
+
+    def update_document(self,
+                        query,
+                        update,
+                        upsert) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Any]:
+        """
+        Update the first document matching the query, returns (document before, document after, upserted id).
+        """
+
+        with self.lock:
+
+            documents = self.find_documents(query, number_to_return=1)
+
+            if len(documents):
+
+                old_document = documents[0]
+                new_document = copy_document(old_document)
+                apply_update(new_document, update)
+
+                if new_document != old_document:
+                    self.replace_document(old_document["_id"], old_document, new_document)
+
+                return old_document, new_document, None
+
+            if not upsert:
+                return None, None, None
+
+            # the fields the query is equal on are part of the new document, as in MongoDB
+            new_document = {}
+            for path, value in get_equality_fields(query).items():
+                apply_update(new_document, {"$set": {path: value}})
+
+            apply_update(new_document, update, is_insert=True)
+
+            if "_id" not in new_document:
+                new_document["_id"] = ObjectId()
+
+            # raises DuplicateKeyError if the _id exists but did not match the rest of the query
+            self.add_document(new_document)
+
+            return None, new_document, new_document["_id"]
+
+    @counted_as("update")
+    def update_one(self,
+                   filter,
+                   update,
+                   upsert: bool = False,
+                   **kwargs) -> UpdateResult:
+
+        return get_update_result(*self.update_document(filter, update, upsert))
+
+    @counted_as("update")
+    def update_many(self,
+                    filter,
+                    update,
+                    upsert: bool = False,
+                    **kwargs) -> UpdateResult:
+
+        with self.lock:
+
+            documents = self.find_documents(filter)
+
+            if not len(documents):
+                return get_update_result(*self.update_document(filter, update, upsert))
+
+            number_modified = 0
+            for old_document in documents:
+                new_document = copy_document(old_document)
+                apply_update(new_document, update)
+
+                if new_document != old_document:
+                    self.replace_document(old_document["_id"], old_document, new_document)
+                    number_modified += 1
+
+        return UpdateResult({"n": len(documents), "nModified": number_modified}, True)
+
+    @counted_as("findAndModify")
+    def find_one_and_update(self,
+                            filter,
+                            update,
+                            projection=None,
+                            sort=None,
+                            upsert: bool = False,
+                            return_document: bool = ReturnDocument.BEFORE,
+                            **kwargs) -> Optional[Dict[str, Any]]:
+
+        old_document, new_document, _ = self.update_document(filter, update, upsert)
+
+        document = new_document if return_document == ReturnDocument.AFTER else old_document
+
+        if document is None:
+            return None
+
+        return apply_projection(copy_document(document), projection)
+
+    @counted_as("delete")
+    def delete_one(self,
+                   filter,
+                   **kwargs) -> DeleteResult:
+
+        with self.lock:
+
+            documents = self.find_documents(filter, number_to_return=1)
+
+            for document in documents:
+                self.remove_document(document["_id"])
+
+        return DeleteResult({"n": len(documents)}, True)
+
+    @counted_as("delete")
+    def delete_many(self,
+                    filter,
+                    **kwargs) -> DeleteResult:
+
+        with self.lock:
+
+            documents = self.find_documents(filter)
+
+            for document in documents:
+                self.remove_document(document["_id"])
+
+        return DeleteResult({"n": len(documents)}, True)
+
+    @counted_as("update")
+    def bulk_write(self,
+                   requests,
+                   ordered: bool = True,
+                   **kwargs) -> BulkWriteResult:
+        """
+        Run UpdateOne requests, the only kind the app sends in bulk.
+        """
+
+        number_matched = 0
+        number_modified = 0
+        upserted = []
+
+        for request_i, request in enumerate(requests):
+
+            # pymongo keeps the arguments of its write models in private attributes
+            result = get_update_result(*self.update_document(request._filter,
+                                                             request._doc,
+                                                             bool(request._upsert)))
+
+            number_matched += result.matched_count
+            number_modified += result.modified_count
+
+            if result.upserted_id is not None:
+                upserted.append({"index": request_i, "_id": result.upserted_id})
+
+        return BulkWriteResult({"nInserted": 0,
+                                "nMatched": number_matched,
+                                "nModified": number_modified,
+                                "nRemoved": 0,
+                                "nUpserted": len(upserted),
+                                "upserted": upserted,
+                                "writeErrors": [],
+                                "writeConcernErrors": []}, True)
+
+    ######################################################################
+    ### snapshots ########################################################
+    ######################################################################
+
+    def get_documents(self) -> List[Dict[str, Any]]:
+        """
+        Get copies of every document, for snapshots.
+        """
+
+        with self.lock:
+            return [copy_document(document) for document in self.documents.values()]
@@ -0,0 +1,214 @@
+
+from typing import Dict, Any, List, Optional
+import threading
+import logging
+import atexit
+import time
+import os
+
+import bson
+from bson.codec_options import CodecOptions
+
+from .MemoryCollection import MemoryCollection
+from ..util.constants import MEMORY_STORAGE_SNAPSHOT_INTERVAL
+
+logger = logging.getLogger("language_app_backend.obj.MemoryDatabaseClient")
+
+class MemoryDatabase:
+
+    """
+    In-process stand-in for a pymongo database, collections are created on first use.
+    """
+
+    __slots__ = [
+        "name",
+        "lock",
+        "collections",
+    ]
+    def __init__(self,
+                 name: str) -> None:
+
+        self.name = name
+        self.lock = threading.Lock()
+        self.collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name) -> MemoryCollection:
+
+        with self.lock:
+
+            if name not in self.collections:
+                self.collections[name] = MemoryCollection(name)
+
+            return self.collections[name]
+
+    def __getattr__(self, name) -> MemoryCollection:
+
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return self[name]
+
+    def command(self,
+                command,
+                **kwargs) -> Dict[str, Any]:
+
+        if command != "ping":
+            raise ValueError(f"Unsupported command '{command}'.")
+
+        return {"ok": 1.0}
+
+    def list_collection_names(self) -> List[str]:
+
+        with self.lock:
+            return list(self.collections.keys())
+
+class MemoryDatabaseClient:
+
+    """
+    In-process storage with the part of pymongo's MongoClient API used by the app, for single-node deployments and benchmarks.
+
+    Everything lives in the memory of this process, so it can only be used
+    with one server process (gunicorn threads, not workers). With
+    snapshot_path the databases are loaded from it at startup and written to
+    it every snapshot_interval seconds and when the process exits.
+    """
+
+    __slots__ = [
+        "lock",
+        "databases",
+        "snapshot_path",
+        "snapshot_interval",
+        "is_running",
+        "snapshot_thread",
+        "snapshot_lock",
+    ]
+    def __init__(self,
+                 snapshot_path: Optional[str] = None,
+                 snapshot_interval: float = MEMORY_STORAGE_SNAPSHOT_INTERVAL) -> None:
+
+        self.lock = threading.Lock()
+        self.databases: Dict[str, MemoryDatabase] = {}
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.is_running = True
+        self.snapshot_thread = None
+        self.snapshot_lock = threading.Lock()
+
+        if snapshot_path is None:
+            return
+
+        if os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+        self.snapshot_thread = threading.Thread(target=self.snapshot_function, daemon=True)
+        self.snapshot_thread.start()
+
+        atexit.register(self.close)
+
+    def __getitem__(self, name) -> MemoryDatabase:
+
+        with self.lock:
+
+            if name not in self.databases:
+                self.databases[name] = MemoryDatabase(name)
+
+            return self.databases[name]
+
+    def __getattr__(self, name) -> MemoryDatabase:
+
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return self[name]
+
+    def list_database_names(self) -> List[str]:
+
+        with self.lock:
+            return list(self.databases.keys())
+
+    def load_snapshot(self) -> None:
+        """
+        Load the documents and indexes of the snapshot file.
+        """
+
+        number_of_documents = 0
+
+        with open(self.snapshot_path, "rb") as f:
+
+            # timezone aware, like the datetimes the app writes
+            for record in bson.decode_file_iter(f, codec_options=CodecOptions(tz_aware=True)):
+
+                collection = self[record["database"]][record["collection"]]
+
+                if "index" in record:
+                    index = record["index"]
+                    collection.create_index([tuple(key) for key in index["keys"]],
+                                            unique=index["unique"],
+                                            expireAfterSeconds=index["expire_after_seconds"])
+                else:
+                    collection.insert_one(record["document"])
+                    number_of_documents += 1
+
+        logger.info("Loaded %s documents from the storage snapshot '%s'.", number_of_documents, self.snapshot_path)
+
+    def save_snapshot(self) -> None:
+        """
+        Write every collection to the snapshot file, replacing it only once the new one is complete.
+        """
+
+        temporary_path = f"{self.snapshot_path}.tmp"
+
+        with self.snapshot_lock:
+
+            with open(temporary_path, "wb") as f:
+
+                for database_name in self.list_database_names():
+
+                    database = self[database_name]
+
+                    for collection_name in database.list_collection_names():
+
+                        collection = database[collection_name]
+
+                        # indexes first, so unique indexes are checked while loading
+                        for index_spec in collection.get_index_specs():
+                            f.write(bson.encode({"database": database_name,
+                                                 "collection": collection_name,
+                                                 "index": index_spec}))
+
+                        for document in collection.get_documents():
+                            f.write(bson.encode({"database": database_name,
+                                                 "collection": collection_name,
+                                                 "document": document}))
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(temporary_path, self.snapshot_path)
+
+    def snapshot_function(self) -> None:
+
+        while self.is_running:
+
+            time.sleep(self.snapshot_interval)
+
+            if not self.is_running:
+                break
+
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                logger.error("Error saving storage snapshot: %s", e)
+
+    def close(self) -> None:
+
+        if not self.is_running:
+            return
+
+        self.is_running = False
+
+        if self.snapshot_path is not None:
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                logger.error("Error saving storage snapshot: %s", e)
@@ -0,0 +1,313 @@
+
+from typing import Callable, Dict, Any, Optional, Tuple
+from email.utils import parsedate_to_datetime
+import threading
+import logging
+import datetime
+import asyncio
+import random
+import time
+
+import openai
+
+from ..util.metrics import (increment_counter,
+                            observe_histogram)
+from .LLMRateGovernor import RateBudgetExhausted
+
+logger = logging.getLogger("language_app_backend.obj.RetryPolicy")
+
+# error classes returned by classify_error
+RATE_LIMIT_ERROR = "rate_limit"
+TRANSIENT_ERROR = "transient"
+PERMANENT_ERROR = "permanent"
+BUDGET_EXHAUSTED = "budget_exhausted"
+INVALID_OUTPUT = "invalid_output"
+
+def is_lock_conflict(error: openai.APIStatusError) -> bool:
+
+    """
+    Whether a 409 is a lock timeout, which can be retried once the lock is released,
+    rather than a conflict with the state of the resource.
+    """
+
+    if error.response.headers.get("x-should-retry", None) == "true":
+        return True
+
+    return "lock" in str(error).lower()
+
+def classify_error(error: Exception) -> str:
+
+    """
+    Classify an exception raised by an LLM call as a rate limit, a transient error (worth retrying), a permanent one
+    or the shared rate budget being used up. Of the API statuses only 408, 409 lock timeouts, 429 and 5xx are retried.
+    """
+
+    if isinstance(error, RateBudgetExhausted):
+        return BUDGET_EXHAUSTED
+
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT_ERROR
+
+    if isinstance(error, (openai.APITimeoutError,
+                          openai.APIConnectionError)):
+        return TRANSIENT_ERROR
+
+    # bad requests, authentication, permissions, conflicts with the resource, ... will fail again
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return RATE_LIMIT_ERROR
+        if error.status_code == 408 or error.status_code >= 500:
+            return TRANSIENT_ERROR
+        if error.status_code == 409 and is_lock_conflict(error):
+            return TRANSIENT_ERROR
+        return PERMANENT_ERROR
+
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TRANSIENT_ERROR
+
+    return PERMANENT_ERROR
+
+def get_retry_after(error: Exception) -> Optional[float]:
+
+    """
+    Get the delay in seconds asked for by the Retry-After headers of an API error, None if there is none.
+    """
+
+    response = getattr(error, "response", None)
+
+    if response is None:
+        return None
+
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms", None)
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after", None)
+    if retry_after is None:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    # HTTP date
+    try:
+        retry_after_time = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (retry_after_time - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+class RetryPolicy:
+
+    """
+    Retries of LLM calls.
+
+    Permanent errors are not retried, and neither is a call that waited
+    for the shared rate budget until its timeout. Rate limits and transient errors wait
+    with full jitter exponential backoff, or longer if Retry-After asks for
+    it. Invalid outputs (the call returned None) are retried straight away.
+    No retry starts if it would end after the overall deadline. Counters are
+    kept per call site.
+    """
+
+    __slots__ = [
+        "max_attempts",
+        "base_delay",
+        "max_delay",
+        "deadline",
+        "lock",
+        "stats",
+    ]
+    def __init__(self,
+                 max_attempts: int,
+                 base_delay: float,
+                 max_delay: float,
+                 deadline: float) -> None:
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, call_site, key) -> None:
+
+        with self.lock:
+            call_site_stats = self.stats.setdefault(call_site, {})
+            call_site_stats[key] = call_site_stats.get(key, 0) + 1
+
+    def record_call_duration(self,
+                             call_site,
+                             start_time,
+                             outcome) -> None:
+
+        # the whole call, retries and backoff included
+        observe_histogram("language_app_llm_call_duration_seconds",
+                          time.monotonic() - start_time,
+                          {"method": call_site, "outcome": outcome})
+
+    def get_delay(self,
+                  attempt,
+                  error_class,
+                  retry_after) -> float:
+        """
+        Get the time to wait before the next attempt (attempt counts from 1).
+        """
+
+        if error_class == INVALID_OUTPUT:
+            return 0.0
+
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+        if retry_after is not None:
+            return max(retry_after, backoff)
+
+        return backoff
+
+    def should_retry(self,
+                     call_site,
+                     attempt,
+                     max_attempts,
+                     error_class,
+                     delay,
+                     start_time) -> bool:
+
+        if error_class == PERMANENT_ERROR:
+            self.record(call_site, "permanent_errors")
+            return False
+
+        if error_class == BUDGET_EXHAUSTED:
+            self.record(call_site, "budget_exhausted")
+            return False
+
+        if attempt >= max_attempts:
+            self.record(call_site, "exhausted")
+            return False
+
+        if time.monotonic() + delay - start_time > self.deadline:
+            self.record(call_site, "deadline_exceeded")
+            return False
+
+        self.record(call_site, "retries")
+        self.record(call_site, f"retries_{error_class}")
+
+        return True
+
+    def classify_attempt(self,
+                         call_site,
+                         attempt,
+                         error) -> Tuple[str, Optional[float]]:
+
+        if error is None:
+            logger.warning("Invalid output from '%s' on attempt %s.", call_site, attempt)
+            increment_counter("language_app_llm_errors_total", {"method": call_site, "reason": INVALID_OUTPUT})
+            return INVALID_OUTPUT, None
+
+        error_class = classify_error(error)
+        retry_after = get_retry_after(error)
+        increment_counter("language_app_llm_errors_total", {"method": call_site, "reason": error_class})
+
+        if error_class == PERMANENT_ERROR:
+            # the call fails right away, name the error so bad requests, authentication errors, ... stand out
+            increment_counter("language_app_llm_permanent_errors_total", {"method": call_site, "error": type(error).__name__})
+            logger.error("Permanent error in '%s' on attempt %s, not retried (%s): %s", call_site, attempt, type(error).__name__, error)
+        else:
+            logger.warning("Error in '%s' on attempt %s (%s, retry after: %s): %s", call_site, attempt, error_class, retry_after, error)
+
+        return error_class, retry_after
+
+    def call(self,
+             call_site: str,
+             function: Callable,
+             *args,
+             max_attempts: Optional[int] = None) -> Any:
+        """
+        Call function(*args) until it returns something other than None, returns None if every attempt failed.
+        """
+
+        max_attempts = max_attempts or self.max_attempts
+        start_time = time.monotonic()
+
+        self.record(call_site, "calls")
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.record(call_site, "attempts")
+
+            error = None
+            try:
+                result = function(*args)
+            except Exception as e:
+                error = e
+            else:
+                if result is not None:
+                    self.record_call_duration(call_site, start_time, "success")
+                    return result
+
+            error_class, retry_after = self.classify_attempt(call_site, attempt, error)
+            delay = self.get_delay(attempt, error_class, retry_after)
+
+            if not self.should_retry(call_site, attempt, max_attempts, error_class, delay, start_time):
+                self.record(call_site, "failures")
+                self.record_call_duration(call_site, start_time, "failure")
+                return None
+
+            if delay > 0:
+                time.sleep(delay)
+
+    async def call_async(self,
+                         call_site: str,
+                         coroutine_function: Callable,
+                         *args,
+                         max_attempts: Optional[int] = None) -> Any:
+        """
+        Awaitable version of call, coroutine_function(*args) is awaited on every attempt.
+        """
+
+        max_attempts = max_attempts or self.max_attempts
+        start_time = time.monotonic()
+
+        self.record(call_site, "calls")
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.record(call_site, "attempts")
+
+            error = None
+            try:
+                result = await coroutine_function(*args)
+            except Exception as e:
+                error = e
+            else:
+                if result is not None:
+                    self.record_call_duration(call_site, start_time, "success")
+                    return result
+
+            error_class, retry_after = self.classify_attempt(call_site, attempt, error)
+            delay = self.get_delay(attempt, error_class, retry_after)
+
+            if not self.should_retry(call_site, attempt, max_attempts, error_class, delay, start_time):
+                self.record(call_site, "failures")
+                self.record_call_duration(call_site, start_time, "failure")
+                return None
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the counters of every call site (calls, attempts, retries per error class, failures, ...).
+        """
+
+        with self.lock:
+            return {call_site: dict(call_site_stats) for call_site, call_site_stats in self.stats.items()}
@@ -0,0 +1,85 @@
+from typing import Callable, Dict, Hashable, Any
+import concurrent.futures
+import threading
+
+from ..util.futures import (completed_future,
+                            failed_future,
+                            copy_future_result)
+
+class SingleFlight:
+
+    """
+    Coalesce concurrent calls with the same key into one call.
+
+    The first thread to call do for a key runs the function, threads calling
+    do for the same key while it runs wait and get the same result (or error).
+    do_future does the same for functions returning a future, without waiting.
+    """
+
+    __slots__ = [
+        "lock",
+        "futures",
+        "executed",
+        "coalesced",
+    ]
+    def __init__(self) -> None:
+
+        self.lock = threading.Lock()
+        self.futures: Dict[Hashable, concurrent.futures.Future] = {}
+
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self,
+           key: Hashable,
+           function: Callable,
+           *args) -> Any:
+        """
+        Run function(*args) unless a call with the same key is in progress, in which case wait for its result.
+        """
+
+        return self.do_future(key, lambda: completed_future(function(*args))).result()
+
+    def do_future(self,
+                  key: Hashable,
+                  function: Callable[..., concurrent.futures.Future],
+                  *args) -> concurrent.futures.Future:
+        """
+        Start function(*args), which returns a future, unless a call with the same key is in progress,
+        in which case return the future of that call. The key is free again once the future is done.
+        """
+
+        with self.lock:
+
+            future = self.futures.get(key, None)
+
+            if future is not None:
+                self.coalesced += 1
+                return future
+
+            future = concurrent.futures.Future()
+            self.futures[key] = future
+            self.executed += 1
+
+        def on_done(inner_future: concurrent.futures.Future) -> None:
+            with self.lock:
+                del self.futures[key]
+            copy_future_result(inner_future, future)
+
+        try:
+            inner_future = function(*args)
+        except Exception as e:
+            inner_future = failed_future(e)
+
+        inner_future.add_done_callback(on_done)
+
+        return future
+
+    def get_stats(self) -> Dict[str, Any]:
+
+        with self.lock:
+            return {
+                "in_flight": len(self.futures),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
@@ -0,0 +1,210 @@
+
+from typing import Dict, List, Optional
+
+# number of array items allowed per key, None for no limit (validate_exercise only uses the first criteria)
+MAX_ITEMS_PER_KEY = {
+    "initial_strings": 1,
+    "middle_strings": 1,
+    "final_strings": 4,
+    "criteria": None,
+}
+# keys whose items are shown to the user and must be 1-100 characters
+LENGTH_CHECKED_KEYS = ["initial_strings", "middle_strings", "final_strings"]
+MAX_STRING_LENGTH = 100
+# text allowed before the JSON object (e.g. a ```json fence)
+MAX_PREFIX_LENGTH = 200
+
+class StreamingExerciseValidator:
+
+    """
+    Incremental check of an exercise JSON object while it is being generated.
+
+    feed is called with each chunk of output text and returns False as soon as
+    the output can no longer pass validate_exercise (unknown or repeated keys,
+    too many items, items that are not strings or are too long, ...). It does
+    not replace validate_exercise on the full output, it only catches failures
+    early. is_complete is set once the top level object is closed, after which
+    the rest of the output can be ignored.
+    """
+
+    __slots__ = [
+        "error",
+        "is_complete",
+        "prefix_length",
+        "stack",
+        "keys",
+        "current_key",
+        "is_expecting_key",
+        "in_string",
+        "is_escaped",
+        "number_of_hex_digits_left",
+        "string_length",
+        "item_counts",
+    ]
+    def __init__(self) -> None:
+
+        self.error: Optional[str] = None
+        self.is_complete = False
+        self.prefix_length = 0
+
+        # open containers, "{" or "["
+        self.stack: List[str] = []
+        self.keys: List[str] = []
+        self.current_key = ""
+        self.is_expecting_key = True
+
+        self.in_string = False
+        self.is_escaped = False
+        self.number_of_hex_digits_left = 0
+        self.string_length = 0
+
+        self.item_counts: Dict[str, int] = {}
+
+    def fail(self, error) -> bool:
+
+        self.error = error
+        return False
+
+    def feed(self, text) -> bool:
+        """
+        Check the next chunk of output, returns False once the output is invalid.
+        """
+
+        if self.error is not None:
+            return False
+
+        for character in text:
+
+            if self.is_complete:
+                return True
+
+            if self.in_string:
+                if not self.feed_string_character(character):
+                    return False
+                continue
+
+            if not len(self.stack):
+                if character == "{":
+                    self.stack.append("{")
+                    continue
+                self.prefix_length += 1
+                if self.prefix_length > MAX_PREFIX_LENGTH:
+                    return self.fail("No JSON object in output.")
+                continue
+
+            if character.isspace() or character == ",":
+                continue
+
+            depth = len(self.stack)
+
+            if character == ":":
+                if depth == 1:
+                    self.is_expecting_key = False
+                continue
+
+            if character == '"':
+                if not self.start_string(depth):
+                    return False
+                continue
+
+            if character == "[":
+                if depth != 1 or self.is_expecting_key:
+                    return self.fail("Unexpected array in output.")
+                self.stack.append("[")
+                continue
+
+            if character == "]":
+                if self.stack[-1] != "[":
+                    return self.fail("Unexpected ']' in output.")
+                self.stack.pop()
+                self.is_expecting_key = True
+                continue
+
+            if character == "}":
+                if self.stack[-1] != "{":
+                    return self.fail("Unexpected '}' in output.")
+                self.stack.pop()
+                if not len(self.stack):
+                    if len(self.keys) != len(MAX_ITEMS_PER_KEY):
+                        return self.fail(f"Missing keys in output: {self.keys}.")
+                    if self.item_counts.get("final_strings", 0) < 2:
+                        return self.fail("Not enough items in 'final_strings'.")
+                    self.is_complete = True
+                continue
+
+            # numbers, true/false/null and nested objects never appear in an exercise
+            return self.fail(f"Unexpected character '{character}' in output.")
+
+        return True
+
+    def start_string(self, depth) -> bool:
+
+        self.in_string = True
+        self.is_escaped = False
+        self.string_length = 0
+
+        if depth == 1 and not self.is_expecting_key:
+            # a single string value is only accepted for criteria
+            if self.current_key != "criteria":
+                return self.fail(f"Value of '{self.current_key}' is not a list.")
+
+        if depth == 2:
+            self.item_counts[self.current_key] = self.item_counts.get(self.current_key, 0) + 1
+            max_items = MAX_ITEMS_PER_KEY[self.current_key]
+            if max_items is not None and self.item_counts[self.current_key] > max_items:
+                return self.fail(f"Too many items in '{self.current_key}'.")
+
+        if depth == 1 and self.is_expecting_key:
+            self.current_key = ""
+
+        return True
+
+    def feed_string_character(self, character) -> bool:
+
+        depth = len(self.stack)
+
+        if self.number_of_hex_digits_left:
+            # the 4 hex digits of a \u escape are one character
+            self.number_of_hex_digits_left -= 1
+            return True
+        elif self.is_escaped:
+            self.is_escaped = False
+            if character == "u":
+                self.number_of_hex_digits_left = 4
+        elif character == "\\":
+            self.is_escaped = True
+            return True
+        elif character == '"':
+            self.in_string = False
+            return self.end_string(depth)
+
+        self.string_length += 1
+
+        if depth == 1 and self.is_expecting_key:
+            self.current_key += character
+            if len(self.current_key) > max(len(key) for key in MAX_ITEMS_PER_KEY):
+                return self.fail("Unknown key in output.")
+        elif depth == 2 and self.current_key in LENGTH_CHECKED_KEYS and self.string_length > MAX_STRING_LENGTH:
+            return self.fail(f"Item of '{self.current_key}' is too long.")
+
+        return True
+
+    def end_string(self, depth) -> bool:
+
+        if depth == 1 and self.is_expecting_key:
+            if self.current_key not in MAX_ITEMS_PER_KEY:
+                return self.fail(f"Unknown key '{self.current_key}' in output.")
+            if self.current_key in self.keys:
+                return self.fail(f"Repeated key '{self.current_key}' in output.")
+            self.keys.append(self.current_key)
+            return True
+
+        if depth == 1:
+            # string value of criteria
+            self.is_expecting_key = True
+            return True
+
+        if self.current_key in LENGTH_CHECKED_KEYS and self.string_length < 1:
+            return self.fail(f"Empty item in '{self.current_key}'.")
+
+        return True
@@ -0,0 +1,90 @@
+
+from typing import Optional, Dict, Any
+
+class UserContext:
+
+    """
+    Request-scoped view of a user document.
+
+    The document is loaded at most once per request, writes made through
+    GlobalContainer are applied to it so later reads in the same request see
+    them, and is_dirty records whether it has been modified since loading.
+    """
+
+    __slots__ = [
+        "user_id",
+        "user",
+        "is_loaded",
+        "is_dirty",
+    ]
+    def __init__(self,
+                 user_id,
+                 user: Optional[Dict[Any, Any]] = None) -> None:
+
+        self.user_id = user_id
+        self.user = user
+        self.is_loaded = user is not None
+        self.is_dirty = False
+
+    def set_user(self,
+                 user: Optional[Dict[Any, Any]]) -> None:
+        """
+        Set the loaded user document (None if the user does not exist).
+        """
+
+        self.user = user
+        self.is_loaded = True
+
+    def get(self, key, default=None) -> Any:
+        """
+        Get a top level field of the user document.
+        """
+
+        if self.user is None:
+            return default
+
+        return self.user.get(key, default)
+
+    def apply_set(self,
+                  fields: Dict[str, Any]) -> None:
+        """
+        Apply the fields of a $set update (dotted keys allowed) to the loaded document.
+        """
+
+        if self.user is None:
+            return
+
+        for key, value in fields.items():
+            parent, last_key = self.get_parent(key)
+            parent[last_key] = value
+
+        self.is_dirty = True
+
+    def apply_inc(self,
+                  fields: Dict[str, Any]) -> None:
+        """
+        Apply the fields of an $inc update (dotted keys allowed) to the loaded document.
+        """
+
+        if self.user is None:
+            return
+
+        for key, value in fields.items():
+            parent, last_key = self.get_parent(key)
+            parent[last_key] = (parent.get(last_key, 0) or 0) + value
+
+        self.is_dirty = True
+
+    def get_parent(self, key):
+        """
+        Get the dictionary holding a dotted key, creating intermediate dictionaries if needed.
+        """
+
+        parts = key.split(".")
+        parent = self.user
+        for part in parts[:-1]:
+            if not isinstance(parent.get(part, None), dict):
+                parent[part] = {}
+            parent = parent[part]
+
+        return parent, parts[-1]
@@ -0,0 +1,325 @@
+
+from typing import Optional, Dict, Any, List
+import os
+import logging
+import json
+import uuid
+import datetime
+
+from pymongo import UpdateOne
+
+from ..util.constants import (OPENAI_MODEL_NAME,
+                              WORD_LEVEL_BATCH_SIZE,
+                              VOCABULARY_BATCH_JOBS_DIRECTORY)
+
+logger = logging.getLogger("language_app_backend.obj.VocabularyBatchJobs")
+
+# statuses of a batch after which it will not change anymore
+FINISHED_BATCH_STATUSES = ["completed", "failed", "expired", "cancelled"]
+
+def get_output_text_from_response_body(response_body: Dict[str, Any]) -> Optional[str]:
+
+    """
+    Get the output text of a /v1/responses body from a batch output file.
+    """
+
+    output_text = ""
+
+    for output in response_body.get("output", []):
+        if output.get("type", None) != "message":
+            continue
+        for content in output.get("content", []):
+            if content.get("type", None) == "output_text":
+                output_text += content.get("text", "")
+
+    if not len(output_text):
+        return None
+
+    return output_text
+
+class VocabularyBatchJobs:
+
+    """
+    Vocabulary work (initial words, word levels) sent to the LLM as offline batch jobs.
+
+    Requests are written to a JSONL file and submitted to the batch endpoint,
+    the job is recorded in the database and polled by the main server, and
+    its results are ingested idempotently into the words collection (each
+    request's result is applied once, even if ingesting is interrupted and
+    repeated).
+    """
+
+    __slots__ = [
+        "llm",
+        "jobs_collection",
+        "words_collection",
+        "settings_collection",
+        "directory",
+    ]
+    def __init__(self,
+                 llm,
+                 jobs_collection,
+                 words_collection,
+                 settings_collection,
+                 directory: str = VOCABULARY_BATCH_JOBS_DIRECTORY) -> None:
+
+        self.llm = llm
+        self.jobs_collection = jobs_collection
+        self.words_collection = words_collection
+        self.settings_collection = settings_collection
+        self.directory = directory
+
+    def get_pending_job(self,
+                        kind,
+                        language) -> Optional[Dict[str, Any]]:
+
+        return self.jobs_collection.find_one({"kind": kind,
+                                              "language": language,
+                                              "status": {"$ne": "ingested"}})
+
+    def submit_job(self,
+                   kind,
+                   language,
+                   requests: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        """
+        Write the requests ({custom_id: {"query_input": ..., ...}}) to a JSONL file and submit it as a batch.
+        Returns the batch id, None if nothing was submitted.
+        """
+
+        if not len(requests):
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        input_file_path = os.path.join(self.directory, f"{kind}__{language}__{uuid.uuid4()}.jsonl")
+
+        with open(input_file_path, "w", encoding="utf-8") as f:
+            for custom_id, request in requests.items():
+                f.write(json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/responses",
+                    "body": {
+                        "model": OPENAI_MODEL_NAME,
+                        "input": request["query_input"]
+                    }
+                }, ensure_ascii=False) + "\n")
+
+        try:
+            with open(input_file_path, "rb") as f:
+                input_file = self.llm.client.files.create(file=f, purpose="batch")
+
+            batch = self.llm.client.batches.create(input_file_id=input_file.id,
+                                                   endpoint="/v1/responses",
+                                                   completion_window="24h")
+        except Exception as e:
+            logger.error("Error submitting %s batch job for language '%s': %s", kind, language, e)
+            return None
+        finally:
+            # the provider keeps its own copy once uploaded, a failed submission writes a new file next time
+            os.remove(input_file_path)
+
+        self.jobs_collection.insert_one({
+            "_id": batch.id,
+            "kind": kind,
+            "language": language,
+            "status": batch.status,
+            "input_file_id": input_file.id,
+            "requests": requests,
+            "ingested_custom_ids": [],
+            "created_at": int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+        })
+
+        logger.info("Submitted %s batch job '%s' for language '%s' with %s requests.", kind, batch.id, language, len(requests))
+
+        return batch.id
+
+    def submit_initial_words_job(self,
+                                 language) -> Optional[str]:
+        """
+        Submit a batch job to populate the initial words of the language.
+        """
+
+        if self.settings_collection.find_one({"_id": f"initial_words_populated_{language}"}):
+            return None
+
+        if self.get_pending_job("initial_words", language) is not None:
+            logger.info("Initial words batch job for language '%s' is already pending.", language)
+            return None
+
+        query_input = self.llm.build_initial_words_query(language)
+
+        if query_input is None:
+            return None
+
+        return self.submit_job("initial_words",
+                               language,
+                               {"initial_words": {"query_input": query_input}})
+
+    def submit_word_levels_job(self,
+                               language,
+                               word_values: List[str]) -> Optional[str]:
+        """
+        Submit a batch job to re-level the words, WORD_LEVEL_BATCH_SIZE words per request.
+        """
+
+        if self.get_pending_job("word_levels", language) is not None:
+            logger.info("Word levels batch job for language '%s' is already pending.", language)
+            return None
+
+        word_values = list(dict.fromkeys(word_values))
+
+        requests = {}
+        for batch_i in range(0, len(word_values), WORD_LEVEL_BATCH_SIZE):
+
+            batch_word_values = word_values[batch_i:batch_i + WORD_LEVEL_BATCH_SIZE]
+
+            query_input = self.llm.build_word_levels_query(batch_word_values,
+                                                           language)
+
+            if query_input is None:
+                return None
+
+            requests[f"word_levels_{batch_i // WORD_LEVEL_BATCH_SIZE}"] = {"query_input": query_input,
+                                                                           "word_values": batch_word_values}
+
+        return self.submit_job("word_levels",
+                               language,
+                               requests)
+
+    def poll_jobs(self) -> int:
+        """
+        Check every pending job and ingest the finished ones. Returns the number of jobs ingested.
+        """
+
+        number_ingested = 0
+
+        for job in list(self.jobs_collection.find({"status": {"$ne": "ingested"}})):
+
+            try:
+                batch = self.llm.client.batches.retrieve(job["_id"])
+            except Exception as e:
+                logger.error("Error retrieving batch job '%s': %s", job['_id'], e)
+                continue
+
+            if batch.status not in FINISHED_BATCH_STATUSES:
+                if batch.status != job["status"]:
+                    self.jobs_collection.update_one({"_id": job["_id"]},
+                                                    {"$set": {"status": batch.status}})
+                continue
+
+            if batch.status == "completed" and batch.output_file_id:
+                try:
+                    output_text = self.llm.client.files.content(batch.output_file_id).text
+                except Exception as e:
+                    logger.error("Error downloading output of batch job '%s': %s", job['_id'], e)
+                    continue
+
+                self.ingest_job_output(job, output_text)
+            else:
+                logger.info("Batch job '%s' finished with status '%s', nothing to ingest.", job['_id'], batch.status)
+
+            # marked last, so a job interrupted while ingesting is ingested again (skipping what was done)
+            self.jobs_collection.update_one({"_id": job["_id"]},
+                                            {"$set": {"status": "ingested",
+                                                      "batch_status": batch.status}})
+            number_ingested += 1
+
+        return number_ingested
+
+    def ingest_job_output(self,
+                          job,
+                          output_text) -> None:
+
+        ingested_custom_ids = set(job.get("ingested_custom_ids", []))
+
+        for line in output_text.splitlines():
+
+            if not line.strip():
+                continue
+
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning("Error decoding batch output line: %s", e)
+                continue
+
+            custom_id = result.get("custom_id", None)
+            request = job["requests"].get(custom_id, None)
+
+            if request is None or custom_id in ingested_custom_ids:
+                continue
+
+            response = result.get("response", None) or {}
+
+            if response.get("status_code", None) != 200:
+                logger.warning("Request '%s' of batch job '%s' failed: %s", custom_id, job['_id'], result.get('error', None))
+                continue
+
+            request_output_text = get_output_text_from_response_body(response.get("body", {}))
+
+            if request_output_text is None:
+                logger.warning("Request '%s' of batch job '%s' has no output text.", custom_id, job['_id'])
+                continue
+
+            if job["kind"] == "word_levels":
+                self.ingest_word_levels(job["language"], request, request_output_text)
+            elif job["kind"] == "initial_words":
+                self.ingest_initial_words(job["language"], request, request_output_text)
+
+            self.jobs_collection.update_one({"_id": job["_id"]},
+                                            {"$addToSet": {"ingested_custom_ids": custom_id}})
+            ingested_custom_ids.add(custom_id)
+
+    def ingest_word_levels(self,
+                           language,
+                           request,
+                           output_text) -> None:
+
+        word_levels = self.llm.parse_word_levels_output(output_text,
+                                                        request["word_values"])
+
+        self.llm.cache_word_levels(word_levels, language)
+
+        level_updates = [UpdateOne({"language": language,
+                                    "word_value": word_value},
+                                   {"$set": {"level": level}})
+                         for word_value, level in word_levels.items()]
+
+        if len(level_updates):
+            self.words_collection.bulk_write(level_updates, ordered=False)
+
+        logger.info("Ingested levels of %s words for language '%s'.", len(word_levels), language)
+
+    def ingest_initial_words(self,
+                             language,
+                             request,
+                             output_text) -> None:
+
+        initial_words = self.llm.parse_initial_words_output(output_text,
+                                                            language)
+
+        if not initial_words:
+            logger.warning("No initial words found for the language.")
+            return
+
+        self.llm.cache_output_text(request["query_input"], output_text)
+
+        # upserts keyed on the word, so ingesting twice does not duplicate words
+        word_inserts = []
+        for level, word_values in initial_words[language].items():
+            for word_value in word_values:
+                word_inserts.append(UpdateOne({"language": language,
+                                               "word_value": word_value.replace(" ", "_")},
+                                              {"$setOnInsert": {"_id": str(uuid.uuid4()),
+                                                                "level": int(level),
+                                                                "translations": []}},
+                                              upsert=True))
+
+        if len(word_inserts):
+            self.words_collection.bulk_write(word_inserts, ordered=False)
+
+        self.settings_collection.update_one({"_id": f"initial_words_populated_{language}"},
+                                            {"$set": {"populated": True}},
+                                            upsert=True)
+
+        logger.info("Initial words populated in the database for language '%s'.", language)
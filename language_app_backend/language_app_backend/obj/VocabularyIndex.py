@@ -0,0 +1,116 @@
+
+from typing import Dict, List, Set, Optional
+import threading
+
+import numpy as np
+
+def normalize_word_value(word_value) -> str:
+
+    return word_value.strip().lower().replace(" ", "_")
+
+class VocabularyIndex:
+
+    """
+    In-memory index of the vocabulary of each language, by normalized word value and by level.
+
+    Used to check new words for duplicates and to sample a few words of a
+    level for prompts, without sending or scanning the whole vocabulary.
+    """
+
+    __slots__ = [
+        "lock",
+        "word_values",
+        "word_values_by_level",
+    ]
+    def __init__(self) -> None:
+
+        self.lock = threading.Lock()
+        self.word_values: Dict[str, Set[str]] = {}
+        self.word_values_by_level: Dict[str, Dict[int, List[str]]] = {}
+
+    def set_vocabulary(self,
+                       language,
+                       vocabulary) -> None:
+        """
+        Replace the index of the language with the word documents of its vocabulary.
+        """
+
+        word_values = set()
+        word_values_by_level = {}
+
+        for word_doc in vocabulary:
+            word_values.add(normalize_word_value(word_doc["word_value"]))
+            word_values_by_level.setdefault(int(word_doc["level"]), []).append(word_doc["word_value"])
+
+        with self.lock:
+            self.word_values[language] = word_values
+            self.word_values_by_level[language] = word_values_by_level
+
+    def is_loaded(self,
+                  language) -> bool:
+
+        with self.lock:
+            return language in self.word_values
+
+    def contains(self,
+                 language,
+                 word_value) -> bool:
+
+        with self.lock:
+            return normalize_word_value(word_value) in self.word_values.get(language, set())
+
+    def add(self,
+            language,
+            word_value,
+            level) -> bool:
+        """
+        Add a word, returns False if it was already in the index.
+        """
+
+        normalized_word_value = normalize_word_value(word_value)
+
+        with self.lock:
+
+            word_values = self.word_values.setdefault(language, set())
+
+            if normalized_word_value in word_values:
+                return False
+
+            word_values.add(normalized_word_value)
+            self.word_values_by_level.setdefault(language, {}).setdefault(int(level), []).append(word_value)
+
+        return True
+
+    def sample(self,
+               language,
+               level,
+               number_of_words) -> List[str]:
+        """
+        Get up to number_of_words random words of the level.
+        """
+
+        with self.lock:
+            level_word_values = list(self.word_values_by_level.get(language, {}).get(level, []))
+
+        if len(level_word_values) <= number_of_words:
+            return level_word_values
+
+        indices = np.random.choice(len(level_word_values), number_of_words, replace=False)
+
+        return [level_word_values[index] for index in indices]
+
+    def get_smallest_level(self,
+                           language,
+                           levels) -> Optional[int]:
+        """
+        Get the level with the fewest words.
+        """
+
+        with self.lock:
+            word_values_by_level = self.word_values_by_level.get(language, {})
+            level_sizes = [(len(word_values_by_level.get(level, [])), level) for level in levels]
+
+        if not len(level_sizes):
+            return None
+
+        return min(level_sizes)[1]
@@ -0,0 +1,186 @@
+
+from typing import Callable, Dict, Any
+from collections import deque
+import threading
+import logging
+import queue
+import time
+
+import numpy as np
+
+from ..util.metrics import (increment_counter,
+                            observe_histogram,
+                            register_gauge_function)
+from ..util.round_trips import track_round_trips
+from ..util.constants import MONGO_ROUND_TRIPS_PER_TASK_WARNING
+
+logger = logging.getLogger("language_app_backend.obj.WorkerPool")
+
+class WorkerPool:
+
+    """
+    Fixed number of worker threads consuming a bounded task queue.
+
+    submit never blocks: when the queue is full the task is rejected so the
+    caller can shed load instead of parking a request thread.
+    """
+
+    __slots__ = [
+        "name",
+        "task_queue",
+        "threads",
+        "lock",
+        "is_running",
+        "in_flight",
+        "submitted",
+        "completed",
+        "failed",
+        "rejected",
+        "queue_latencies",
+        "run_latencies",
+    ]
+    def __init__(self,
+                 name: str,
+                 number_of_workers: int,
+                 max_queue_size: int,
+                 latency_window: int = 1000) -> None:
+
+        self.name = name
+        self.task_queue = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()
+        self.is_running = True
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        # recent latencies in seconds: time spent waiting in the queue and time spent running
+        self.queue_latencies = deque(maxlen=latency_window)
+        self.run_latencies = deque(maxlen=latency_window)
+
+        self.threads = []
+        for worker_i in range(number_of_workers):
+            thread = threading.Thread(target=self.worker_function,
+                                      name=f"{name}-{worker_i}",
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        register_gauge_function("language_app_worker_pool_queue_depth", self.get_queue_depth, {"pool": name})
+        register_gauge_function("language_app_worker_pool_in_flight", self.get_in_flight, {"pool": name})
+
+    def submit(self,
+               function: Callable,
+               *args) -> bool:
+        """
+        Queue a task, returns False if the queue is full or the pool is stopped.
+        """
+
+        if not self.is_running:
+            return False
+
+        try:
+            self.task_queue.put_nowait((time.monotonic(), function, args))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            increment_counter("language_app_worker_pool_tasks_total", {"pool": self.name, "result": "rejected"})
+            logger.warning("Worker pool '%s' is full, rejecting task.", self.name)
+            return False
+
+        with self.lock:
+            self.submitted += 1
+
+        return True
+
+    def worker_function(self) -> None:
+
+        while self.is_running:
+
+            try:
+                submitted_time, function, args = self.task_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            start_time = time.monotonic()
+
+            with self.lock:
+                self.in_flight += 1
+                self.queue_latencies.append(start_time - submitted_time)
+
+            observe_histogram("language_app_worker_pool_queue_wait_seconds", start_time - submitted_time, {"pool": self.name})
+
+            success = True
+            try:
+                with track_round_trips(f"Worker pool '{self.name}' task", MONGO_ROUND_TRIPS_PER_TASK_WARNING):
+                    function(*args)
+            except Exception as e:
+                success = False
+                logger.error("Error in worker pool '%s' task: %s", self.name, e)
+
+            run_latency = time.monotonic() - start_time
+
+            with self.lock:
+                self.in_flight -= 1
+                self.run_latencies.append(run_latency)
+                if success:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+            observe_histogram("language_app_worker_pool_run_duration_seconds", run_latency, {"pool": self.name})
+
+            increment_counter("language_app_worker_pool_tasks_total", {"pool": self.name, "result": "completed" if success else "failed"})
+
+            self.task_queue.task_done()
+
+    def get_queue_depth(self) -> int:
+
+        return self.task_queue.qsize()
+
+    def get_in_flight(self) -> int:
+
+        with self.lock:
+            return self.in_flight
+
+    def is_full(self) -> bool:
+
+        return self.task_queue.full()
+
+    def stop(self) -> None:
+
+        self.is_running = False
+        for thread in self.threads:
+            thread.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get queue depth, task counters and latency percentiles (seconds) of recent tasks.
+        """
+
+        with self.lock:
+
+            stats = {
+                "queue_depth": self.task_queue.qsize(),
+                "max_queue_size": self.task_queue.maxsize,
+                "workers": len(self.threads),
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+            for latency_name, latencies in [("queue_latency", self.queue_latencies),
+                                            ("run_latency", self.run_latencies)]:
+                if len(latencies):
+                    p50, p95, p99 = np.percentile(np.fromiter(latencies, dtype=np.float64), [50, 95, 99])
+                else:
+                    p50, p95, p99 = 0.0, 0.0, 0.0
+                stats[f"{latency_name}_p50"] = float(p50)
+                stats[f"{latency_name}_p95"] = float(p95)
+                stats[f"{latency_name}_p99"] = float(p99)
+
+            return stats
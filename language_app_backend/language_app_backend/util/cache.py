@@ -0,0 +1,117 @@
+
+from typing import Optional, Any, Dict, Hashable
+from collections import OrderedDict
+import threading
+import time
+
+class LRUCache:
+
+    """
+    Thread-safe LRU cache with a time to live, bounded by number of entries.
+    """
+
+    __slots__ = [
+        "max_entries",
+        "ttl",
+        "entries",
+        "lock",
+        "hits",
+        "misses",
+        "evictions",
+    ]
+    def __init__(self,
+                 max_entries: int,
+                 ttl: float) -> None:
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a value from the cache, None if missing or expired.
+        """
+
+        with self.lock:
+
+            entry = self.entries.get(key, None)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a value without updating recency or counters, used for write-through.
+        """
+
+        with self.lock:
+
+            entry = self.entries.get(key, None)
+
+            if entry is None or entry[0] < time.monotonic():
+                return None
+
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Add or replace a value, evicting the least recently used entries if needed.
+        """
+
+        with self.lock:
+
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Remove a value from the cache.
+        """
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the hit/miss counters of the cache.
+        """
+
+        with self.lock:
+
+            lookups = self.hits + self.misses
+
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,18 +1,48 @@
+import os
+import tempfile
+
 NEXT_WORD_TEMPERATURE = 0.02
 MAX_HISTORY_LENGTH = 5
 MAX_NUMBER_OF_EXERCISES = 5
 MIN_THUMB_VOLUME = 50
-VOCABULARY_REVISION_ITERATIONS = 3
+MIN_EXERCISE_APPROVAL = 0.5# exercises with at least MIN_THUMB_VOLUME votes and at most this fraction of thumbs up are removed from their pool (the lowest Wilson score first)
+WILSON_SCORE_Z = 1.96# 95% confidence for the Wilson score lower bound
+VOCABULARY_REVISION_ITERATIONS = 200# words re-levelled per revision, asked WORD_LEVEL_BATCH_SIZE at a time
+WORD_LEVEL_BATCH_SIZE = 100# words classified in one LLM query
+USE_VOCABULARY_BATCH_JOBS = False# send vocabulary bootstrap and revision to the LLM batch endpoint instead of waiting for each query
+VOCABULARY_BATCH_JOBS_DIRECTORY = os.path.join(tempfile.gettempdir(), "language_app_batch_jobs")# where the JSONL request files are written
 VOCABULARY_REVISION_INTERVAL = 4 * 60 * 60 # 4 hours
-MAX_CONCURRENT_EXERCISE_CREATIONS = 10
+MAX_CONCURRENT_EXERCISE_CREATIONS = 10# number of exercise creation worker threads per process
+EXERCISE_CREATION_QUEUE_SIZE = 50# exercise creations waiting for a worker, more are rejected
+MAX_IN_FLIGHT_EXERCISE_GENERATIONS = 200# exercises generated on the LLM event loop at once per process, further generations block their creation worker
+EXERCISE_COMPLETION_WORKERS = 2# threads storing generated exercises and notifying learners, the LLM event loop hands them the results
+READY_EXERCISE_QUEUE_SIZE = 1# exercises prepared in advance for each user after they answer, the next answer makes them stale
+EXERCISE_POOL_WARMER_INTERVAL = 5 * 60# time between exercise pool top ups on the main server
+EXERCISE_POOL_WARMER_KEYS_PER_LEVEL = 20# most requested exercise keys considered per language and level
+EXERCISE_POOL_WARMER_LLM_BUDGET = 30# exercises the main server may generate per top up
+DATABASE_INDEXES_VERSION = 3# increase when adding indexes so existing databases get them
 MAX_WORD_LENGTH = 32
+NEW_WORD_PROMPT_SAMPLE_SIZE = 50# existing words of the level shown in the new word prompt (the prompt does not grow with the vocabulary)
+NEW_WORDS_PER_REVISION = 5# new word candidates asked for per revision
 DELETE_SERVER_TIMEOUT = 2 * 60# time to delete server if heartbeat has not been received
 ALLOW_MAIN_SERVER_TIMEOUT = 60# time for server to wait until it is alowed to be the main server
 BACKGROUND_THREAD_SLEEP_TIME = 30# time for server to wait until it is alowed to be the main server
 TIMEOUT_TO_CREATE_NEW_EXERCISE = 30# time to wait until a new exercise is created
+WAIT_FOR_CREATED_EXERCISE_TIMEOUT = 25# longest time a long-poll request waits for the created exercise
+WAIT_FOR_CREATED_EXERCISE_CHECK_INTERVAL = 5# database check while waiting, in case the exercise was created by another worker
+EXERCISE_GENERATION_LEASE_TIMEOUT = 60# time a server may hold the lease to generate an exercise for a key before others can take over
+EXERCISE_GENERATION_LEASE_CHECK_INTERVAL = 1# time between checks while another server holds the lease
+RETIRED_EXERCISE_GRACE_PERIOD = 10 * 60# time before an exercise removed from its pool may be deleted, selections in flight have given it to their learner by then
+RETIRED_EXERCISES_PER_CLEAN_UP = 1000# retired exercises checked for deletion per clean up on the main server
+LLM_RESPONSE_CACHE_MAX_ENTRIES = 10000# validated responses to deterministic prompts kept in memory per process
+LLM_RESPONSE_CACHE_TTL = 30 * 24 * 60 * 60# 30 days, time until a cached response is asked again
+LEARNER_STATE_CACHE_MAX_ENTRIES = 1000# number of (user_id, language) word lists kept in memory per process
+LEARNER_STATE_CACHE_TTL = 60# time until a cached word list is read from the database again (other workers may have written to it)
 
 # OPENAI_MODEL_NAME = "gpt-4.1"
 OPENAI_MODEL_NAME = "gpt-4o"
+STREAM_EXERCISE_GENERATION = True# stream exercises and stop as soon as the output can no longer be valid
+USE_ASYNC_LLM_CLIENT = True# run LLM queries on one event loop thread with AsyncOpenAI instead of blocking a thread per query
 
 DO_NOT_CHECK_SUBSCRIPTION = True# This is for testing purposes only. In production, set this to False.
 
@@ -22,8 +52,47 @@ OPEN_LANGUAGE_APP_ALLOWED_USER_IDS = []
 CHECK_SUBSCRIPTION_INTERVAL = 10 * 60  # 10 minutes
 DEFAULT_RATELIMIT = '100/h'  # Default rate limit for all views
 GET_CREATED_EXERCISES_RATELIMIT = '40/m'  # Rate limit for get_created_exercises view
+WAIT_FOR_CREATED_EXERCISE_RATELIMIT = '20/m'  # Rate limit for wait_for_created_exercise (long-poll) view
+CREATE_NEW_EXERCISE_RETRY_AFTER = 5  # Seconds the client should wait when exercise creation is overloaded
 
 NUMBER_OF_ATTEMPTS_TO_CREATE_EXERCISE = 3
+LLM_RETRY_MAX_ATTEMPTS = 4# attempts of other LLM queries
+LLM_RETRY_BASE_DELAY = 1# seconds, the backoff before retry n is random up to base * 2^(n-1)
+LLM_RETRY_MAX_DELAY = 20# seconds, largest backoff (a longer Retry-After is still honored)
+LLM_RETRY_DEADLINE = 45# seconds, no retry starts if it would end later than this after the first attempt
+# shared by all workers and servers, defaults a little under the lowest usage tier of the model (500 RPM, 30000 TPM),
+# set LANGUAGE_APP_LLM_REQUESTS_PER_MINUTE and LANGUAGE_APP_LLM_TOKENS_PER_MINUTE to 90% of the limits of the account
+LLM_REQUESTS_PER_MINUTE = 450
+LLM_TOKENS_PER_MINUTE = 27000
+LLM_GOVERNOR_ESTIMATED_OUTPUT_TOKENS = {# initial estimates of the output tokens reserved per method, adjusted to the reported usage
+    "create_exercise": 150,# one exercise object
+    "get_new_words": 50,# NEW_WORDS_PER_REVISION words
+    "get_word_level": 5,# one digit
+    "get_word_levels": 600,# WORD_LEVEL_BATCH_SIZE words with their levels
+    "get_initial_words": 1500,# 100 words for each of 3 levels
+}
+LLM_GOVERNOR_DEFAULT_ESTIMATED_OUTPUT_TOKENS = 300# for other methods
+LLM_GOVERNOR_OUTPUT_TOKENS_SMOOTHING = 0.1# weight of the latest reported usage in the estimate of a method
+LLM_GOVERNOR_WAIT_TIMEOUT = 15# longest time a call waits for budget before failing (not retried), well under WAIT_FOR_CREATED_EXERCISE_TIMEOUT
+LLM_GOVERNOR_ADJUST_INTERVAL = 10# seconds between changes of the shared rate factor
+LLM_GOVERNOR_MIN_RATE_FACTOR = 0.1# lowest fraction of the limits used after rate limits
+LLM_GOVERNOR_DECREASE_FACTOR = 0.5# rate factor multiplier after a 429 or slow calls
+LLM_GOVERNOR_INCREASE_STEP = 0.05# rate factor increase per interval while calls succeed quickly
+LLM_GOVERNOR_LATENCY_THRESHOLD = 20# seconds, median call latency above which the rate factor is decreased
+
+MEMORY_STORAGE_SNAPSHOT_INTERVAL = 60# seconds between snapshots of the in-process storage to disk
+MEMORY_STORAGE_TTL_SWEEP_INTERVAL = 60# seconds between removals of expired documents from TTL indexed collections
+
+LOG_QUEUE_SIZE = 10000# log records waiting to be written, further records are dropped (and counted) instead of blocking the caller
+LOG_SAMPLE_RATE = 1# keep 1 of every N debug records with the same logger and message, 1 keeps them all
+
+METRICS_SNAPSHOT_INTERVAL = 15# seconds between writes of a process's metrics to the metrics directory
+METRICS_STALE_AFTER = 120# seconds after which the metrics file of a process that stopped writing is ignored (and removed)
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60]# upper bounds (seconds) of the latency histogram buckets
+MONGO_ROUND_TRIPS_PER_REQUEST_WARNING = 20# requests making more MongoDB round trips are logged as warnings
+MONGO_ROUND_TRIPS_PER_TASK_WARNING = 200# same for one background task or background loop iteration
+PROFILING_SAMPLE_INTERVAL = 0.005# seconds between the stack samples of a profiled request
+PROFILING_MAX_FILES = 1000# profiles kept in the profiling directory, the oldest are removed
 
 POSSIBLE_CRITERIA = ["a", "b", "c", "d", "e", "f"]
 SUPPORTED_LANGUAGES = {
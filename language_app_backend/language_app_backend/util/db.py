@@ -6,7 +6,20 @@ from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
 from ..obj.GlobalContainer import GlobalContainer
+from ..obj.MemoryDatabaseClient import MemoryDatabaseClient
 from ..obj.LLM import LLM
+from ..obj.LLMResponseCache import LLMResponseCache
+from ..obj.LLMRateGovernor import LLMRateGovernor
+from .constants import (LLM_RESPONSE_CACHE_MAX_ENTRIES,
+                        LLM_RESPONSE_CACHE_TTL,
+                        LLM_REQUESTS_PER_MINUTE,
+                        LLM_TOKENS_PER_MINUTE,
+                        LLM_GOVERNOR_ESTIMATED_OUTPUT_TOKENS,
+                        LLM_GOVERNOR_DEFAULT_ESTIMATED_OUTPUT_TOKENS,
+                        LLM_GOVERNOR_WAIT_TIMEOUT)
+from .metrics import (MongoCommandMetrics,
+                      start_metrics_snapshots)
+from .round_trips import MongoRoundTripListener
 
 logger = logging.getLogger("language_app_backend.util.db")
 
@@ -24,13 +37,29 @@ def setup_globals():
         logger.error("Failed to connect to MongoDB")
         raise Exception("Failed to connect to MongoDB")
     
-    llm = LLM()
+    response_cache = LLMResponseCache(db_client["language_app"]["llm_responses"],
+                                      LLM_RESPONSE_CACHE_MAX_ENTRIES,
+                                      LLM_RESPONSE_CACHE_TTL)
+    
+    # shared by every worker and server, so they stay under the account's rate limits together
+    rate_governor = LLMRateGovernor(db_client["language_app"]["llm_rate_windows"],
+                                    int(os.environ.get("LANGUAGE_APP_LLM_REQUESTS_PER_MINUTE", LLM_REQUESTS_PER_MINUTE)),
+                                    int(os.environ.get("LANGUAGE_APP_LLM_TOKENS_PER_MINUTE", LLM_TOKENS_PER_MINUTE)),
+                                    LLM_GOVERNOR_ESTIMATED_OUTPUT_TOKENS,
+                                    LLM_GOVERNOR_DEFAULT_ESTIMATED_OUTPUT_TOKENS,
+                                    LLM_GOVERNOR_WAIT_TIMEOUT)
+    
+    llm = LLM(response_cache=response_cache,
+              rate_governor=rate_governor)
     
     global_container = GlobalContainer(db_client,
                                        llm)
     
     globals()["global_container"] = global_container
 
+    # read by the /metrics endpoint of any worker of this server
+    start_metrics_snapshots()
+
 def get_global_container():
 
     if "global_container" not in globals():
@@ -41,8 +70,19 @@ def get_global_container():
 
 def create_connection():
 
+    """
+    Connect to MongoDB, or with LANGUAGE_APP_STORAGE=memory use the in-process storage (one server process only),
+    snapshotted to LANGUAGE_APP_MEMORY_STORAGE_SNAPSHOT_PATH if it is set.
+    """
+
+    if os.environ.get("LANGUAGE_APP_STORAGE", "mongo") == "memory":
+        return MemoryDatabaseClient(os.environ.get("LANGUAGE_APP_MEMORY_STORAGE_SNAPSHOT_PATH", None))
+
     connection_string = os.environ.get("LANGUAGE_APP_DB_CONNECTION_STRING")
-    client = MongoClient(connection_string, server_api=ServerApi('1'))
+    client = MongoClient(connection_string,
+                         server_api=ServerApi('1'),
+                         event_listeners=[MongoCommandMetrics(),
+                                          MongoRoundTripListener()])
 
     return client
 
@@ -51,9 +91,9 @@ def test_connection(client):
     # Send a ping to confirm a successful connection
     try:
         client.admin.command('ping')
-        print("Pinged your deployment. You successfully connected to MongoDB!")
+        logger.info("Pinged your deployment. You successfully connected to MongoDB!")
         return True
     except Exception as e:
-        print(e)
+        logger.error("Error pinging MongoDB: %s", e)
         return False
     
@@ -0,0 +1,355 @@
+
+from typing import Dict, Any, List, Optional, Tuple, Hashable
+
+# the subset of MongoDB's query, update and projection language used by the app, for the in-process storage
+
+class Missing:
+
+    """
+    Value of a field that is not in the document.
+    """
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+MISSING = Missing()
+
+def copy_document(value) -> Any:
+
+    """
+    Copy the dicts and lists of a document, the other values (str, int, datetime, ObjectId, ...) are immutable.
+    """
+
+    if isinstance(value, dict):
+        return {key: copy_document(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [copy_document(item) for item in value]
+
+    return value
+
+def freeze(value) -> Hashable:
+
+    """
+    Get a hashable version of a value, used as an index key.
+    """
+
+    if isinstance(value, dict):
+        return tuple((key, freeze(item)) for key, item in value.items())
+
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+
+    return value
+
+def get_field(document,
+              path) -> Any:
+
+    """
+    Get the value of a dotted path ("a.b", "a.0"), MISSING if it is not in the document.
+    """
+
+    value = document
+
+    for key in path.split("."):
+
+        if isinstance(value, dict):
+            value = value.get(key, MISSING)
+        elif isinstance(value, list) and key.isdigit():
+            index = int(key)
+            value = value[index] if index < len(value) else MISSING
+        else:
+            return MISSING
+
+        if value is MISSING:
+            return MISSING
+
+    return value
+
+def compare(value, query_value, operator) -> bool:
+
+    if value is MISSING or value is None:
+        return False
+
+    try:
+        if operator == "$lt":
+            return value < query_value
+        if operator == "$lte":
+            return value <= query_value
+        if operator == "$gt":
+            return value > query_value
+        if operator == "$gte":
+            return value >= query_value
+    except TypeError:
+        # values of different types are never in range, as in MongoDB
+        return False
+
+    raise ValueError(f"Unsupported comparison operator '{operator}'.")
+
+def is_equal(value, query_value) -> bool:
+
+    if value is MISSING:
+        return query_value is None
+
+    if value == query_value:
+        return True
+
+    # an array matches if one of its elements does
+    return isinstance(value, list) and not isinstance(query_value, list) and query_value in value
+
+def match_condition(value, condition) -> bool:
+
+    """
+    Check the value of a field against a query condition (a value or a dict of operators).
+    """
+
+    if not isinstance(condition, dict) or not len(condition) or not all(key.startswith("$") for key in condition):
+        return is_equal(value, condition)
+
+    for operator, query_value in condition.items():
+
+        if operator == "$eq":
+            is_match = is_equal(value, query_value)
+        elif operator == "$ne":
+            is_match = not is_equal(value, query_value)
+        elif operator == "$in":
+            is_match = any(is_equal(value, item) for item in query_value)
+        elif operator == "$nin":
+            is_match = not any(is_equal(value, item) for item in query_value)
+        elif operator == "$exists":
+            is_match = (value is not MISSING) == bool(query_value)
+        elif operator in ("$lt", "$lte", "$gt", "$gte"):
+            if isinstance(value, list):
+                is_match = any(compare(item, query_value, operator) for item in value)
+            else:
+                is_match = compare(value, query_value, operator)
+        else:
+            raise ValueError(f"Unsupported query operator '{operator}'.")
+
+        if not is_match:
+            return False
+
+    return True
+
+def match_document(document,
+                   query) -> bool:
+
+    """
+    Check if a document matches a query.
+    """
+
+    for key, condition in query.items():
+
+        if key == "$and":
+            if not all(match_document(document, sub_query) for sub_query in condition):
+                return False
+        elif key == "$or":
+            if not any(match_document(document, sub_query) for sub_query in condition):
+                return False
+        elif not match_condition(get_field(document, key), condition):
+            return False
+
+    return True
+
+def get_equality_fields(query) -> Dict[str, Any]:
+
+    """
+    Get the fields of a query that must be equal to a single value, used to look up indexes and to seed upserts.
+    """
+
+    equality_fields = {}
+
+    for key, condition in query.items():
+
+        if key.startswith("$"):
+            continue
+
+        if isinstance(condition, dict) and len(condition) and all(operator.startswith("$") for operator in condition):
+            if "$eq" in condition:
+                equality_fields[key] = condition["$eq"]
+            continue
+
+        equality_fields[key] = condition
+
+    return equality_fields
+
+def get_parent(document,
+               path,
+               create: bool = True) -> Tuple[Any, str]:
+
+    """
+    Get the dict (or list) holding a dotted path and the last key, creating intermediate dicts if needed.
+    """
+
+    keys = path.split(".")
+    parent = document
+
+    for key in keys[:-1]:
+
+        if isinstance(parent, list) and key.isdigit():
+            parent = parent[int(key)]
+            continue
+
+        if key not in parent or not isinstance(parent[key], (dict, list)):
+            if not create:
+                return None, keys[-1]
+            parent[key] = {}
+
+        parent = parent[key]
+
+    return parent, keys[-1]
+
+def set_field(document,
+              path,
+              value) -> None:
+
+    parent, key = get_parent(document, path)
+
+    if isinstance(parent, list):
+        parent[int(key)] = value
+    else:
+        parent[key] = value
+
+def unset_field(document,
+                path) -> None:
+
+    parent, key = get_parent(document, path, create=False)
+
+    if isinstance(parent, dict):
+        parent.pop(key, None)
+
+def get_array(document,
+              path) -> List[Any]:
+
+    value = get_field(document, path)
+
+    if value is MISSING:
+        value = []
+        set_field(document, path, value)
+
+    if not isinstance(value, list):
+        raise ValueError(f"Field '{path}' is not an array.")
+
+    return value
+
+def apply_update(document,
+                 update,
+                 is_insert: bool = False) -> None:
+
+    """
+    Apply the operators of an update ($set, $inc, $push, ...) to a document in place.
+    """
+
+    for operator, fields in update.items():
+
+        if operator == "$setOnInsert" and not is_insert:
+            continue
+
+        for path, value in fields.items():
+
+            if operator in ("$set", "$setOnInsert"):
+                set_field(document, path, copy_document(value))
+
+            elif operator == "$unset":
+                unset_field(document, path)
+
+            elif operator == "$inc":
+                current_value = get_field(document, path)
+                set_field(document, path, value if current_value is MISSING else current_value + value)
+
+            elif operator == "$push":
+                array = get_array(document, path)
+
+                if isinstance(value, dict) and "$each" in value:
+                    array.extend(copy_document(value["$each"]))
+
+                    if "$slice" in value:
+                        number_to_keep = value["$slice"]
+                        array[:] = array[number_to_keep:] if number_to_keep < 0 else array[:number_to_keep]
+                else:
+                    array.append(copy_document(value))
+
+            elif operator == "$addToSet":
+                array = get_array(document, path)
+
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in values:
+                    if item not in array:
+                        array.append(copy_document(item))
+
+            elif operator == "$pull":
+                array = get_array(document, path)
+
+                if isinstance(value, dict):
+                    array[:] = [item for item in array if not match_condition(item, value)]
+                else:
+                    array[:] = [item for item in array if item != value]
+
+            elif operator == "$pop":
+                array = get_array(document, path)
+
+                if len(array):
+                    array.pop(0 if value == -1 else -1)
+
+            else:
+                raise ValueError(f"Unsupported update operator '{operator}'.")
+
+def apply_projection(document,
+                     projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+
+    """
+    Get the fields of a document selected by an inclusion ({"a": 1}) or exclusion ({"a": 0}) projection.
+    """
+
+    if not projection:
+        return document
+
+    include_id = bool(projection.get("_id", 1))
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+
+    if not len(fields) and include_id:
+        # {"_id": 1}
+        projected_document = {"_id": document["_id"]} if "_id" in document else {}
+    elif not any(fields.values()):
+        # exclusion
+        projected_document = {key: value for key, value in document.items() if key not in fields}
+    else:
+        projected_document = {}
+        for path in fields:
+            value = get_field(document, path)
+            if value is not MISSING:
+                set_field(projected_document, path, value)
+
+        if "_id" in document:
+            projected_document["_id"] = document["_id"]
+
+    if not include_id:
+        projected_document.pop("_id", None)
+
+    return projected_document
+
+def get_sort_key(document,
+                 path) -> Tuple[int, Any]:
+
+    value = get_field(document, path)
+
+    # missing and null values come first, as in MongoDB
+    if value is MISSING or value is None:
+        return (0, 0)
+
+    return (1, value)
+
+def sort_documents(documents,
+                   sort: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+
+    """
+    Sort documents by a list of (path, direction) pairs.
+    """
+
+    documents = list(documents)
+
+    # stable sorts from the last key to the first
+    for path, direction in reversed(sort):
+        documents.sort(key=lambda document: get_sort_key(document, path), reverse=direction < 0)
+
+    return documents
@@ -0,0 +1,56 @@
+from typing import Any, Callable
+import concurrent.futures
+
+def completed_future(result: Any) -> concurrent.futures.Future:
+    """
+    A future that is already done with the result.
+    """
+
+    future = concurrent.futures.Future()
+    future.set_result(result)
+
+    return future
+
+def failed_future(error: BaseException) -> concurrent.futures.Future:
+    """
+    A future that is already done with the error.
+    """
+
+    future = concurrent.futures.Future()
+    future.set_exception(error)
+
+    return future
+
+def copy_future_result(source: concurrent.futures.Future,
+                       target: concurrent.futures.Future) -> None:
+    """
+    Complete target with the result (or error) of source, which must be done.
+    """
+
+    error = source.exception()
+
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+def chain_future(source: concurrent.futures.Future,
+                 function: Callable[[Any], Any]) -> concurrent.futures.Future:
+    """
+    A future of function(result of source), or of its error.
+
+    function runs in the thread that completes source (or right away if it is
+    already done), so it must be quick and must not block.
+    """
+
+    future = concurrent.futures.Future()
+
+    def on_done(source: concurrent.futures.Future) -> None:
+        try:
+            future.set_result(function(source.result()))
+        except Exception as e:
+            future.set_exception(e)
+
+    source.add_done_callback(on_done)
+
+    return future
@@ -1,8 +1,15 @@
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 def get_inference_client() -> OpenAI:
 
-    cleint = OpenAI()
+    # retries are done by RetryPolicy
+    cleint = OpenAI(max_retries=0)
 
-    return cleint
\ No newline at end of file
+    return cleint
+
+def get_async_inference_client() -> AsyncOpenAI:
+
+    client = AsyncOpenAI(max_retries=0)
+
+    return client
@@ -0,0 +1,201 @@
+
+from typing import Dict, Any, Optional, Tuple
+from logging.handlers import QueueHandler, QueueListener
+import threading
+import logging
+import copy
+import atexit
+import queue
+import sys
+
+from .constants import (LOG_QUEUE_SIZE,
+                        LOG_SAMPLE_RATE)
+
+LOGGER_NAMES = [
+    "language_app_backend",
+    "player_app",
+]
+
+class QueuedStreamHandler(QueueHandler):
+
+    """
+    Logging handler that never blocks the caller: records go to a bounded queue and are written to the stream by a listener thread.
+
+    When the queue is full the record is dropped and counted, and the number
+    of dropped records is logged once there is room again.
+    """
+
+    def __init__(self,
+                 queue_size: int = LOG_QUEUE_SIZE,
+                 stream=None) -> None:
+
+        super().__init__(queue.Queue(maxsize=queue_size))
+
+        self.stream_handler = logging.StreamHandler(sys.stderr if stream is None else stream)
+        self.dropped_lock = threading.Lock()
+        self.number_of_dropped_records = 0
+
+        self.listener = QueueListener(self.queue, self.stream_handler)
+        self.listener.start()
+
+        # write what is still queued when the process exits
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt) -> None:
+
+        # records are formatted by the listener thread
+        super().setFormatter(fmt)
+        self.stream_handler.setFormatter(fmt)
+
+    def prepare(self, record) -> logging.LogRecord:
+
+        # the arguments are merged now, as they may change once the caller goes on,
+        # the rest of the formatting (time, level, ...) is left to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record) -> None:
+
+        try:
+            if self.number_of_dropped_records:
+                self.enqueue_number_of_dropped_records()
+
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock:
+                self.number_of_dropped_records += 1
+
+    def enqueue_number_of_dropped_records(self) -> None:
+
+        with self.dropped_lock:
+
+            if not self.number_of_dropped_records:
+                return
+
+            dropped_record = logging.makeLogRecord({"name": "language_app_backend.util.log",
+                                                    "levelno": logging.WARNING,
+                                                    "levelname": "WARNING",
+                                                    "msg": f"Dropped {self.number_of_dropped_records} log records, the log queue was full."})
+            # raises queue.Full, and the count is kept, if there is still no room
+            self.queue.put_nowait(dropped_record)
+            self.number_of_dropped_records = 0
+
+    def close(self) -> None:
+
+        listener = self.listener
+        self.listener = None
+
+        if listener is not None:
+            # writes the queued records before the thread stops
+            listener.stop()
+
+        super().close()
+
+class SamplingFilter(logging.Filter):
+
+    """
+    Keep only 1 of every sample_rate debug records with the same logger and message, warnings and errors always pass.
+
+    Messages are grouped by their template (the message before the arguments are
+    merged), so every call site is sampled on its own.
+    """
+
+    def __init__(self,
+                 sample_rate: int = LOG_SAMPLE_RATE) -> None:
+
+        super().__init__()
+
+        self.sample_rate = max(1, int(sample_rate))
+        self.lock = threading.Lock()
+        self.counts: Dict[Tuple[str, Any], int] = {}
+
+    def filter(self, record) -> bool:
+
+        if self.sample_rate == 1 or record.levelno > logging.DEBUG:
+            return True
+
+        key = (record.name, record.msg)
+
+        with self.lock:
+            count = self.counts.get(key, 0)
+            self.counts[key] = count + 1
+
+        return count % self.sample_rate == 0
+
+def parse_module_levels(module_levels: Optional[str]) -> Dict[str, str]:
+
+    """
+    Parse per module levels like "language_app_backend.obj.LLM=DEBUG,player_app=WARNING".
+    """
+
+    levels = {}
+
+    if not module_levels:
+        return levels
+
+    for item in module_levels.split(","):
+
+        if not item.strip():
+            continue
+
+        if "=" not in item:
+            raise ValueError(f"Invalid module log level '{item}', expected module=LEVEL.")
+
+        module_name, level = item.split("=", 1)
+        levels[module_name.strip()] = level.strip().upper()
+
+    return levels
+
+def get_logging_config(level: str = "INFO",
+                       module_levels: Optional[str] = None,
+                       sample_rate: int = LOG_SAMPLE_RATE,
+                       queue_size: int = LOG_QUEUE_SIZE) -> Dict[str, Any]:
+
+    """
+    Get the dictConfig (Django's LOGGING setting) writing the app's loggers through a QueuedStreamHandler.
+    """
+
+    loggers = {logger_name: {"handlers": ["queued"],
+                             "level": level.upper(),
+                             "propagate": False} for logger_name in LOGGER_NAMES}
+
+    for module_name, module_level in parse_module_levels(module_levels).items():
+
+        if module_name in loggers:
+            loggers[module_name]["level"] = module_level
+        else:
+            # handled by the app logger it belongs to
+            loggers[module_name] = {"level": module_level}
+
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "default": {
+                "format": "%(asctime)s %(levelname)s %(process)d %(threadName)s %(name)s: %(message)s",
+            },
+        },
+        "filters": {
+            "sampling": {
+                "()": SamplingFilter,
+                "sample_rate": sample_rate,
+            },
+        },
+        "handlers": {
+            "queued": {
+                "()": QueuedStreamHandler,
+                "queue_size": queue_size,
+                "formatter": "default",
+                "filters": ["sampling"],
+            },
+        },
+        "loggers": loggers,
+    }
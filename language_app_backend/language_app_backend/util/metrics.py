@@ -0,0 +1,442 @@
+
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import contextlib
+import threading
+import tempfile
+import logging
+import atexit
+import bisect
+import json
+import time
+import os
+
+from pymongo import monitoring
+
+from .constants import (METRICS_SNAPSHOT_INTERVAL,
+                        METRICS_STALE_AFTER,
+                        METRICS_LATENCY_BUCKETS)
+
+logger = logging.getLogger("language_app_backend.util.metrics")
+
+# counters, histograms and gauges of this process, written to one JSON file per process
+# so the /metrics endpoint of any gunicorn worker can add up the whole server
+
+class MetricsRegistry:
+
+    """
+    Thread-safe counters, histograms and gauges, keyed by name and labels.
+    """
+
+    __slots__ = [
+        "lock",
+        "buckets",
+        "counters",
+        "histograms",
+        "gauges",
+        "gauge_functions",
+    ]
+    def __init__(self,
+                 buckets: List[float] = METRICS_LATENCY_BUCKETS) -> None:
+
+        self.lock = threading.Lock()
+        self.buckets = list(buckets)
+        self.counters: Dict[Tuple, float] = {}
+        # bucket counts (the last one is +Inf), sum, count
+        self.histograms: Dict[Tuple, List[Any]] = {}
+        self.gauges: Dict[Tuple, float] = {}
+        self.gauge_functions: Dict[Tuple, Callable] = {}
+
+    def increment(self,
+                  name,
+                  labels: Optional[Dict[str, str]] = None,
+                  value: float = 1) -> None:
+
+        key = get_key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self,
+                name,
+                value,
+                labels: Optional[Dict[str, str]] = None) -> None:
+
+        key = get_key(name, labels)
+        bucket_i = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+
+            histogram = self.histograms.get(key, None)
+            if histogram is None:
+                histogram = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.histograms[key] = histogram
+
+            histogram[0][bucket_i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def set_gauge(self,
+                  name,
+                  value,
+                  labels: Optional[Dict[str, str]] = None) -> None:
+
+        key = get_key(name, labels)
+
+        with self.lock:
+            self.gauges[key] = value
+
+    def register_gauge_function(self,
+                                name,
+                                function: Callable,
+                                labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Register a function returning the value of a gauge, called on every snapshot (queue depths, ...).
+        """
+
+        key = get_key(name, labels)
+
+        with self.lock:
+            self.gauge_functions[key] = function
+
+    def get_snapshot(self) -> Dict[str, Any]:
+
+        with self.lock:
+            counters = list(self.counters.items())
+            histograms = [(key, [list(histogram[0]), histogram[1], histogram[2]]) for key, histogram in self.histograms.items()]
+            gauges = dict(self.gauges)
+            gauge_functions = list(self.gauge_functions.items())
+
+        # called outside the lock, they may take locks of their own
+        for key, function in gauge_functions:
+            try:
+                gauges[key] = function()
+            except Exception as e:
+                logger.error("Error reading gauge '%s': %s", key[0], e)
+
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "buckets": self.buckets,
+            "counters": [{"name": key[0], "labels": dict(key[1]), "value": value} for key, value in counters],
+            "histograms": [{"name": key[0], "labels": dict(key[1]), "bucket_counts": histogram[0], "sum": histogram[1], "count": histogram[2]}
+                           for key, histogram in histograms],
+            "gauges": [{"name": key[0], "labels": dict(key[1]), "value": value} for key, value in gauges.items()],
+        }
+
+def get_key(name,
+            labels: Optional[Dict[str, str]]) -> Tuple:
+
+    if not labels:
+        return (name, ())
+
+    return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+REGISTRY = MetricsRegistry()
+
+def increment_counter(name,
+                      labels: Optional[Dict[str, str]] = None,
+                      value: float = 1) -> None:
+
+    REGISTRY.increment(name, labels, value)
+
+def observe_histogram(name,
+                      value,
+                      labels: Optional[Dict[str, str]] = None) -> None:
+
+    REGISTRY.observe(name, value, labels)
+
+def set_gauge(name,
+              value,
+              labels: Optional[Dict[str, str]] = None) -> None:
+
+    REGISTRY.set_gauge(name, value, labels)
+
+def register_gauge_function(name,
+                            function: Callable,
+                            labels: Optional[Dict[str, str]] = None) -> None:
+
+    REGISTRY.register_gauge_function(name, function, labels)
+
+def register_cache_gauges(cache_name,
+                          cache) -> None:
+    """
+    Export the entries, hits, misses and evictions of an LRUCache as gauges labeled with the cache name.
+    """
+
+    for stat in ["entries", "hits", "misses", "evictions"]:
+        register_gauge_function(f"language_app_cache_{stat}",
+                                lambda stat=stat: cache.get_stats()[stat],
+                                {"cache": cache_name})
+
+@contextlib.contextmanager
+def observe_duration(name,
+                     labels: Optional[Dict[str, str]] = None):
+    """
+    Observe the time (seconds) spent in the with block in a histogram, also when it raises.
+    """
+
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.monotonic() - start_time, labels)
+
+def get_command_collection(event) -> str:
+
+    """
+    Get the collection of a started command event, "" for commands without one (ping, ...).
+    """
+
+    if event.command_name == "getMore":
+        collection = event.command.get("collection", None)
+    else:
+        collection = event.command.get(event.command_name, None)
+
+    return collection if isinstance(collection, str) else ""
+
+class MongoCommandMetrics(monitoring.CommandListener):
+
+    """
+    Counts and times the commands sent to MongoDB, per command and collection.
+    """
+
+    def __init__(self) -> None:
+
+        self.lock = threading.Lock()
+        self.started_commands: Dict[Tuple[Any, int], Dict[str, str]] = {}
+
+    def started(self, event) -> None:
+
+        labels = {"command": event.command_name,
+                  "collection": get_command_collection(event)}
+
+        with self.lock:
+            self.started_commands[(event.connection_id, event.request_id)] = labels
+
+    def finished(self, event, is_success) -> None:
+
+        with self.lock:
+            labels = self.started_commands.pop((event.connection_id, event.request_id), None)
+
+        if labels is None:
+            return
+
+        REGISTRY.observe("language_app_mongo_command_duration_seconds", event.duration_micros / 1e6, labels)
+
+        if not is_success:
+            REGISTRY.increment("language_app_mongo_command_failures_total", labels)
+
+    def succeeded(self, event) -> None:
+
+        self.finished(event, True)
+
+    def failed(self, event) -> None:
+
+        self.finished(event, False)
+
+def get_metrics_directory() -> str:
+
+    """
+    Directory shared by the processes of a server, LANGUAGE_APP_METRICS_DIRECTORY or one in the temporary directory.
+    """
+
+    return os.environ.get("LANGUAGE_APP_METRICS_DIRECTORY",
+                          os.path.join(tempfile.gettempdir(), "language_app_metrics"))
+
+def write_metrics_snapshot(directory: Optional[str] = None) -> None:
+
+    directory = directory or get_metrics_directory()
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    temporary_path = f"{path}.tmp"
+
+    with open(temporary_path, "w") as f:
+        json.dump(REGISTRY.get_snapshot(), f)
+
+    # readers never see a half written file
+    os.replace(temporary_path, path)
+
+def remove_metrics_snapshot(directory: Optional[str] = None) -> None:
+
+    directory = directory or get_metrics_directory()
+
+    try:
+        os.remove(os.path.join(directory, f"{os.getpid()}.json"))
+    except FileNotFoundError:
+        pass
+
+def metrics_snapshot_function(directory,
+                              interval) -> None:
+
+    while True:
+
+        try:
+            write_metrics_snapshot(directory)
+        except Exception as e:
+            logger.error("Error writing metrics snapshot: %s", e)
+
+        time.sleep(interval)
+
+SNAPSHOT_THREAD_LOCK = threading.Lock()
+SNAPSHOT_THREADS: Dict[int, threading.Thread] = {}
+
+def start_metrics_snapshots(directory: Optional[str] = None,
+                            interval: float = METRICS_SNAPSHOT_INTERVAL) -> None:
+    """
+    Write the metrics of this process every interval seconds, once per process.
+    """
+
+    directory = directory or get_metrics_directory()
+
+    with SNAPSHOT_THREAD_LOCK:
+
+        # keyed by pid, a forked worker starts its own thread
+        if os.getpid() in SNAPSHOT_THREADS:
+            return
+
+        thread = threading.Thread(target=metrics_snapshot_function,
+                                  args=(directory, interval),
+                                  name="metrics-snapshots",
+                                  daemon=True)
+        thread.start()
+        SNAPSHOT_THREADS[os.getpid()] = thread
+
+    atexit.register(remove_metrics_snapshot, directory)
+
+def read_metrics_snapshots(directory: Optional[str] = None,
+                           stale_after: float = METRICS_STALE_AFTER) -> List[Dict[str, Any]]:
+    """
+    Read the snapshot of every process of the server, removing the ones of processes that stopped writing.
+    """
+
+    directory = directory or get_metrics_directory()
+    snapshots = []
+
+    if not os.path.isdir(directory):
+        return snapshots
+
+    current_time = time.time()
+
+    for filename in os.listdir(directory):
+
+        if not filename.endswith(".json"):
+            continue
+
+        path = os.path.join(directory, filename)
+
+        try:
+            if current_time - os.path.getmtime(path) > stale_after:
+                os.remove(path)
+                continue
+
+            with open(path, "r") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            # removed or replaced by its process in the meantime
+            logger.debug("Skipping metrics snapshot '%s': %s", filename, e)
+
+    return snapshots
+
+def aggregate_metrics_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Add up the counters and histograms of the processes, gauges are kept per process (pid label).
+    """
+
+    counters: Dict[Tuple, float] = {}
+    histograms: Dict[Tuple, List[Any]] = {}
+    gauges: Dict[Tuple, float] = {}
+    buckets = METRICS_LATENCY_BUCKETS
+
+    for snapshot in snapshots:
+
+        for counter in snapshot["counters"]:
+            key = get_key(counter["name"], counter["labels"])
+            counters[key] = counters.get(key, 0) + counter["value"]
+
+        # processes running another version of the buckets are skipped
+        if snapshot["buckets"] == buckets:
+            for histogram in snapshot["histograms"]:
+                key = get_key(histogram["name"], histogram["labels"])
+
+                if key not in histograms:
+                    histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+
+                aggregated_histogram = histograms[key]
+                for bucket_i, bucket_count in enumerate(histogram["bucket_counts"]):
+                    aggregated_histogram[0][bucket_i] += bucket_count
+                aggregated_histogram[1] += histogram["sum"]
+                aggregated_histogram[2] += histogram["count"]
+
+        for gauge in snapshot["gauges"]:
+            key = get_key(gauge["name"], {**gauge["labels"], "pid": snapshot["pid"]})
+            gauges[key] = gauge["value"]
+
+    return {
+        "buckets": buckets,
+        "counters": counters,
+        "histograms": histograms,
+        "gauges": gauges,
+    }
+
+def format_labels(labels: Tuple,
+                  extra_labels: Tuple = ()) -> str:
+
+    labels = labels + extra_labels
+
+    if not len(labels):
+        return ""
+
+    escaped_labels = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        escaped_labels.append(f"{key}=\"{value}\"")
+
+    return "{" + ",".join(escaped_labels) + "}"
+
+def format_metrics(metrics: Dict[str, Any]) -> str:
+    """
+    Format aggregated metrics in the Prometheus text exposition format.
+    """
+
+    lines = []
+
+    for metric_type, values in [("counter", metrics["counters"]),
+                                ("gauge", metrics["gauges"])]:
+
+        last_name = None
+        for (name, labels), value in sorted(values.items()):
+
+            if name != last_name:
+                lines.append(f"# TYPE {name} {metric_type}")
+                last_name = name
+
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+    bucket_bounds = [str(bucket) for bucket in metrics["buckets"]] + ["+Inf"]
+
+    last_name = None
+    for (name, labels), (bucket_counts, histogram_sum, histogram_count) in sorted(metrics["histograms"].items()):
+
+        if name != last_name:
+            lines.append(f"# TYPE {name} histogram")
+            last_name = name
+
+        cumulative_count = 0
+        for bucket_bound, bucket_count in zip(bucket_bounds, bucket_counts):
+            cumulative_count += bucket_count
+            lines.append(f"{name}_bucket{format_labels(labels, (('le', bucket_bound),))} {cumulative_count}")
+
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram_sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram_count}")
+
+    return "\n".join(lines) + "\n"
+
+def get_server_metrics(directory: Optional[str] = None) -> str:
+    """
+    Get the metrics of every process of this server in the Prometheus text format, starting with a fresh snapshot of this process.
+    """
+
+    write_metrics_snapshot(directory)
+
+    return format_metrics(aggregate_metrics_snapshots(read_metrics_snapshots(directory)))
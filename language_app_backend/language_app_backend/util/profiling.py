@@ -0,0 +1,234 @@
+
+from typing import Dict, Optional, Tuple
+import threading
+import tempfile
+import cProfile
+import time
+import sys
+import os
+
+from .constants import (PROFILING_SAMPLE_INTERVAL,
+                        PROFILING_MAX_FILES)
+
+PROFILING_MODES = ["sampling", "cprofile"]
+
+class StackSampler:
+
+    """
+    Sampling profiler of one thread: a helper thread records the thread's stack every interval seconds.
+
+    The stacks are counted in the collapsed format of flamegraph.pl and
+    speedscope ("root;caller;function count" per line). The overhead does not
+    depend on the number of calls, so it is the mode to use on production traffic.
+    """
+
+    __slots__ = [
+        "thread_id",
+        "interval",
+        "stack_counts",
+        "number_of_samples",
+        "stop_event",
+        "sampler_thread",
+    ]
+    def __init__(self,
+                 thread_id: Optional[int] = None,
+                 interval: float = PROFILING_SAMPLE_INTERVAL) -> None:
+
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.stack_counts: Dict[Tuple[str, ...], int] = {}
+        self.number_of_samples = 0
+        self.stop_event = threading.Event()
+        self.sampler_thread = None
+
+    def start(self) -> None:
+
+        self.sampler_thread = threading.Thread(target=self.sampler_function, daemon=True)
+        self.sampler_thread.start()
+
+    def stop(self) -> None:
+
+        self.stop_event.set()
+
+        if self.sampler_thread is not None:
+            self.sampler_thread.join()
+
+    def sampler_function(self) -> None:
+
+        while not self.stop_event.wait(self.interval):
+
+            frame = sys._current_frames().get(self.thread_id, None)
+
+            if frame is None:
+                break
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                # per function rather than per line, so the samples of a function add up
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ":"))
+                frame = frame.f_back
+
+            stack = tuple(reversed(stack))
+            self.stack_counts[stack] = self.stack_counts.get(stack, 0) + 1
+            self.number_of_samples += 1
+
+    def get_collapsed_stacks(self) -> str:
+
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stack_counts.items())
+
+    def write(self,
+              path) -> None:
+
+        with open(path, "w") as f:
+            f.write(self.get_collapsed_stacks())
+
+class RequestProfiler:
+
+    """
+    Profile the code run in this thread between start and stop, with the sampling profiler or cProfile.
+
+    Sampling profiles are written as collapsed stacks (.collapsed, for
+    flamegraph.pl or speedscope), cProfile profiles as pstats files (.prof,
+    for snakeviz, flameprof or python -m pstats).
+    """
+
+    __slots__ = [
+        "mode",
+        "profiler",
+        "start_time",
+        "duration",
+    ]
+    def __init__(self,
+                 mode: str = "sampling",
+                 interval: float = PROFILING_SAMPLE_INTERVAL) -> None:
+
+        if mode not in PROFILING_MODES:
+            raise ValueError(f"Unsupported profiling mode '{mode}', expected one of {PROFILING_MODES}.")
+
+        self.mode = mode
+        self.profiler = StackSampler(interval=interval) if mode == "sampling" else cProfile.Profile()
+        self.start_time = None
+        self.duration = None
+
+    def start(self) -> None:
+
+        self.start_time = time.monotonic()
+
+        if self.mode == "sampling":
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self) -> None:
+
+        if self.mode == "sampling":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+        self.duration = time.monotonic() - self.start_time
+
+    def get_file_extension(self) -> str:
+
+        return "collapsed" if self.mode == "sampling" else "prof"
+
+    def write(self,
+              path) -> None:
+
+        if self.mode == "sampling":
+            self.profiler.write(path)
+        else:
+            self.profiler.dump_stats(path)
+
+def get_profiling_directory() -> str:
+
+    """
+    Directory the profiles are written to, LANGUAGE_APP_PROFILING_DIRECTORY or one in the temporary directory.
+    """
+
+    return os.environ.get("LANGUAGE_APP_PROFILING_DIRECTORY",
+                          os.path.join(tempfile.gettempdir(), "language_app_profiles"))
+
+def remove_old_profiles(directory,
+                        max_files: int = PROFILING_MAX_FILES) -> None:
+
+    """
+    Remove the oldest profiles of the directory so at most max_files are kept.
+    """
+
+    paths = [os.path.join(directory, file_name) for file_name in os.listdir(directory)
+             if file_name.endswith((".collapsed", ".prof"))]
+
+    if len(paths) <= max_files:
+        return
+
+    modification_times = {}
+    for path in paths:
+        try:
+            modification_times[path] = os.path.getmtime(path)
+        except FileNotFoundError:
+            # removed by another process
+            modification_times[path] = 0.0
+
+    paths.sort(key=lambda path: modification_times[path])
+
+    for path in paths[:len(paths) - max_files]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def write_profile(profiler: RequestProfiler,
+                  name,
+                  directory: Optional[str] = None,
+                  max_files: int = PROFILING_MAX_FILES) -> str:
+
+    """
+    Write the profile to "<name>.<time in ms>.<duration in ms>ms.<pid>.<extension>" in the profiling directory and get its path.
+    """
+
+    directory = directory or get_profiling_directory()
+    os.makedirs(directory, exist_ok=True)
+
+    file_name = (f"{name}.{int(time.time() * 1000)}.{int(profiler.duration * 1000)}ms."
+                 f"{os.getpid()}.{profiler.get_file_extension()}")
+    path = os.path.join(directory, file_name)
+    temporary_path = f"{path}.tmp"
+
+    profiler.write(temporary_path)
+    os.replace(temporary_path, path)
+
+    remove_old_profiles(directory, max_files)
+
+    return path
+
+# cProfile can only profile one thread at a time in recent Python versions,
+# and one profiled request at a time also bounds the overhead of the sampler
+PROFILING_LOCK = threading.Lock()
+
+def try_start_profiler(mode: str,
+                       interval: float = PROFILING_SAMPLE_INTERVAL) -> Optional[RequestProfiler]:
+
+    """
+    Start a profiler unless another request of this process is being profiled, in which case None is returned.
+    """
+
+    if not PROFILING_LOCK.acquire(blocking=False):
+        return None
+
+    try:
+        profiler = RequestProfiler(mode, interval)
+        profiler.start()
+    except Exception:
+        PROFILING_LOCK.release()
+        raise
+
+    return profiler
+
+def stop_profiler(profiler: RequestProfiler) -> None:
+
+    try:
+        profiler.stop()
+    finally:
+        PROFILING_LOCK.release()
@@ -0,0 +1,24 @@
+
+import math
+
+from .constants import WILSON_SCORE_Z
+
+def wilson_lower_bound(positive: int,
+                       total: int,
+                       z: float = WILSON_SCORE_Z) -> float:
+
+    """
+    Lower bound of the Wilson score interval for the fraction of positive votes.
+    Ranks items by quality while accounting for how many votes they have.
+    """
+
+    if total <= 0:
+        return 0.0
+
+    fraction = positive / total
+    z_squared = z * z
+
+    centre = fraction + z_squared / (2 * total)
+    margin = z * math.sqrt((fraction * (1 - fraction) + z_squared / (4 * total)) / total)
+
+    return (centre - margin) / (1 + z_squared / total)
@@ -0,0 +1,159 @@
+
+from typing import Dict, Optional
+import contextvars
+import contextlib
+import threading
+import logging
+
+from pymongo import monitoring
+
+from .metrics import get_command_collection
+
+logger = logging.getLogger("language_app_backend.util.round_trips")
+
+class RoundTrips:
+
+    """
+    Number and total time of the MongoDB round trips of a request or background task, and the count of each command.
+
+    Round trips are also added to the enclosing RoundTrips, so a budget around
+    a test client call sees the round trips of the request it makes.
+    """
+
+    __slots__ = [
+        "name",
+        "parent",
+        "lock",
+        "count",
+        "duration",
+        "commands",
+    ]
+    def __init__(self,
+                 name: str,
+                 parent: Optional["RoundTrips"] = None) -> None:
+
+        self.name = name
+        self.parent = parent
+        self.lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+        self.commands: Dict[str, int] = {}
+
+    def record(self,
+               command_name,
+               collection,
+               duration) -> None:
+
+        command = f"{command_name} {collection}" if collection else command_name
+
+        round_trips = self
+        while round_trips is not None:
+
+            with round_trips.lock:
+                round_trips.count += 1
+                round_trips.duration += duration
+                round_trips.commands[command] = round_trips.commands.get(command, 0) + 1
+
+            round_trips = round_trips.parent
+
+    def get_summary(self) -> str:
+
+        with self.lock:
+            commands = ", ".join(f"{command}: {count}" for command, count in sorted(self.commands.items(), key=lambda item: -item[1]))
+            return f"{self.count} MongoDB round trips in {self.duration * 1000:.1f} ms ({commands})"
+
+# the RoundTrips of the code running in this thread (or asyncio task), None if nothing is tracked
+CURRENT_ROUND_TRIPS = contextvars.ContextVar("current_round_trips", default=None)
+
+def record_round_trip(command_name,
+                      collection,
+                      duration) -> None:
+
+    round_trips = CURRENT_ROUND_TRIPS.get()
+
+    if round_trips is not None:
+        round_trips.record(command_name, collection, duration)
+
+@contextlib.contextmanager
+def track_round_trips(name,
+                      warning_threshold: Optional[int] = None):
+    """
+    Count the round trips made in the with block, logged when it ends (as a warning above warning_threshold).
+
+    The name can be changed in the block (for example once the view of a request is known).
+    """
+
+    round_trips = RoundTrips(name, CURRENT_ROUND_TRIPS.get())
+    token = CURRENT_ROUND_TRIPS.set(round_trips)
+
+    try:
+        yield round_trips
+    finally:
+        CURRENT_ROUND_TRIPS.reset(token)
+
+        if warning_threshold is not None and round_trips.count > warning_threshold:
+            logger.warning("%s: %s", round_trips.name, round_trips.get_summary())
+        elif round_trips.count:
+            logger.debug("%s: %s", round_trips.name, round_trips.get_summary())
+
+class RoundTripBudgetExceeded(AssertionError):
+
+    """
+    Raised by round_trip_budget, an AssertionError so test runners report it as a failure.
+    """
+
+@contextlib.contextmanager
+def round_trip_budget(max_round_trips: int,
+                      name: str = "Code block"):
+    """
+    Raise RoundTripBudgetExceeded if the with block makes more than max_round_trips MongoDB round trips.
+
+        with round_trip_budget(6):
+            client.get("/submit_answer", {...})
+    """
+
+    with track_round_trips(name) as round_trips:
+        yield round_trips
+
+    if round_trips.count > max_round_trips:
+        raise RoundTripBudgetExceeded(f"{round_trips.name} is over its budget of {max_round_trips}: {round_trips.get_summary()}")
+
+class MongoRoundTripListener(monitoring.CommandListener):
+
+    """
+    Adds every command sent to MongoDB to the RoundTrips of the request or task that sent it.
+    """
+
+    def __init__(self) -> None:
+
+        self.lock = threading.Lock()
+        self.started_commands = {}
+
+    def started(self, event) -> None:
+
+        round_trips = CURRENT_ROUND_TRIPS.get()
+
+        if round_trips is None:
+            return
+
+        with self.lock:
+            self.started_commands[(event.connection_id, event.request_id)] = (round_trips, get_command_collection(event))
+
+    def finished(self, event) -> None:
+
+        with self.lock:
+            started_command = self.started_commands.pop((event.connection_id, event.request_id), None)
+
+        if started_command is None:
+            return
+
+        round_trips, collection = started_command
+        round_trips.record(event.command_name, collection, event.duration_micros / 1e6)
+
+    def succeeded(self, event) -> None:
+
+        self.finished(event)
+
+    def failed(self, event) -> None:
+
+        self.finished(event)
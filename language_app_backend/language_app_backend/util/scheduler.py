@@ -0,0 +1,137 @@
+
+from typing import Optional, Tuple, List, Dict, Any, Sequence
+import time
+
+import numpy as np
+
+from .constants import NEXT_WORD_TEMPERATURE
+
+def latest_values(histories: Sequence[Sequence[float]],
+                  default: float = 0.0) -> np.ndarray:
+
+    """
+    Pack the last entry of every history list into a contiguous float64 buffer.
+    """
+
+    return np.fromiter((history[-1] if len(history) else default for history in histories),
+                       dtype=np.float64,
+                       count=len(histories))
+
+def pack_user_words(user_words: List[Dict[Any, Any]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+
+    """
+    Convert user_words documents into (word_ids, last_scores, last_visited_times),
+    where the scores and times are the latest values as float64 arrays (times are epoch seconds).
+    """
+
+    word_ids = [word["word_id"] for word in user_words]
+    last_scores = latest_values([word.get("last_scores", []) for word in user_words])
+    last_visited_times = latest_values([word.get("last_visited_times", []) for word in user_words])
+
+    return word_ids, last_scores, last_visited_times
+
+def next_word_indices(word_scores: np.ndarray,
+                      word_last_visited_times: np.ndarray,
+                      lengths: np.ndarray,
+                      current_time: Optional[float] = None,
+                      temperature: float = NEXT_WORD_TEMPERATURE) -> np.ndarray:
+
+    """
+    Select the next word for many users in one vectorized call.
+
+    word_scores and word_last_visited_times are the flat concatenation of every user's
+    latest scores and latest visited times (epoch seconds, 0 if never visited),
+    lengths holds the number of words of each user. Returns one index per user,
+    relative to the start of that user's segment.
+    """
+
+    word_scores = np.ascontiguousarray(word_scores, dtype=np.float64)
+    word_last_visited_times = np.ascontiguousarray(word_last_visited_times, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+
+    assert word_scores.shape == word_last_visited_times.shape, "All arrays must be of the same length."
+    assert lengths.sum() == word_scores.shape[0], "Lengths must add up to the number of words."
+    assert np.all(lengths > 0), "No words available to select from."
+
+    if current_time is None:
+        current_time = time.time()
+
+    number_of_users = lengths.shape[0]
+    offsets = np.zeros(number_of_users, dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+
+    # adjusted score = (1 - score) * (1 + time_since_last_visit / time_since_oldest_visit) - 1
+    time_since_last_visit = current_time - word_last_visited_times
+    time_since_oldest_visit = np.maximum.reduceat(time_since_last_visit, offsets)
+
+    has_visits = time_since_oldest_visit > 0
+    safe_time_since_oldest_visit = np.where(has_visits, time_since_oldest_visit, 1.0)
+
+    relative_time_since_last_visit = time_since_last_visit / np.repeat(safe_time_since_oldest_visit, lengths)
+
+    adjusted_scores = (1 - word_scores) * (1 + relative_time_since_last_visit) - 1
+
+    # apply temperature noise
+    adjusted_scores += np.random.normal(0, temperature, size=adjusted_scores.shape)
+
+    # first index of the maximum of each segment
+    segment_max = np.maximum.reduceat(adjusted_scores, offsets)
+    is_max = adjusted_scores == np.repeat(segment_max, lengths)
+    max_positions = np.flatnonzero(is_max)
+    max_segments = np.searchsorted(offsets, max_positions, side="right") - 1
+    _, first_max = np.unique(max_segments, return_index=True)
+    indices = max_positions[first_max] - offsets
+
+    if not np.all(has_visits):
+        # no words have been visited yet, use a random word
+        random_indices = (np.random.rand(number_of_users) * lengths).astype(np.int64)
+        indices = np.where(has_visits, indices, random_indices)
+
+    return indices
+
+def next_word(word_ids: Sequence[str],
+              word_scores: np.ndarray,
+              word_last_visited_times: np.ndarray,
+              current_time: Optional[float] = None,
+              temperature: float = NEXT_WORD_TEMPERATURE) -> str:
+
+    """
+    Select the next word to show to the user based on their latest scores and last visited times (epoch seconds).
+    """
+
+    assert len(word_ids) > 0, "No words available to select from."
+
+    lengths = np.array([len(word_ids)], dtype=np.int64)
+
+    index = next_word_indices(word_scores,
+                              word_last_visited_times,
+                              lengths,
+                              current_time=current_time,
+                              temperature=temperature)[0]
+
+    return word_ids[index]
+
+def next_words(users_word_ids: Sequence[Sequence[str]],
+               users_word_scores: Sequence[np.ndarray],
+               users_word_last_visited_times: Sequence[np.ndarray],
+               current_time: Optional[float] = None,
+               temperature: float = NEXT_WORD_TEMPERATURE) -> List[str]:
+
+    """
+    Select the next word for each user, one entry per user (the same user may appear several times).
+    """
+
+    if not len(users_word_ids):
+        return []
+
+    lengths = np.fromiter((len(word_ids) for word_ids in users_word_ids),
+                          dtype=np.int64,
+                          count=len(users_word_ids))
+
+    indices = next_word_indices(np.concatenate(users_word_scores),
+                                np.concatenate(users_word_last_visited_times),
+                                lengths,
+                                current_time=current_time,
+                                temperature=temperature)
+
+    return [word_ids[index] for word_ids, index in zip(users_word_ids, indices)]
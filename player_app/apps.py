@@ -1,10 +1,13 @@
 import os
+import logging
 from dotenv import load_dotenv
 
 from django.apps import AppConfig
 
 from language_app_backend.util.db import setup_globals
 
+logger = logging.getLogger("player_app.apps")
+
 class PlayerAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'player_app'
@@ -15,5 +18,5 @@ class PlayerAppConfig(AppConfig):
             try:
                 setup_globals()
             except Exception as e:
-                print(f"Error setting up globals: {e}")
+                logger.error("Error setting up globals: %s", e)
                 raise e
\ No newline at end of file
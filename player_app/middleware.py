@@ -0,0 +1,132 @@
+import logging
+import random
+import hmac
+import time
+import os
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from language_app_backend.util.metrics import observe_histogram
+from language_app_backend.util.round_trips import track_round_trips
+from language_app_backend.util.profiling import (try_start_profiler,
+                                                 stop_profiler,
+                                                 write_profile)
+from language_app_backend.util.constants import MONGO_ROUND_TRIPS_PER_REQUEST_WARNING
+
+logger = logging.getLogger("player_app.middleware")
+
+def get_view_name(request):
+
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is not None and resolver_match.url_name:
+        return resolver_match.url_name
+
+    # 404s, kept in one label so unknown paths do not create new series
+    return 'unresolved'
+
+class ViewMetricsMiddleware:
+
+    """
+    Observe the latency of every request in a histogram per view (url name) and status code.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        start_time = time.monotonic()
+
+        response = self.get_response(request)
+
+        observe_histogram("language_app_view_duration_seconds",
+                          time.monotonic() - start_time,
+                          {"view": get_view_name(request), "status": str(response.status_code)})
+
+        return response
+
+class MongoRoundTripMiddleware:
+
+    """
+    Count the MongoDB round trips of every request, logged per view (as a warning above MONGO_ROUND_TRIPS_PER_REQUEST_WARNING).
+
+    With DEBUG on, the count and total time are also sent in the
+    X-Mongo-Round-Trips and X-Mongo-Round-Trip-Time (ms) response headers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        with track_round_trips("request", MONGO_ROUND_TRIPS_PER_REQUEST_WARNING) as round_trips:
+
+            response = self.get_response(request)
+
+            # the view is only known once the request has been resolved
+            round_trips.name = f"View '{get_view_name(request)}'"
+
+        if settings.DEBUG:
+            response['X-Mongo-Round-Trips'] = str(round_trips.count)
+            response['X-Mongo-Round-Trip-Time'] = f"{round_trips.duration * 1000:.1f}"
+
+        return response
+
+class ProfilingMiddleware:
+
+    """
+    Profile a fraction (PROFILING_RATE) of the requests, and every request with the X-Profile header set to PROFILING_TOKEN.
+
+    Profiles are written to the profiling directory, named after the view
+    (see language_app_backend.util.profiling). Only one request per process
+    is profiled at a time, the others run as usual. The middleware is left
+    out when there is neither a rate nor a token.
+    """
+
+    def __init__(self, get_response):
+
+        if not settings.PROFILING_RATE and not settings.PROFILING_TOKEN:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def is_profile_requested(self, request):
+
+        if not settings.PROFILING_TOKEN:
+            return False
+
+        profile_token = request.META.get('HTTP_X_PROFILE', None)
+
+        return profile_token is not None and hmac.compare_digest(profile_token, settings.PROFILING_TOKEN)
+
+    def __call__(self, request):
+
+        is_requested = self.is_profile_requested(request)
+
+        if not is_requested and random.random() >= settings.PROFILING_RATE:
+            return self.get_response(request)
+
+        profiler = try_start_profiler(settings.PROFILING_MODE)
+
+        if profiler is None:
+            logger.debug("Not profiling %s, another request is being profiled.", request.path)
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_profiler(profiler)
+
+        try:
+            path = write_profile(profiler, get_view_name(request))
+        except Exception as e:
+            logger.error("Error writing profile: %s", e)
+            return response
+
+        logger.info("Profiled %s (%.1f ms) to %s", request.path, profiler.duration * 1000, path)
+
+        if is_requested:
+            response['X-Profile-File'] = os.path.basename(path)
+
+        return response
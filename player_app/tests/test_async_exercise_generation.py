@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import uuid
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.EventLoopThread import EventLoopThread
+from language_app_backend.obj.GlobalContainer import (GlobalContainer,
+                                                      empty_word_document)
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+from language_app_backend.obj.WorkerPool import WorkerPool
+
+LANGUAGE = "es"
+USER_IDS = [f"learner{user_i}@example.com" for user_i in range(3)]
+
+class AsyncFakeLLM:
+
+    """
+    Creates the same valid exercise for any words on its event loop, once released.
+    """
+
+    def __init__(self,
+                 error=None):
+
+        self.event_loop = EventLoopThread("test-llm-event-loop")
+        self.release_event = threading.Event()
+        self.error = error
+        self.number_of_generations = 0
+
+    def submit(self, coroutine):
+
+        return self.event_loop.submit(coroutine)
+
+    async def create_exercise_async(self,
+                                    word_values,
+                                    language,
+                                    level,
+                                    inspiration_exercises):
+
+        self.number_of_generations += 1
+
+        while not self.release_event.is_set():
+            await asyncio.sleep(0.005)
+
+        if self.error is not None:
+            raise self.error
+
+        return {
+            "initial_strings": [word_values[0]],
+            "middle_strings": ["Choose the correct synonym:"],
+            "final_strings": ["a) enorme", "b) pequeño", "c) estrecho", "d) corto"],
+            "criteria": 0,
+        }
+
+class AsyncExerciseGenerationTests(SimpleTestCase):
+
+    """
+    Exercises generated on the LLM event loop do not hold a creation worker while the LLM answers.
+    """
+
+    def set_up_global_container(self, llm):
+
+        db_client = MemoryDatabaseClient()
+        db_client["language_app"]["words"].insert_many([empty_word_document(str(uuid.uuid4()), f"palabra{word_i}", LANGUAGE, 0)
+                                                        for word_i in range(10)])
+
+        self.llm = llm
+        self.addCleanup(self.llm.event_loop.stop)
+        self.addCleanup(self.llm.release_event.set)
+
+        self.global_container = GlobalContainer(db_client, llm, run_background_threads=False)
+        self.global_container.exercise_creation_pool = WorkerPool("exercise-creation", 1, 10)
+        self.global_container.exercise_completion_pool = WorkerPool("exercise-completion", 1, 0)
+        self.addCleanup(self.global_container.exercise_creation_pool.stop)
+        self.addCleanup(self.global_container.exercise_completion_pool.stop)
+
+        for user_id in USER_IDS:
+            self.global_container.create_user_if_needed(user_id)
+            self.assertTrue(self.global_container.set_ui_language(user_id, "en"))
+            self.assertTrue(self.global_container.set_learning_language(user_id, LANGUAGE))
+
+    def create_new_exercises(self):
+
+        for user_id in USER_IDS:
+            self.assertEqual(self.global_container.create_new_exercise(user_id), (True, False))
+
+        # the single creation worker has finished every task while the LLM has not answered yet
+        for _ in range(1000):
+            stats = self.global_container.exercise_creation_pool.get_stats()
+            if stats["completed"] == len(USER_IDS):
+                break
+            threading.Event().wait(0.005)
+
+        self.assertEqual(self.global_container.exercise_creation_pool.get_stats()["completed"], len(USER_IDS))
+        self.assertGreaterEqual(self.global_container.get_exercise_generations_in_flight(), 1)
+        self.assertEqual(self.global_container.exercise_generation_leases_collection.count_documents({}),
+                         self.global_container.exercise_generation_flight.get_stats()["in_flight"])
+
+        for user_id in USER_IDS:
+            self.assertEqual(self.global_container.load_user(user_id)["last_created_exercise_id"], "PROCESSING")
+
+    def test_generated_exercises_are_delivered(self):
+
+        self.set_up_global_container(AsyncFakeLLM())
+
+        self.create_new_exercises()
+
+        self.llm.release_event.set()
+
+        for user_id in USER_IDS:
+            exercise, success = self.global_container.wait_for_created_exercise(user_id, timeout=5)
+            self.assertTrue(success)
+            self.assertIsNotNone(exercise)
+
+        self.assertEqual(self.global_container.get_exercise_generations_in_flight(), 0)
+        self.assertEqual(self.global_container.exercise_generation_leases_collection.count_documents({}), 0)
+        self.assertEqual(self.global_container.exercises_collection.count_documents({}), self.llm.number_of_generations)
+
+    def test_failed_generations_are_reported(self):
+
+        self.set_up_global_container(AsyncFakeLLM(error=ValueError("invalid exercise")))
+
+        self.create_new_exercises()
+
+        self.llm.release_event.set()
+
+        for user_id in USER_IDS:
+            exercise, success = self.global_container.wait_for_created_exercise(user_id, timeout=5)
+            self.assertFalse(success)
+            self.assertIsNone(exercise)
+            self.assertEqual(self.global_container.load_user(user_id)["last_created_exercise_id"], "FAILED")
+
+        self.assertEqual(self.global_container.exercise_generation_leases_collection.count_documents({}), 0)
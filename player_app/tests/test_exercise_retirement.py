@@ -0,0 +1,78 @@
+import datetime
+import uuid
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.GlobalContainer import (GlobalContainer,
+                                                      empty_user)
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+from language_app_backend.util.constants import RETIRED_EXERCISE_GRACE_PERIOD
+
+class ExerciseRetirementTests(SimpleTestCase):
+
+    """
+    Exercises removed from their pool are only deleted once no learner is given them.
+    """
+
+    def setUp(self):
+
+        self.global_container = GlobalContainer(MemoryDatabaseClient(), None, run_background_threads=False)
+
+        self.exercise_ids = [str(uuid.uuid4()) for _ in range(4)]
+
+        for exercise_id in self.exercise_ids:
+            self.global_container.exercises_collection.insert_one({"exercise_id": exercise_id})
+            self.global_container.exercise_stats_collection.insert_one({"_id": exercise_id, "thumbs_up": 0, "thumbs_down": 0})
+
+        current_user = empty_user("current@example.com")
+        current_user["last_created_exercise_id"] = self.exercise_ids[0]
+        prepared_user = empty_user("prepared@example.com")
+        prepared_user["ready_exercise_ids"] = [self.exercise_ids[1]]
+
+        self.global_container.users_collection.insert_many([current_user, prepared_user])
+
+    def get_exercise_ids(self):
+
+        return sorted(exercise["exercise_id"] for exercise in self.global_container.exercises_collection.find({}))
+
+    def age_retirements(self):
+
+        retired_at = int(datetime.datetime.now(datetime.timezone.utc).timestamp()) - RETIRED_EXERCISE_GRACE_PERIOD - 1
+
+        self.global_container.exercises_collection.update_many({"retired_at": {"$exists": True}},
+                                                               {"$set": {"retired_at": retired_at}})
+
+    def test_recently_retired_exercises_are_kept(self):
+
+        self.global_container.retire_exercises(self.exercise_ids)
+
+        self.assertEqual(self.global_container.delete_retired_exercises(), 0)
+        self.assertEqual(self.get_exercise_ids(), sorted(self.exercise_ids))
+
+    def test_referenced_exercises_are_kept(self):
+
+        self.global_container.retire_exercises(self.exercise_ids[:3])
+        self.age_retirements()
+
+        self.assertEqual(self.global_container.delete_retired_exercises(), 1)
+
+        self.assertEqual(self.get_exercise_ids(), sorted([self.exercise_ids[0], self.exercise_ids[1], self.exercise_ids[3]]))
+        self.assertIsNone(self.global_container.exercise_stats_collection.find_one({"_id": self.exercise_ids[2]}))
+
+        # deleted once the learners moved on
+        self.global_container.users_collection.update_many({}, {"$set": {"last_created_exercise_id": "",
+                                                                          "ready_exercise_ids": []}})
+        self.age_retirements()
+
+        self.assertEqual(self.global_container.delete_retired_exercises(), 2)
+        self.assertEqual(self.get_exercise_ids(), [self.exercise_ids[3]])
+
+    def test_retired_exercises_are_not_used_as_prepared(self):
+
+        self.global_container.retire_exercises([self.exercise_ids[1]])
+
+        user_context = self.global_container.get_user_context("prepared@example.com")
+        self.global_container.load_user("prepared@example.com", user_context)
+
+        self.assertIsNone(self.global_container.pop_ready_exercise_id("prepared@example.com", user_context))
+        self.assertEqual(user_context.get("ready_exercise_ids"), [])
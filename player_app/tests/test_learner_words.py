@@ -0,0 +1,69 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.LearnerWords import LearnerWords
+
+def user_word(word_i, is_locked=False):
+
+    return {"word_id": f"word{word_i}", "is_locked": is_locked, "last_scores": [1]}
+
+class LearnerWordsTests(SimpleTestCase):
+
+    """
+    Write-through of single words into a learner's cached words.
+    """
+
+    def setUp(self):
+
+        self.learner_words = LearnerWords({f"word{word_i}": user_word(word_i) for word_i in range(1000)})
+
+    def test_update_replaces_only_the_word(self):
+
+        other_word = self.learner_words.get("word1")
+        old_word = self.learner_words.get("word0")
+
+        self.assertTrue(self.learner_words.update("word0", lambda word: {**word, "last_scores": [0]}))
+
+        self.assertEqual(self.learner_words.get("word0")["last_scores"], [0])
+        # the old entry is not mutated, and the other entries are not copied
+        self.assertEqual(old_word["last_scores"], [1])
+        self.assertIs(self.learner_words.get("word1"), other_word)
+
+    def test_update_missing_word(self):
+
+        self.assertFalse(self.learner_words.update("missing", lambda word: word))
+        self.assertNotIn("missing", self.learner_words)
+
+    def test_get_words(self):
+
+        self.learner_words.add("locked", user_word(-1, is_locked=True))
+
+        self.assertEqual(len(self.learner_words.get_words(False)), 1000)
+        self.assertEqual([word["word_id"] for word in self.learner_words.get_words(True)], ["word-1"])
+
+    def test_add_while_reading(self):
+
+        errors = []
+        stop_event = threading.Event()
+
+        def read():
+            try:
+                while not stop_event.is_set():
+                    self.learner_words.get_words(False)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for word_i in range(1000, 3000):
+            self.learner_words.add(f"word{word_i}", user_word(word_i))
+
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.learner_words), 3000)
@@ -0,0 +1,100 @@
+import tempfile
+import json
+import time
+import os
+
+from django.test import SimpleTestCase
+
+from language_app_backend.util.metrics import (MetricsRegistry,
+                                               aggregate_metrics_snapshots,
+                                               read_metrics_snapshots,
+                                               format_metrics,
+                                               get_key)
+
+def get_snapshot(pid,
+                 view_latencies,
+                 queue_depth):
+
+    registry = MetricsRegistry()
+
+    registry.increment("language_app_requests_total", {"view": "submit_answer"}, len(view_latencies))
+    for view_latency in view_latencies:
+        registry.observe("language_app_view_duration_seconds", view_latency, {"view": "submit_answer"})
+    registry.register_gauge_function("language_app_worker_pool_queue_depth", lambda: queue_depth, {"pool": "exercise_creation"})
+
+    snapshot = registry.get_snapshot()
+    snapshot["pid"] = pid
+
+    return snapshot
+
+class MetricsSnapshotTests(SimpleTestCase):
+
+    """
+    The snapshots of a server's processes add up to one set of metrics.
+    """
+
+    def test_aggregate_adds_counters_and_histograms(self):
+
+        metrics = aggregate_metrics_snapshots([get_snapshot(1, [0.001, 0.2], 3),
+                                               get_snapshot(2, [0.2], 5)])
+
+        requests_key = get_key("language_app_requests_total", {"view": "submit_answer"})
+        self.assertEqual(metrics["counters"][requests_key], 3)
+
+        bucket_counts, histogram_sum, histogram_count = metrics["histograms"][get_key("language_app_view_duration_seconds",
+                                                                                      {"view": "submit_answer"})]
+        self.assertEqual(sum(bucket_counts), 3)
+        self.assertEqual(max(bucket_counts), 2)
+        self.assertAlmostEqual(histogram_sum, 0.401)
+        self.assertEqual(histogram_count, 3)
+
+    def test_aggregate_keeps_gauges_per_process(self):
+
+        metrics = aggregate_metrics_snapshots([get_snapshot(1, [], 3),
+                                               get_snapshot(2, [], 5)])
+
+        self.assertEqual(metrics["gauges"], {
+            get_key("language_app_worker_pool_queue_depth", {"pool": "exercise_creation", "pid": 1}): 3,
+            get_key("language_app_worker_pool_queue_depth", {"pool": "exercise_creation", "pid": 2}): 5,
+        })
+
+    def test_aggregate_skips_histograms_with_other_buckets(self):
+
+        snapshot = get_snapshot(1, [0.2], 3)
+        snapshot["buckets"] = [1.0]
+
+        metrics = aggregate_metrics_snapshots([snapshot])
+
+        self.assertEqual(metrics["histograms"], {})
+        self.assertEqual(metrics["counters"][get_key("language_app_requests_total", {"view": "submit_answer"})], 1)
+
+    def test_format_metrics(self):
+
+        text = format_metrics(aggregate_metrics_snapshots([get_snapshot(1, [0.2, 1000.0], 3)]))
+        lines = text.splitlines()
+
+        self.assertIn("# TYPE language_app_requests_total counter", lines)
+        self.assertIn('language_app_requests_total{view="submit_answer"} 2', lines)
+        self.assertIn('language_app_worker_pool_queue_depth{pid="1",pool="exercise_creation"} 3', lines)
+        self.assertIn("# TYPE language_app_view_duration_seconds histogram", lines)
+        self.assertIn('language_app_view_duration_seconds_bucket{view="submit_answer",le="+Inf"} 2', lines)
+        self.assertIn('language_app_view_duration_seconds_count{view="submit_answer"} 2', lines)
+
+    def test_read_removes_stale_snapshots(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            for pid in [1, 2]:
+                with open(os.path.join(directory, f"{pid}.json"), "w") as f:
+                    json.dump(get_snapshot(pid, [0.2], pid), f)
+
+            with open(os.path.join(directory, "3.json.tmp"), "w") as f:
+                f.write("{")
+
+            stale_time = time.time() - 3600
+            os.utime(os.path.join(directory, "2.json"), (stale_time, stale_time))
+
+            snapshots = read_metrics_snapshots(directory)
+
+            self.assertEqual([snapshot["pid"] for snapshot in snapshots], [1])
+            self.assertEqual(sorted(os.listdir(directory)), ["1.json", "3.json.tmp"])
@@ -0,0 +1,62 @@
+import datetime
+
+from django.test import SimpleTestCase
+from pymongo import monitoring
+
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+from language_app_backend.util.metrics import (REGISTRY,
+                                               MongoCommandMetrics)
+
+def get_command_counts(collection):
+
+    counts = {}
+
+    for histogram in REGISTRY.get_snapshot()["histograms"]:
+        if histogram["name"] == "language_app_mongo_command_duration_seconds" and histogram["labels"]["collection"] == collection:
+            counts[histogram["labels"]["command"]] = histogram["count"]
+
+    return counts
+
+def get_new_counts(counts_before,
+                   counts_after):
+
+    return {command: count - counts_before.get(command, 0)
+            for command, count in counts_after.items()
+            if count - counts_before.get(command, 0) > 0}
+
+class MongoCommandMetricsTests(SimpleTestCase):
+
+    """
+    Commands sent with pymongo and operations of the in-process storage are counted alike (read by tools/load_test.py).
+    """
+
+    def test_pymongo_commands_are_counted(self):
+
+        command_metrics = MongoCommandMetrics()
+        counts_before = get_command_counts("pymongo_users")
+
+        for request_id, command in enumerate([{"find": "pymongo_users"},
+                                              {"update": "pymongo_users"},
+                                              {"findAndModify": "pymongo_users"}]):
+            connection_id = ("localhost", 27017)
+            command_name = next(iter(command))
+            command_metrics.started(monitoring.CommandStartedEvent(command, "language_app", request_id, connection_id, None))
+            command_metrics.succeeded(monitoring.CommandSucceededEvent(datetime.timedelta(milliseconds=1), {"ok": 1},
+                                                                       command_name, request_id, connection_id, None))
+
+        self.assertEqual(get_new_counts(counts_before, get_command_counts("pymongo_users")),
+                         {"find": 1, "update": 1, "findAndModify": 1})
+
+    def test_memory_storage_operations_are_counted(self):
+
+        collection = MemoryDatabaseClient()["language_app"]["memory_users"]
+        counts_before = get_command_counts("memory_users")
+
+        collection.insert_one({"_id": "user"})
+        collection.find_one({"_id": "user"})
+        collection.update_one({"_id": "user"}, {"$set": {"xp": 1}})
+        collection.find_one_and_update({"_id": "user"}, {"$inc": {"xp": 1}})
+        list(collection.find({}))
+
+        self.assertEqual(get_new_counts(counts_before, get_command_counts("memory_users")),
+                         {"insert": 1, "find": 2, "update": 1, "findAndModify": 1})
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from language_app_backend.util.ranking import wilson_lower_bound
+
+class WilsonLowerBoundTests(SimpleTestCase):
+
+    """
+    Lower bound of the Wilson score interval at 95% confidence.
+    """
+
+    def test_known_values(self):
+
+        self.assertAlmostEqual(wilson_lower_bound(25, 50), 0.3664, places=4)
+        self.assertAlmostEqual(wilson_lower_bound(30, 50), 0.4618, places=4)
+        self.assertAlmostEqual(wilson_lower_bound(10, 10), 0.7225, places=4)
+        self.assertAlmostEqual(wilson_lower_bound(0, 10), 0.0, places=9)
+
+    def test_no_votes(self):
+
+        self.assertEqual(wilson_lower_bound(0, 0), 0.0)
+
+    def test_more_votes_rank_higher_at_the_same_approval(self):
+
+        self.assertLess(wilson_lower_bound(1, 2), wilson_lower_bound(10, 20))
+        self.assertLess(wilson_lower_bound(10, 20), wilson_lower_bound(100, 200))
+
+    def test_below_the_approval(self):
+
+        for positive, total in [(1, 1), (5, 7), (99, 100)]:
+            self.assertLess(wilson_lower_bound(positive, total), positive / total)
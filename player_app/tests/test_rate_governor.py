@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.LLMRateGovernor import (LLMRateGovernor,
+                                                      RateBudgetExhausted)
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+from language_app_backend.obj.RetryPolicy import (RetryPolicy,
+                                                  classify_error,
+                                                  BUDGET_EXHAUSTED)
+
+def create_rate_governor(requests_per_minute=100,
+                         tokens_per_minute=100000):
+
+    return LLMRateGovernor(MemoryDatabaseClient()["language_app"]["llm_rate_windows"],
+                           requests_per_minute,
+                           tokens_per_minute,
+                           {"create_exercise": 150},
+                           300,
+                           wait_timeout=0)
+
+class LLMRateGovernorTests(SimpleTestCase):
+
+    """
+    The shared budget, the output token estimates per method and database failures.
+    """
+
+    def test_used_up_budget_is_not_retried(self):
+
+        rate_governor = create_rate_governor(requests_per_minute=1)
+
+        rate_governor.acquire("query", "create_exercise")
+
+        # a second call at a minute boundary gets the budget of the new minute, the third one cannot
+        with self.assertRaises(RateBudgetExhausted):
+            for _ in range(2):
+                rate_governor.acquire("query", "create_exercise")
+
+        retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0, deadline=60.0)
+        function = mock.Mock(side_effect=RateBudgetExhausted("Shared LLM rate budget is used up."))
+
+        self.assertEqual(classify_error(RateBudgetExhausted()), BUDGET_EXHAUSTED)
+        self.assertIsNone(retry_policy.call("test", function))
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(retry_policy.get_stats()["test"]["budget_exhausted"], 1)
+
+    def test_output_tokens_are_estimated_per_method(self):
+
+        rate_governor = create_rate_governor()
+
+        self.assertEqual(rate_governor.get_estimated_output_tokens("create_exercise"), 150)
+        self.assertEqual(rate_governor.get_estimated_output_tokens("get_word_level"), 300)
+
+        for _ in range(100):
+            rate_governor.record_output_tokens("create_exercise", 400)
+            rate_governor.record_output_tokens("get_word_level", 2)
+
+        self.assertAlmostEqual(rate_governor.get_estimated_output_tokens("create_exercise"), 400, delta=5)
+        self.assertAlmostEqual(rate_governor.get_estimated_output_tokens("get_word_level"), 2, delta=5)
+
+    def test_database_errors_do_not_block_calls(self):
+
+        rate_governor = create_rate_governor()
+        rate_governor.collection = mock.Mock()
+        rate_governor.collection.find_one.return_value = None
+        rate_governor.collection.update_one.side_effect = ConnectionError("database unavailable")
+
+        with mock.patch("language_app_backend.obj.LLMRateGovernor.increment_counter") as increment_counter:
+            with self.assertLogs("language_app_backend.obj.LLMRateGovernor", "ERROR") as logs:
+                for _ in range(3):
+                    self.assertTrue(rate_governor.try_acquire(100))
+
+        # counted every time, logged once per interval
+        self.assertEqual(increment_counter.call_count, 3)
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(rate_governor.get_stats()["database_errors"], 3)
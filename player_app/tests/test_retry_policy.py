@@ -0,0 +1,140 @@
+import datetime
+from email.utils import format_datetime
+from unittest import mock
+
+import httpx
+import openai
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.RetryPolicy import (RetryPolicy,
+                                                  get_retry_after,
+                                                  classify_error,
+                                                  RATE_LIMIT_ERROR,
+                                                  TRANSIENT_ERROR,
+                                                  PERMANENT_ERROR,
+                                                  INVALID_OUTPUT)
+
+def api_error(error_class,
+              status_code,
+              headers=None):
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+
+    return error_class("error", response=response, body=None)
+
+class RetryAfterTests(SimpleTestCase):
+
+    """
+    The delay asked for by the retry-after-ms and Retry-After headers.
+    """
+
+    def test_seconds(self):
+
+        self.assertEqual(get_retry_after(api_error(openai.RateLimitError, 429, {"Retry-After": "3"})), 3.0)
+        self.assertEqual(get_retry_after(api_error(openai.RateLimitError, 429, {"Retry-After": "0.5"})), 0.5)
+
+    def test_milliseconds_take_precedence(self):
+
+        error = api_error(openai.RateLimitError, 429, {"retry-after-ms": "250", "Retry-After": "3"})
+
+        self.assertEqual(get_retry_after(error), 0.25)
+
+    def test_invalid_milliseconds_fall_back_to_seconds(self):
+
+        error = api_error(openai.RateLimitError, 429, {"retry-after-ms": "soon", "Retry-After": "3"})
+
+        self.assertEqual(get_retry_after(error), 3.0)
+
+    def test_http_date(self):
+
+        retry_after_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+        error = api_error(openai.RateLimitError, 429, {"Retry-After": format_datetime(retry_after_time, usegmt=True)})
+
+        self.assertAlmostEqual(get_retry_after(error), 30, delta=2)
+
+    def test_http_date_in_the_past(self):
+
+        error = api_error(openai.RateLimitError, 429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+
+        self.assertEqual(get_retry_after(error), 0.0)
+
+    def test_missing_or_invalid(self):
+
+        self.assertIsNone(get_retry_after(api_error(openai.RateLimitError, 429)))
+        self.assertIsNone(get_retry_after(api_error(openai.RateLimitError, 429, {"Retry-After": "later"})))
+        self.assertIsNone(get_retry_after(TimeoutError()))
+
+class RetryPolicyTests(SimpleTestCase):
+
+    """
+    Error classes, backoff and when calls are retried.
+    """
+
+    def test_classify_error(self):
+
+        self.assertEqual(classify_error(api_error(openai.RateLimitError, 429)), RATE_LIMIT_ERROR)
+        self.assertEqual(classify_error(api_error(openai.InternalServerError, 503)), TRANSIENT_ERROR)
+        self.assertEqual(classify_error(api_error(openai.APIStatusError, 429)), RATE_LIMIT_ERROR)
+        self.assertEqual(classify_error(api_error(openai.APIStatusError, 408)), TRANSIENT_ERROR)
+        self.assertEqual(classify_error(api_error(openai.BadRequestError, 400)), PERMANENT_ERROR)
+        self.assertEqual(classify_error(api_error(openai.AuthenticationError, 401)), PERMANENT_ERROR)
+        self.assertEqual(classify_error(TimeoutError()), TRANSIENT_ERROR)
+        self.assertEqual(classify_error(ValueError()), PERMANENT_ERROR)
+
+    def test_only_lock_conflicts_are_retried(self):
+
+        self.assertEqual(classify_error(api_error(openai.ConflictError, 409)), PERMANENT_ERROR)
+        self.assertEqual(classify_error(api_error(openai.ConflictError, 409, {"x-should-retry": "true"})), TRANSIENT_ERROR)
+
+        lock_error = openai.ConflictError("Lock timeout, try again",
+                                          response=httpx.Response(409, request=httpx.Request("POST", "https://api.openai.com/v1/responses")),
+                                          body=None)
+        self.assertEqual(classify_error(lock_error), TRANSIENT_ERROR)
+
+    def test_delay_respects_retry_after(self):
+
+        retry_policy = RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=1.0, deadline=60.0)
+
+        self.assertEqual(retry_policy.get_delay(1, RATE_LIMIT_ERROR, 5.0), 5.0)
+        self.assertLessEqual(retry_policy.get_delay(10, TRANSIENT_ERROR, None), 1.0)
+        self.assertEqual(retry_policy.get_delay(1, INVALID_OUTPUT, 5.0), 0.0)
+
+    def test_call_retries_until_success(self):
+
+        retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0, deadline=60.0)
+        outcomes = [TimeoutError(), None, "result"]
+
+        def function():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(retry_policy.call("test", function), "result")
+        self.assertEqual(retry_policy.get_stats()["test"]["attempts"], 3)
+
+    def test_permanent_errors_are_not_retried(self):
+
+        retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0, deadline=60.0)
+        function = mock.Mock(side_effect=api_error(openai.BadRequestError, 400))
+
+        with mock.patch("language_app_backend.obj.RetryPolicy.increment_counter") as increment_counter:
+            with self.assertLogs("language_app_backend.obj.RetryPolicy", "ERROR") as logs:
+                self.assertIsNone(retry_policy.call("test", function))
+
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(retry_policy.get_stats()["test"]["permanent_errors"], 1)
+        self.assertIn("BadRequestError", logs.output[0])
+        increment_counter.assert_any_call("language_app_llm_permanent_errors_total", {"method": "test", "error": "BadRequestError"})
+
+    def test_retry_after_beyond_the_deadline_is_not_waited_for(self):
+
+        retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0, deadline=10.0)
+        function = mock.Mock(side_effect=api_error(openai.RateLimitError, 429, {"Retry-After": "60"}))
+
+        with mock.patch("time.sleep") as sleep:
+            self.assertIsNone(retry_policy.call("test", function))
+
+        sleep.assert_not_called()
+        self.assertEqual(retry_policy.get_stats()["test"]["deadline_exceeded"], 1)
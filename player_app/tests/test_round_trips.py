@@ -0,0 +1,126 @@
+import threading
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from language_app_backend.obj.GlobalContainer import (GlobalContainer,
+                                                      empty_word_document)
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+from language_app_backend.obj.WorkerPool import WorkerPool
+from language_app_backend.util.round_trips import (round_trip_budget,
+                                                   RoundTripBudgetExceeded)
+
+LANGUAGE = "es"
+USER_ID = "learner@example.com"
+
+# MongoDB round trips allowed per request, one more than the views make today
+CREATE_NEW_EXERCISE_BUDGET = 3# queues the creation
+CREATE_NEW_EXERCISE_READY_BUDGET = 6# uses and sends the exercise prepared after the last answer
+GET_CREATED_EXERCISE_BUDGET = 3
+SUBMIT_ANSWER_BUDGET = 6# one update of user_words per word of the exercise
+
+class FakeLLM:
+
+    """
+    Creates the same valid exercise for any words, on the calling thread.
+    """
+
+    event_loop = None
+
+    def create_exercise(self,
+                        word_values,
+                        language,
+                        level,
+                        inspiration_exercises):
+
+        return {
+            "initial_strings": [word_values[0]],
+            "middle_strings": ["Choose the correct synonym:"],
+            "final_strings": ["a) enorme", "b) pequeño", "c) estrecho", "d) corto"],
+            "criteria": 0,
+        }
+
+@override_settings(RATELIMIT_ENABLE=False)
+class ViewRoundTripTests(TestCase):
+
+    """
+    The exercise views stay within their MongoDB round trip budgets, counted on the in-process storage.
+    """
+
+    def setUp(self):
+
+        db_client = MemoryDatabaseClient()
+        db_client["language_app"]["words"].insert_many([empty_word_document(str(uuid.uuid4()), f"palabra{word_i}", LANGUAGE, 0)
+                                                        for word_i in range(10)])
+
+        self.global_container = GlobalContainer(db_client, FakeLLM(), run_background_threads=False)
+        self.global_container.exercise_creation_pool = WorkerPool("exercise-creation", 1, 10)
+
+        patcher = mock.patch("player_app.views.get_global_container", return_value=self.global_container)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.global_container.exercise_creation_pool.stop)
+
+        user = User.objects.create_user(username="learner", email=USER_ID)
+        self.client.force_login(user)
+
+        # like the first visit after logging in
+        self.global_container.create_user_if_needed(USER_ID)
+        self.assertEqual(self.client.get("/set_ui_language", {"language": "en"}).status_code, 200)
+        self.assertEqual(self.client.get("/set_learning_language", {"language": LANGUAGE}).status_code, 200)
+
+    def wait_for_creation_pool(self):
+
+        # the tasks run outside of the request and are not counted in its budget
+        for _ in range(1000):
+            stats = self.global_container.exercise_creation_pool.get_stats()
+            if stats["submitted"] == stats["completed"] + stats["failed"]:
+                return
+            threading.Event().wait(0.005)
+
+        self.fail("Exercise creation pool did not finish.")
+
+    def create_exercise(self):
+
+        with round_trip_budget(CREATE_NEW_EXERCISE_BUDGET, "create_new_exercise"):
+            response = self.client.get("/create_new_exercise")
+
+        self.assertEqual(response.status_code, 200)
+
+        self.wait_for_creation_pool()
+
+        with round_trip_budget(GET_CREATED_EXERCISE_BUDGET, "get_created_exercise"):
+            response = self.client.get("/get_created_exercise")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("exercise", response.json())
+
+        return response.json()["exercise"]
+
+    def test_exercise_loop_within_budget(self):
+
+        exercise = self.create_exercise()
+
+        with round_trip_budget(SUBMIT_ANSWER_BUDGET, "submit_answer"):
+            response = self.client.get("/submit_answer", {"exercise_id": exercise["exercise_id"],
+                                                          "answer": "0"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["correct"])
+
+        self.wait_for_creation_pool()
+
+        # the exercise prepared after the answer is used right away
+        with round_trip_budget(CREATE_NEW_EXERCISE_READY_BUDGET, "create_new_exercise"):
+            response = self.client.get("/create_new_exercise")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("exercise", response.json())
+
+    def test_budget_exceeded(self):
+
+        with self.assertRaises(RoundTripBudgetExceeded):
+            with round_trip_budget(0):
+                self.client.get("/get_created_exercise")
@@ -0,0 +1,138 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from language_app_backend.util.scheduler import (pack_user_words,
+                                                 next_word_indices,
+                                                 next_word,
+                                                 next_words)
+
+CURRENT_TIME = 1_700_000_000.0
+
+def reference_next_word(word_ids,
+                        word_scores,
+                        word_last_visited_times,
+                        current_time) -> str:
+
+    """
+    The per-word loop the scheduler replaced, without noise (scores and times are history lists).
+    """
+
+    last_visited_times = [times[-1] if len(times) > 0 else 0 for times in word_last_visited_times]
+
+    time_since_oldest_visit = current_time - min(last_visited_times)
+
+    if time_since_oldest_visit <= 0:
+        return None
+
+    relative_times = np.array([current_time - time for time in last_visited_times]) / time_since_oldest_visit
+    scores = np.array([scores[-1] if len(scores) > 0 else 0 for scores in word_scores])
+
+    adjusted_scores = (1 - scores) * (1 + relative_times) - 1
+
+    return word_ids[np.argmax(adjusted_scores)]
+
+def random_user_words(random_state,
+                      number_of_words):
+
+    user_words = []
+    for word_i in range(number_of_words):
+
+        number_of_visits = random_state.randint(0, 4)
+        user_words.append({
+            "word_id": f"word{word_i}",
+            "last_scores": [float(score) for score in random_state.randint(0, 2, size=number_of_visits)],
+            "last_visited_times": sorted(float(CURRENT_TIME - seconds) for seconds in random_state.randint(1, 10 ** 6, size=number_of_visits)),
+        })
+
+    return user_words
+
+class SchedulerTests(SimpleTestCase):
+
+    """
+    The vectorized scheduler picks the same words as the per-word loop when there is no noise.
+    """
+
+    def test_pack_user_words_uses_latest_values(self):
+
+        word_ids, last_scores, last_visited_times = pack_user_words([
+            {"word_id": "a", "last_scores": [0, 1], "last_visited_times": [10, 20]},
+            {"word_id": "b", "last_scores": [], "last_visited_times": []},
+        ])
+
+        self.assertEqual(word_ids, ["a", "b"])
+        self.assertEqual(last_scores.dtype, np.float64)
+        np.testing.assert_array_equal(last_scores, [1.0, 0.0])
+        np.testing.assert_array_equal(last_visited_times, [20.0, 0.0])
+
+    def test_next_word_matches_loop(self):
+
+        random_state = np.random.RandomState(0)
+
+        for number_of_words in [1, 2, 5, 50, 500]:
+            for _ in range(20):
+
+                user_words = random_user_words(random_state, number_of_words)
+
+                expected_word_id = reference_next_word([word["word_id"] for word in user_words],
+                                                       [word["last_scores"] for word in user_words],
+                                                       [word["last_visited_times"] for word in user_words],
+                                                       CURRENT_TIME)
+
+                word_ids, last_scores, last_visited_times = pack_user_words(user_words)
+
+                word_id = next_word(word_ids,
+                                    last_scores,
+                                    last_visited_times,
+                                    current_time=CURRENT_TIME,
+                                    temperature=0.0)
+
+                self.assertEqual(word_id, expected_word_id)
+
+    def test_next_words_matches_loop_per_user(self):
+
+        random_state = np.random.RandomState(1)
+
+        users_user_words = [random_user_words(random_state, number_of_words) for number_of_words in [3, 1, 40, 7]]
+        users_packed = [pack_user_words(user_words) for user_words in users_user_words]
+
+        word_ids = next_words([packed[0] for packed in users_packed],
+                              [packed[1] for packed in users_packed],
+                              [packed[2] for packed in users_packed],
+                              current_time=CURRENT_TIME,
+                              temperature=0.0)
+
+        expected_word_ids = [reference_next_word([word["word_id"] for word in user_words],
+                                                 [word["last_scores"] for word in user_words],
+                                                 [word["last_visited_times"] for word in user_words],
+                                                 CURRENT_TIME)
+                             for user_words in users_user_words]
+
+        self.assertEqual(word_ids, expected_word_ids)
+
+    def test_ties_pick_the_first_word(self):
+
+        indices = next_word_indices(np.array([0.5, 0.5, 0.5, 1.0, 1.0]),
+                                    np.array([100.0, 100.0, 100.0, 100.0, 100.0]),
+                                    np.array([3, 2]),
+                                    current_time=200.0,
+                                    temperature=0.0)
+
+        np.testing.assert_array_equal(indices, [0, 0])
+
+    def test_unvisited_words_pick_a_word_of_the_segment(self):
+
+        indices = next_word_indices(np.zeros(6),
+                                    np.full(6, CURRENT_TIME),
+                                    np.array([2, 4]),
+                                    current_time=CURRENT_TIME,
+                                    temperature=0.0)
+
+        self.assertTrue(0 <= indices[0] < 2)
+        self.assertTrue(0 <= indices[1] < 4)
+
+    def test_no_words(self):
+
+        self.assertEqual(next_words([], [], [], current_time=CURRENT_TIME), [])
+
+        with self.assertRaises(AssertionError):
+            next_word([], np.array([]), np.array([]), current_time=CURRENT_TIME)
@@ -0,0 +1,141 @@
+import threading
+import datetime
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.SingleFlight import SingleFlight
+from language_app_backend.obj.GlobalContainer import GlobalContainer
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+
+class SingleFlightTests(SimpleTestCase):
+
+    """
+    Concurrent calls with the same key run the function once and share its result or error.
+    """
+
+    def run_concurrently(self,
+                         single_flight,
+                         key,
+                         function,
+                         number_of_threads):
+
+        results = [None] * number_of_threads
+        errors = [None] * number_of_threads
+
+        def thread_function(thread_i):
+            try:
+                results[thread_i] = single_flight.do(key, function)
+            except Exception as e:
+                errors[thread_i] = e
+
+        threads = [threading.Thread(target=thread_function, args=(thread_i,)) for thread_i in range(number_of_threads)]
+        for thread in threads:
+            thread.start()
+
+        return threads, results, errors
+
+    def wait_for_waiters(self,
+                         single_flight,
+                         number_of_waiters):
+
+        # the waiters have joined once they are counted
+        for _ in range(1000):
+            if single_flight.get_stats()["coalesced"] >= number_of_waiters:
+                return
+            threading.Event().wait(0.005)
+
+        self.fail("Waiters did not join the call.")
+
+    def test_concurrent_calls_are_coalesced(self):
+
+        single_flight = SingleFlight()
+        release_event = threading.Event()
+        number_of_calls = [0]
+
+        def function():
+            number_of_calls[0] += 1
+            release_event.wait(5)
+            return "result"
+
+        threads, results, errors = self.run_concurrently(single_flight, "key", function, 5)
+        self.wait_for_waiters(single_flight, 4)
+
+        release_event.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(number_of_calls[0], 1)
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(single_flight.get_stats(), {"in_flight": 0, "executed": 1, "coalesced": 4})
+
+    def test_error_is_shared(self):
+
+        single_flight = SingleFlight()
+        release_event = threading.Event()
+
+        def function():
+            release_event.wait(5)
+            raise ValueError("failed")
+
+        threads, results, errors = self.run_concurrently(single_flight, "key", function, 3)
+        self.wait_for_waiters(single_flight, 2)
+
+        release_event.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [None] * 3)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+    def test_later_calls_run_again(self):
+
+        single_flight = SingleFlight()
+
+        self.assertEqual(single_flight.do("key", lambda: 1), 1)
+        self.assertEqual(single_flight.do("key", lambda: 2), 2)
+        self.assertEqual(single_flight.do("other_key", lambda value: value, 3), 3)
+
+        self.assertEqual(single_flight.get_stats()["executed"], 3)
+
+class ExerciseGenerationLeaseTests(SimpleTestCase):
+
+    """
+    Only one server at a time holds the lease of an exercise key.
+    """
+
+    def setUp(self):
+
+        db_client = MemoryDatabaseClient()
+
+        self.global_container = GlobalContainer(db_client, None, run_background_threads=False)
+        self.other_global_container = GlobalContainer(db_client, None, run_background_threads=False)
+
+    def test_lease_is_exclusive(self):
+
+        self.assertTrue(self.global_container.acquire_exercise_generation_lease("key"))
+        self.assertFalse(self.other_global_container.acquire_exercise_generation_lease("key"))
+        self.assertTrue(self.other_global_container.acquire_exercise_generation_lease("other_key"))
+
+    def test_release_only_by_owner(self):
+
+        self.assertTrue(self.global_container.acquire_exercise_generation_lease("key"))
+
+        self.other_global_container.release_exercise_generation_lease("key")
+        self.assertFalse(self.other_global_container.acquire_exercise_generation_lease("key"))
+
+        self.global_container.release_exercise_generation_lease("key")
+        self.assertTrue(self.other_global_container.acquire_exercise_generation_lease("key"))
+
+    def test_expired_lease_is_taken_over(self):
+
+        self.assertTrue(self.global_container.acquire_exercise_generation_lease("key"))
+
+        expired_time = int(datetime.datetime.now(datetime.timezone.utc).timestamp()) - 1
+        self.global_container.exercise_generation_leases_collection.update_one({"_id": "key"},
+                                                                               {"$set": {"expires_at": expired_time}})
+
+        self.assertTrue(self.other_global_container.acquire_exercise_generation_lease("key"))
+
+        lease = self.global_container.exercise_generation_leases_collection.find_one({"_id": "key"})
+        self.assertEqual(lease["owner"], self.other_global_container.server_id)
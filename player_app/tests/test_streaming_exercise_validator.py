@@ -0,0 +1,119 @@
+import json
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.StreamingExerciseValidator import StreamingExerciseValidator
+
+EXERCISE = {
+    "initial_strings": ["grande"],
+    "middle_strings": ["Choose the correct synonym:"],
+    "final_strings": ["a) enorme", "b) pequeño", "c) estrecho", "d) corto"],
+    "criteria": ["a"],
+}
+
+def feed_in_chunks(validator,
+                   text,
+                   chunk_size=7) -> bool:
+
+    for chunk_i in range(0, len(text), chunk_size):
+        if not validator.feed(text[chunk_i:chunk_i + chunk_size]):
+            return False
+
+    return True
+
+class StreamingExerciseValidatorTests(SimpleTestCase):
+
+    """
+    Chunks of an exercise being generated are accepted until the output can no longer be valid.
+    """
+
+    def assert_rejected(self,
+                        text,
+                        error):
+
+        validator = StreamingExerciseValidator()
+
+        self.assertFalse(feed_in_chunks(validator, text))
+        self.assertEqual(validator.error, error)
+        self.assertFalse(validator.is_complete)
+        # once failed, later chunks are rejected too
+        self.assertFalse(validator.feed("}"))
+
+    def test_valid_exercise(self):
+
+        for text in [json.dumps(EXERCISE),
+                     json.dumps(EXERCISE, indent=4),
+                     json.dumps(EXERCISE, ensure_ascii=False),
+                     "```json\n" + json.dumps(EXERCISE) + "\n```",
+                     json.dumps({**EXERCISE, "criteria": "a"})]:
+
+            validator = StreamingExerciseValidator()
+
+            self.assertTrue(feed_in_chunks(validator, text))
+            self.assertTrue(validator.is_complete)
+            self.assertIsNone(validator.error)
+
+    def test_incomplete_exercise_is_not_complete(self):
+
+        validator = StreamingExerciseValidator()
+        text = json.dumps(EXERCISE)
+
+        self.assertTrue(feed_in_chunks(validator, text[:-1]))
+        self.assertFalse(validator.is_complete)
+
+    def test_escaped_quotes(self):
+
+        validator = StreamingExerciseValidator()
+        text = json.dumps({**EXERCISE, "middle_strings": ["Say \"hola\" \\ é"]})
+
+        self.assertTrue(feed_in_chunks(validator, text))
+        self.assertTrue(validator.is_complete)
+
+    def test_unknown_key(self):
+
+        self.assert_rejected('{"bogus_key": 1}', "Unknown key 'bogus_key' in output.")
+        self.assert_rejected('{"' + "x" * 50, "Unknown key in output.")
+
+    def test_repeated_key(self):
+
+        self.assert_rejected('{"criteria": ["a"], "criteria": ["b"]}', "Repeated key 'criteria' in output.")
+
+    def test_too_many_items(self):
+
+        text = json.dumps({**EXERCISE, "final_strings": ["a", "b", "c", "d", "e"]})
+
+        self.assert_rejected(text, "Too many items in 'final_strings'.")
+
+    def test_too_long_item(self):
+
+        text = json.dumps({**EXERCISE, "initial_strings": ["x" * 101]})
+
+        self.assert_rejected(text, "Item of 'initial_strings' is too long.")
+
+    def test_empty_item(self):
+
+        text = json.dumps({**EXERCISE, "final_strings": ["a", ""]})
+
+        self.assert_rejected(text, "Empty item in 'final_strings'.")
+
+    def test_value_that_is_not_a_list(self):
+
+        text = json.dumps({**EXERCISE, "initial_strings": "grande"})
+
+        self.assert_rejected(text, "Value of 'initial_strings' is not a list.")
+
+    def test_missing_keys(self):
+
+        text = json.dumps({"initial_strings": ["grande"], "criteria": ["a"]})
+
+        self.assert_rejected(text, "Missing keys in output: ['initial_strings', 'criteria'].")
+
+    def test_not_enough_final_strings(self):
+
+        text = json.dumps({**EXERCISE, "final_strings": ["a) enorme"]})
+
+        self.assert_rejected(text, "Not enough items in 'final_strings'.")
+
+    def test_no_json_object(self):
+
+        self.assert_rejected("x" * 300, "No JSON object in output.")
@@ -0,0 +1,55 @@
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.UserContext import UserContext
+
+class UserContextTests(SimpleTestCase):
+
+    """
+    Updates applied to the request's user document follow MongoDB's $set and $inc on dotted keys.
+    """
+
+    def test_apply_set_dotted_keys(self):
+
+        user_context = UserContext("user@example.com", {"learning_languages": {"es": {"current_level": 0}}})
+
+        user_context.apply_set({"learning_languages.es.current_level": 2,
+                                "learning_languages.fr.current_level": 1,
+                                "ui_language": "en"})
+
+        self.assertEqual(user_context.get("learning_languages"), {"es": {"current_level": 2},
+                                                                  "fr": {"current_level": 1}})
+        self.assertEqual(user_context.get("ui_language"), "en")
+        self.assertTrue(user_context.is_dirty)
+
+    def test_apply_set_replaces_non_dictionary_parents(self):
+
+        user_context = UserContext("user@example.com", {"learning_languages": None})
+
+        user_context.apply_set({"learning_languages.es.current_level": 0})
+
+        self.assertEqual(user_context.get("learning_languages"), {"es": {"current_level": 0}})
+
+    def test_apply_inc_dotted_keys(self):
+
+        user_context = UserContext("user@example.com", {"stats": {"es": {"answers": 3, "correct": None}}})
+
+        user_context.apply_inc({"stats.es.answers": 1,
+                                "stats.es.correct": 1,
+                                "stats.fr.answers": 2})
+
+        self.assertEqual(user_context.get("stats"), {"es": {"answers": 4, "correct": 1},
+                                                     "fr": {"answers": 2}})
+        self.assertTrue(user_context.is_dirty)
+
+    def test_missing_user(self):
+
+        user_context = UserContext("user@example.com")
+        self.assertFalse(user_context.is_loaded)
+
+        user_context.set_user(None)
+        user_context.apply_set({"ui_language": "en"})
+        user_context.apply_inc({"stats.answers": 1})
+
+        self.assertTrue(user_context.is_loaded)
+        self.assertFalse(user_context.is_dirty)
+        self.assertEqual(user_context.get("ui_language", "default"), "default")
@@ -0,0 +1,115 @@
+import json
+
+from django.test import SimpleTestCase
+
+from language_app_backend.obj.VocabularyBatchJobs import VocabularyBatchJobs
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+
+class FakeLLM:
+
+    """
+    Parses word levels written as a JSON object, and records what is cached.
+    """
+
+    def __init__(self) -> None:
+
+        self.cached_word_levels = []
+
+    def parse_word_levels_output(self,
+                                 output_text,
+                                 word_values):
+
+        word_levels = json.loads(output_text)
+
+        return {word_value: level for word_value, level in word_levels.items() if word_value in word_values}
+
+    def cache_word_levels(self,
+                          word_levels,
+                          language) -> None:
+
+        self.cached_word_levels.append((language, word_levels))
+
+def output_line(custom_id,
+                word_levels,
+                status_code=200):
+
+    return json.dumps({
+        "custom_id": custom_id,
+        "response": {
+            "status_code": status_code,
+            "body": {"output": [{"type": "message",
+                                 "content": [{"type": "output_text", "text": json.dumps(word_levels)}]}]},
+        },
+    })
+
+class IngestJobOutputTests(SimpleTestCase):
+
+    """
+    The result of every request of a batch job is applied once, however many times the output is ingested.
+    """
+
+    def setUp(self):
+
+        db = MemoryDatabaseClient()["language_app"]
+
+        self.llm = FakeLLM()
+        self.vocabulary_batch_jobs = VocabularyBatchJobs(self.llm,
+                                                         db["vocabulary_batch_jobs"],
+                                                         db["words"],
+                                                         db["settings"])
+
+        db["words"].insert_many([{"_id": word_value, "language": "es", "word_value": word_value, "level": None}
+                                 for word_value in ["casa", "perro", "gato"]])
+
+        db["vocabulary_batch_jobs"].insert_one({
+            "_id": "batch_1",
+            "kind": "word_levels",
+            "language": "es",
+            "status": "completed",
+            "requests": {"request_0": {"word_values": ["casa", "perro"]},
+                         "request_1": {"word_values": ["gato"]}},
+            "ingested_custom_ids": [],
+        })
+
+        self.output_text = "\n".join([output_line("request_0", {"casa": 1, "perro": 2}),
+                                      "",
+                                      output_line("request_1", {"gato": 3})])
+
+    def get_job(self):
+
+        return self.vocabulary_batch_jobs.jobs_collection.find_one({"_id": "batch_1"})
+
+    def get_levels(self):
+
+        return {word["word_value"]: word["level"] for word in self.vocabulary_batch_jobs.words_collection.find({})}
+
+    def test_ingesting_twice_applies_each_request_once(self):
+
+        self.vocabulary_batch_jobs.ingest_job_output(self.get_job(), self.output_text)
+        self.vocabulary_batch_jobs.ingest_job_output(self.get_job(), self.output_text)
+
+        self.assertEqual(self.get_levels(), {"casa": 1, "perro": 2, "gato": 3})
+        self.assertEqual(len(self.llm.cached_word_levels), 2)
+        self.assertEqual(sorted(self.get_job()["ingested_custom_ids"]), ["request_0", "request_1"])
+
+    def test_interrupted_ingest_resumes(self):
+
+        self.vocabulary_batch_jobs.ingest_job_output(self.get_job(), output_line("request_0", {"casa": 1, "perro": 2}))
+        self.assertEqual(self.get_job()["ingested_custom_ids"], ["request_0"])
+
+        self.vocabulary_batch_jobs.ingest_job_output(self.get_job(), self.output_text)
+
+        self.assertEqual(self.get_levels(), {"casa": 1, "perro": 2, "gato": 3})
+        self.assertEqual(self.llm.cached_word_levels, [("es", {"casa": 1, "perro": 2}),
+                                                       ("es", {"gato": 3})])
+
+    def test_failed_and_unknown_requests_are_not_marked(self):
+
+        output_text = "\n".join([output_line("request_0", {"casa": 1}, status_code=500),
+                                 output_line("request_9", {"gato": 3}),
+                                 "not json"])
+
+        self.vocabulary_batch_jobs.ingest_job_output(self.get_job(), output_text)
+
+        self.assertEqual(self.get_job()["ingested_custom_ids"], [])
+        self.assertEqual(self.get_levels(), {"casa": None, "perro": None, "gato": None})
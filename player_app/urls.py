@@ -20,10 +20,13 @@ urlpatterns = [
 
     path('create_new_exercise', views.create_new_exercise, name='create_new_exercise'),
     path('get_created_exercise', views.get_created_exercise, name='get_created_exercise'),
+    path('wait_for_created_exercise', views.wait_for_created_exercise, name='wait_for_created_exercise'),
     path('submit_answer', views.submit_answer, name='submit_answer'),
     path('apply_thumbs_up_or_down', views.apply_thumbs_up_or_down, name='apply_thumbs_up_or_down'),
 
     path('create-checkout-session/', views.create_checkout_session, name='create_checkout_session'),
     path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
     path('customer-portal/', views.customer_portal, name='customer_portal'),
+
+    path('metrics', views.metrics, name='metrics'),
 ]
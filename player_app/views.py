@@ -1,6 +1,8 @@
 
 import datetime
+import logging
 import json
+import hmac
 
 import stripe
 from django.conf import settings
@@ -12,11 +14,16 @@ from django.contrib.auth.decorators import login_required
 from django_ratelimit.decorators import ratelimit
 
 from language_app_backend.util.db import get_global_container
+from language_app_backend.util.metrics import get_server_metrics
 from language_app_backend.util.constants import (CHECK_SUBSCRIPTION_INTERVAL, 
                                                     DO_NOT_CHECK_SUBSCRIPTION,
                                                     DEFAULT_RATELIMIT,
                                                     OPEN_LANGUAGE_APP_ALLOWED_USER_IDS,
-                                                    GET_CREATED_EXERCISES_RATELIMIT)
+                                                    GET_CREATED_EXERCISES_RATELIMIT,
+                                                    CREATE_NEW_EXERCISE_RETRY_AFTER,
+                                                    WAIT_FOR_CREATED_EXERCISE_RATELIMIT)
+
+logger = logging.getLogger("player_app.views")
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -37,7 +44,7 @@ def check_subscription_active(user_id) -> bool:
             return True  # They have an active subscription
     return False  # No active subscription
 
-def check_subscription_pipeline(global_container, user_id) -> bool:
+def check_subscription_pipeline(global_container, user_id, user_context=None) -> bool:
 
     if DO_NOT_CHECK_SUBSCRIPTION:
         return True
@@ -46,16 +53,16 @@ def check_subscription_pipeline(global_container, user_id) -> bool:
     
     check_subscription_interval = datetime.timedelta(seconds=CHECK_SUBSCRIPTION_INTERVAL)
 
-    last_time_checked_subscription = global_container.get_last_time_checked_subscription(user_id)
+    last_time_checked_subscription = global_container.get_last_time_checked_subscription(user_id, user_context)
     if last_time_checked_subscription is None:
         last_time_checked_subscription = current_time - 2 * check_subscription_interval
     
     if (current_time - last_time_checked_subscription) > check_subscription_interval:
         subscription_active = check_subscription_active(user_id)
-        global_container.set_user_subscription(user_id, subscription_active)
-        global_container.set_last_time_checked_subscription(user_id, current_time)
+        global_container.set_user_subscription(user_id, subscription_active, user_context)
+        global_container.set_last_time_checked_subscription(user_id, current_time, user_context)
     else:
-        subscription_active = global_container.get_user_subscription(user_id)
+        subscription_active = global_container.get_user_subscription(user_id, user_context)
 
     return subscription_active
 
@@ -160,23 +167,27 @@ def app_settings(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
 
     ######################
 
-    is_subscribed = check_subscription_pipeline(global_container, user_id)
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
 
     if not is_subscribed:
         return redirect('create_checkout_session')
 
     ######################
 
-    user_object = global_container.get_user_object(user_id)
+    user_object = global_container.get_user_object(user_id, user_context)
     if user_object is None:
         user_object = {}
 
+    # copy so the request-scoped document is not modified
+    user_object = {key: value for key, value in user_object.items() if key != "_id"}
+
     ######################
 
-    learning_language = global_container.get_learning_language(user_id)
+    learning_language = global_container.get_learning_language(user_id, user_context)
 
     if learning_language is None:
         return redirect('select_learning_language')
@@ -213,8 +224,6 @@ def app_settings(request):
 
         user_words_no_ids.append(word_no_id)
 
-    del user_object["_id"]
-
     user_object_json = json.dumps(user_object, ensure_ascii=False)
     user_words_json = json.dumps(user_words_no_ids, ensure_ascii=False)
 
@@ -231,19 +240,20 @@ def home(request):
         return HttpResponse("You are not allowed to access this page.", status=403)
     
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
     
     ######################
 
-    did_create_user = global_container.create_user_if_needed(user_id)
+    did_create_user = global_container.create_user_if_needed(user_id, user_context)
 
-    success, redirect_view = global_container.redirect_if_new_user(user_id)
+    success, redirect_view = global_container.redirect_if_new_user(user_id, user_context)
     
     if not success:# could be "select_ui_language" or "select_learning_language"
         return redirect(redirect_view)
     
     ######################
 
-    is_subscribed = check_subscription_pipeline(global_container, user_id)
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
 
     if not is_subscribed:
         return redirect('create_checkout_session')
@@ -262,8 +272,9 @@ def select_ui_language(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
     
-    did_create_user = global_container.create_user_if_needed(user_id)
+    did_create_user = global_container.create_user_if_needed(user_id, user_context)
 
     supported_languages = global_container.get_supported_languages()
 
@@ -284,8 +295,9 @@ def select_learning_language(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
     
-    did_create_user = global_container.create_user_if_needed(user_id)
+    did_create_user = global_container.create_user_if_needed(user_id, user_context)
 
     supported_languages = global_container.get_supported_languages()
 
@@ -309,25 +321,59 @@ def get_created_exercise(request):
         return HttpResponse("You are not allowed to access this page.", status=403)
 
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
+
+    ######################
+
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
+
+    if not is_subscribed:
+        return JsonResponse({"error": "User not subscribed"}, status=403)
+
+    ######################
+
+    (exercise, 
+     success) = global_container.get_created_exercise(user_id, user_context)
+    
+    return created_exercise_response(exercise, success)
+
+@ratelimit(key='ip', rate=WAIT_FOR_CREATED_EXERCISE_RATELIMIT)
+@login_required
+def wait_for_created_exercise(request):
+
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "User not authenticated"}, status=401)
+
+    user_id = request.user.email
+    if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
+        return HttpResponse("You are not allowed to access this page.", status=403)
+
+    global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
 
     ######################
 
-    is_subscribed = check_subscription_pipeline(global_container, user_id)
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
 
     if not is_subscribed:
         return JsonResponse({"error": "User not subscribed"}, status=403)
 
     ######################
 
+    # returns as soon as the exercise is created, or after a timeout with no exercise
     (exercise, 
-     success) = global_container.get_created_exercise(user_id)
+     success) = global_container.wait_for_created_exercise(user_id, user_context)
     
+    return created_exercise_response(exercise, success)
+
+def created_exercise_response(exercise, success) -> JsonResponse:
+
     if not success:
         return JsonResponse({"error": "Failed to get created exercise"}, status=500)
     
     if exercise is not None:
 
-        print(f"Exercise: {exercise}")
+        logger.debug("Exercise: %s", exercise)
 
         exercise = {
             "exercise_id": exercise.get("exercise_id", ""),
@@ -339,7 +385,7 @@ def get_created_exercise(request):
         return JsonResponse({"success": True,
                             "exercise": exercise}, status=200)
     else:
-        print("No exercise created yet.")
+        logger.debug("No exercise created yet.")
         return JsonResponse({"success": True}, status=200)
 
 @ratelimit(key='ip', rate=DEFAULT_RATELIMIT)
@@ -351,21 +397,37 @@ def create_new_exercise(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
 
     ######################
 
-    is_subscribed = check_subscription_pipeline(global_container, user_id)
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
 
     if not is_subscribed:
         return JsonResponse({"error": "User not subscribed"}, status=403)
 
     ######################
 
-    success = global_container.create_new_exercise(user_id)
+    (success,
+     is_overloaded) = global_container.create_new_exercise(user_id, user_context)
     
+    if is_overloaded:
+        response = JsonResponse({"error": "Too many exercises are being created, please try again"}, status=503)
+        response["Retry-After"] = str(CREATE_NEW_EXERCISE_RETRY_AFTER)
+        return response
+
     if not success:
         return JsonResponse({"error": "Failed to get new exercise"}, status=500)
     
+    # a prepared exercise was used, it is sent right away instead of the client waiting for it
+    if user_context.get("last_created_exercise_id", "") not in ["", "PROCESSING"]:
+
+        (exercise,
+         success) = global_container.get_created_exercise(user_id, user_context)
+
+        if success and exercise is not None:
+            return created_exercise_response(exercise, success)
+
     return JsonResponse({"success": True,
                          "message": "A new exercise is being created."}, status=200)
 
@@ -378,10 +440,11 @@ def apply_thumbs_up_or_down(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
 
     #######################
 
-    is_subscribed = check_subscription_pipeline(global_container, user_id)
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
 
     if not is_subscribed:
         return JsonResponse({"error": "User not subscribed"}, status=403)
@@ -415,6 +478,7 @@ def set_learning_language(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
 
     data = request.GET
 
@@ -426,7 +490,7 @@ def set_learning_language(request):
     
     learning_language = data.get("language")
 
-    success = global_container.set_learning_language(user_id, learning_language)
+    success = global_container.set_learning_language(user_id, learning_language, user_context)
     if not success:
         return JsonResponse({"error": "Failed to set learning language"}, status=500)
     
@@ -442,6 +506,7 @@ def set_ui_language(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
 
     data = request.GET
 
@@ -453,7 +518,7 @@ def set_ui_language(request):
     
     ui_language = data.get("language")
 
-    success = global_container.set_ui_language(user_id, ui_language)
+    success = global_container.set_ui_language(user_id, ui_language, user_context)
     if not success:
         return JsonResponse({"error": "Failed to set UI language"}, status=500)
     
@@ -469,10 +534,11 @@ def submit_answer(request):
     if len(OPEN_LANGUAGE_APP_ALLOWED_USER_IDS) and user_id not in OPEN_LANGUAGE_APP_ALLOWED_USER_IDS:
         return HttpResponse("You are not allowed to access this page.", status=403)
     global_container = get_global_container()
+    user_context = global_container.get_user_context(user_id)
     
     ######################
 
-    is_subscribed = check_subscription_pipeline(global_container, user_id)
+    is_subscribed = check_subscription_pipeline(global_container, user_id, user_context)
 
     if not is_subscribed:
         return JsonResponse({"error": "User not subscribed"}, status=403)
@@ -493,7 +559,8 @@ def submit_answer(request):
      message,
      correct) = global_container.submit_answer(user_id, 
                                                 exercise_id,
-                                                answer)
+                                                answer,
+                                                user_context)
     
     if not success:
         return JsonResponse({"error": message}, status=500)
@@ -501,3 +568,19 @@ def submit_answer(request):
     return JsonResponse({"success": True,
                          "message": message,
                          "correct": correct}, status=200)
+
+# not rate limited, scraped every few seconds
+@csrf_exempt
+def metrics(request):
+
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    else:
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponse(status=401)
+
+    # every gunicorn worker of this server, in the Prometheus text format
+    return HttpResponse(get_server_metrics(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,6 +1,7 @@
 
 // let create_new_exercise_url = "{% url 'create_new_exercise' %}";
 // let get_created_exercise_url = "{% url 'get_created_exercise' %}";
+// let wait_for_created_exercise_url = "{% url 'wait_for_created_exercise' %}";
 // let apply_thumbs_up_url = "{% url 'apply_thumbs_up_or_down' %}";
 // let submit_answer_url = "{% url 'submit_answer' %}";
 // let user_name = "{{ user.username }}";
@@ -44,7 +45,8 @@ function get_created_exercise() {
         return;
     }
 
-    var url = get_created_exercise_url;
+    // long-poll: the server answers as soon as the exercise is created, or after a timeout
+    var url = wait_for_created_exercise_url;
     var xhr = new XMLHttpRequest();
     xhr.open("GET", url, true);
     xhr.onreadystatechange = function() {
@@ -54,10 +56,8 @@ function get_created_exercise() {
                 // Update the player with the new exercise
                 if (response.exercise == null) {
                     console.log("Still processing.");
-                    // try again after 30 seconds
-                    setTimeout(function() {
-                        get_created_exercise();
-                    }, GLOBALS.UPDATE_INTERVAL); // 30 seconds
+                    // the server already waited, ask again right away
+                    get_created_exercise();
                 } else {
                     set_new_exercise(response.exercise);
                     console.log("Exercise fetched successfully");
@@ -98,15 +98,25 @@ function main_action() {
         xhr.onreadystatechange = function() {
             if (xhr.readyState == 4 && xhr.status == 200) {
                 var response = JSON.parse(xhr.responseText);
-                if (response.success) {
+                if (response.success && response.exercise != null) {
+                    // a prepared exercise, no need to wait for it
+                    set_new_exercise(response.exercise);
+                    console.log("Prepared exercise fetched successfully");
+                } else if (response.success) {
                     console.log("New exercise created:", response.message);
-                    // set timeout for 30 seconds
-                    setTimeout(function() {
-                        get_created_exercise();
-                    }, GLOBALS.UPDATE_INTERVAL); // 30 seconds
+                    // the long-poll returns as soon as the exercise is ready
+                    get_created_exercise();
                 } else {
                     console.error("Error fetching new exercise: " + response.error);
                 }
+            } else if (xhr.readyState == 4 && xhr.status == 503) {
+                // server is busy creating other exercises, try again later
+                var retry_after = parseInt(xhr.getResponseHeader("Retry-After")) || 5;
+                console.log("Server busy, retrying in " + retry_after + " seconds.");
+                show_loading_message("Server busy, retrying...");
+                setTimeout(function() {
+                    main_action();
+                }, retry_after * 1000);
             } else if (xhr.readyState == 4) {
                 console.error("Failed to create new exercise. Status: " + xhr.status + ", Response: " + xhr.responseText);
             }
@@ -0,0 +1,279 @@
+"""
+Micro-benchmarks of the GlobalContainer hot paths against an in-process database.
+
+    python tools/benchmark.py --sizes 10 100 1000 10000 --output benchmark.json
+    python tools/benchmark.py --baseline benchmark.json --max-regression 1.5
+
+Every benchmark runs on a synthetic learner with the given number of unlocked
+words (plus one locked word), in a fresh GlobalContainer without background
+threads. The report has the median time per call of every benchmark and size,
+and the scaling exponent between the two largest sizes (about 0 for constant
+time, 1 for linear, 2 for quadratic). With --baseline, calls slower
+than the baseline by more than --max-regression times make the exit status 1.
+
+The database is the in-process storage (MemoryDatabaseClient), so the numbers
+are the app's own cost without network round trips. Logging is left
+unconfigured, so only warnings are formatted, as in production at WARNING.
+"""
+
+from typing import Dict, Any, List, Callable, Tuple
+import statistics
+import argparse
+import platform
+import uuid
+import json
+import time
+import math
+import sys
+
+from language_app_backend.obj.GlobalContainer import (GlobalContainer,
+                                                      empty_user,
+                                                      empty_user_word_entry,
+                                                      empty_word_document)
+from language_app_backend.obj.LLM import validate_exercise
+from language_app_backend.obj.MemoryDatabaseClient import MemoryDatabaseClient
+from language_app_backend.util.constants import (MAX_NUMBER_OF_EXERCISES,
+                                                 POSSIBLE_CRITERIA)
+
+LANGUAGE = "es"
+USER_ID = "benchmark@example.com"
+
+EXERCISE = {
+    "initial_strings": ["grande"],
+    "middle_strings": ["Choose the correct synonym:"],
+    "final_strings": ["a) enorme", "b) pequeño", "c) estrecho", "d) corto"],
+    "criteria": ["a"],
+}
+
+class BenchmarkLearner:
+
+    """
+    A GlobalContainer on a fresh in-process database with one synthetic learner.
+    """
+
+    def __init__(self,
+                 number_of_words) -> None:
+
+        db_client = MemoryDatabaseClient()
+        db = db_client["language_app"]
+
+        current_time = int(time.time())
+
+        word_docs = [empty_word_document(str(uuid.uuid4()), f"word{word_i}", LANGUAGE, 0) for word_i in range(number_of_words + 1)]
+        db["words"].insert_many(word_docs)
+
+        user_word_docs = []
+        for word_i, word_doc in enumerate(word_docs):
+
+            user_word_doc = empty_user_word_entry(word_doc["_id"], USER_ID, word_doc["word_value"], LANGUAGE)
+
+            # the last word stays locked, the others are known so no new word is unlocked while benchmarking
+            if word_i < number_of_words:
+                user_word_doc["is_locked"] = False
+                user_word_doc["last_scores"] = [1]
+                user_word_doc["last_visited_times"] = [current_time - word_i]
+
+            user_word_docs.append(user_word_doc)
+
+        db["user_words"].insert_many(user_word_docs)
+
+        self.word_ids = [word_doc["_id"] for word_doc in word_docs[:number_of_words]]
+        self.word_values = [word_doc["word_value"] for word_doc in word_docs[:number_of_words]]
+        self.exercise_word_ids = self.word_ids[:2]
+
+        # a full pool of exercises without enough votes to be revised
+        self.exercise_ids = [str(uuid.uuid4()) for _ in range(MAX_NUMBER_OF_EXERCISES)]
+
+        for exercise_id in self.exercise_ids:
+            db["exercises"].insert_one({**EXERCISE,
+                                        "criteria": 0,
+                                        "exercise_id": exercise_id,
+                                        "word_ids": self.exercise_word_ids,
+                                        "language": LANGUAGE})
+
+        sorted_word_ids = sorted(self.exercise_word_ids, key=lambda x: x.lower())
+        self.exercise_key = f"{len(sorted_word_ids)}__{LANGUAGE}__0__{'_'.join(sorted_word_ids)}"
+
+        db["exercise_id_lists"].insert_one({"_id": self.exercise_key,
+                                            "exercise_id_list": list(self.exercise_ids)})
+
+        user = empty_user(USER_ID)
+        user["ui_language"] = "en"
+        user["current_learning_language"] = LANGUAGE
+        user["learning_languages"] = {LANGUAGE: {"current_level": 0}}
+        user["last_created_exercise_id"] = self.exercise_ids[0]
+
+        db["users"].insert_one(user)
+
+        self.global_container = GlobalContainer(db_client,
+                                                None,
+                                                run_background_threads=False)
+
+    def next_word(self) -> None:
+
+        self.global_container.get_next_word(USER_ID, self.global_container.get_user_context(USER_ID))
+
+    def check_if_should_unlock_new_word(self) -> None:
+
+        self.global_container.check_if_should_unlock_new_word(USER_ID, self.global_container.get_user_context(USER_ID))
+
+    def get_exercise_id(self) -> None:
+
+        self.global_container.get_exercise_id(self.exercise_word_ids, LANGUAGE, 0)
+
+    def revise_exercise_id_list(self) -> None:
+
+        self.global_container.revise_exercise_id_list(self.exercise_key, list(self.exercise_ids))
+
+    def submit_answer(self) -> None:
+
+        self.global_container.submit_answer(USER_ID,
+                                            self.exercise_ids[0],
+                                            "0",
+                                            self.global_container.get_user_context(USER_ID))
+
+    def update_user_word_score(self) -> None:
+
+        self.global_container.update_user_word_score(USER_ID, self.exercise_word_ids, True, LANGUAGE)
+
+    def validate_exercise(self) -> None:
+
+        validate_exercise(dict(EXERCISE), self.word_values[:2], POSSIBLE_CRITERIA)
+
+BENCHMARKS = [
+    "next_word",
+    "check_if_should_unlock_new_word",
+    "get_exercise_id",
+    "revise_exercise_id_list",
+    "submit_answer",
+    "update_user_word_score",
+    "validate_exercise",
+]
+
+def time_calls(function: Callable,
+               number_of_calls,
+               number_of_repeats) -> Tuple[float, float]:
+    """
+    Get the median and minimum time per call (seconds) over the repeats, after one warm up call.
+    """
+
+    function()
+
+    times_per_call = []
+    for _ in range(number_of_repeats):
+
+        start_time = time.perf_counter()
+        for _ in range(number_of_calls):
+            function()
+        times_per_call.append((time.perf_counter() - start_time) / number_of_calls)
+
+    return statistics.median(times_per_call), min(times_per_call)
+
+def get_scaling_exponent(sizes,
+                         times_per_call) -> float:
+
+    # between the two largest sizes, where the per call overhead matters least
+    if len(sizes) < 2 or min(times_per_call[-2], times_per_call[-1]) <= 0:
+        return 0.0
+
+    return math.log(times_per_call[-1] / times_per_call[-2]) / math.log(sizes[-1] / sizes[-2])
+
+def run_benchmarks(benchmarks: List[str],
+                   sizes: List[int],
+                   number_of_calls,
+                   number_of_repeats) -> Dict[str, Any]:
+
+    results = {benchmark: {} for benchmark in benchmarks}
+
+    for size in sizes:
+
+        learner = BenchmarkLearner(size)
+
+        for benchmark in benchmarks:
+
+            median_time_per_call, min_time_per_call = time_calls(getattr(learner, benchmark),
+                                                                 number_of_calls,
+                                                                 number_of_repeats)
+            results[benchmark][str(size)] = {
+                "median": median_time_per_call,
+                "min": min_time_per_call,
+            }
+
+        for benchmark in benchmarks:
+            print(f"{benchmark:<34}{size:>8} words {results[benchmark][str(size)]['median'] * 1e6:>12.1f} us/call", file=sys.stderr)
+
+    scaling = {benchmark: get_scaling_exponent(sizes, [results[benchmark][str(size)]["median"] for size in sizes])
+               for benchmark in benchmarks}
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "calls": number_of_calls,
+        "repeats": number_of_repeats,
+        "results": results,
+        "scaling": scaling,
+    }
+
+def compare_to_baseline(report,
+                        baseline,
+                        max_regression) -> List[str]:
+    """
+    Get a description of every benchmark and size slower than the baseline by more than max_regression times.
+    """
+
+    regressions = []
+
+    for benchmark, benchmark_results in report["results"].items():
+        for size, result in benchmark_results.items():
+
+            baseline_result = baseline.get("results", {}).get(benchmark, {}).get(size, None)
+
+            if baseline_result is None or baseline_result["median"] <= 0:
+                continue
+
+            ratio = result["median"] / baseline_result["median"]
+
+            if ratio > max_regression:
+                regressions.append(f"{benchmark} with {size} words: {ratio:.2f} times slower than the baseline")
+
+    return regressions
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="number of words of the synthetic learner")
+    parser.add_argument("--benchmarks", nargs="+", default=BENCHMARKS, choices=BENCHMARKS)
+    parser.add_argument("--calls", type=int, default=20, help="calls per repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the report to this JSON file instead of stdout")
+    parser.add_argument("--baseline", default=None, help="report of a previous run to compare to")
+    parser.add_argument("--max-regression", type=float, default=1.5, help="slowdown factor that counts as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.benchmarks,
+                            sorted(args.sizes),
+                            args.calls,
+                            args.repeats)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.baseline is not None:
+
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+        regressions = compare_to_baseline(report, baseline, args.max_regression)
+
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+
+        if len(regressions):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
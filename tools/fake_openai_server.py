@@ -0,0 +1,373 @@
+"""
+Local stand-in for the parts of the OpenAI API used by the app, for testing without an API key.
+
+    python tools/fake_openai_server.py --port 8001 --latency 0.5 --failure-rate 0.1 --invalid-rate 0.1
+
+then run the app with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=test
+
+Supported endpoints: POST /v1/responses (also with stream), POST /v1/files, GET /v1/files/{id}/content,
+POST /v1/batches and GET /v1/batches/{id}. Answers are made up from the prompt
+so they pass the app's validation (exercises, word levels, new words, initial words).
+"""
+
+from typing import Dict, Any, Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.parser import BytesParser
+from email.policy import HTTP
+import argparse
+import threading
+import hashlib
+import random
+import json
+import time
+import uuid
+import re
+
+def get_word_level(word_value) -> int:
+
+    # stable across calls, like a real classification would be
+    return int(hashlib.sha256(word_value.encode("utf-8")).hexdigest(), 16) % 3
+
+def get_output_text(query_input,
+                    invalid_rate: float = 0.0) -> str:
+
+    """
+    Make up an answer to one of the app's prompts, invalid_rate is the fraction of exercises with too many choices.
+    """
+
+    if "CEFR level of each of these words" in query_input:
+        word_values = json.loads(re.search(r"words in [^:]+: (\[.*\])\.", query_input).group(1))
+        return json.dumps({word_value: get_word_level(word_value) for word_value in word_values}, ensure_ascii=False)
+
+    if "estimate the CEFR level of the word" in query_input:
+        word_value = re.search(r"of the word '(.*)' in", query_input).group(1)
+        return str(get_word_level(word_value))
+
+    if "common words in" in query_input:
+        number_of_words = int(re.search(r"suggest (\d+) common words", query_input).group(1))
+        return json.dumps([f"palabra{random.randint(0, 10 ** 9)}" for _ in range(number_of_words)])
+
+    if "organized by CEFR levels" in query_input:
+        return json.dumps({level: [f"{level.lower()}_word{word_i}" for word_i in range(100)] for level in ["A1", "A2", "B1"]})
+
+    # exercise
+    final_strings = ["a) uno", "b) dos", "c) tres"]
+    if random.random() < invalid_rate:
+        final_strings += ["d) cuatro", "e) cinco", "f) seis"]
+
+    return json.dumps({
+        "initial_strings": [f"Fake sentence {uuid.uuid4().hex[:8]} with a ___."],
+        "middle_strings": ["Choose the correct word to fill in the blank:"],
+        "final_strings": final_strings,
+        "criteria": [random.choice(["a", "b", "c"])]
+    }, indent=4)
+
+def get_response_object(model, output_text, query_input="") -> Dict[str, Any]:
+
+    # about 4 characters per token
+    input_tokens = len(str(query_input)) // 4
+    output_tokens = len(output_text) // 4
+
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [{
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{
+                "type": "output_text",
+                "text": output_text,
+                "annotations": []
+            }]
+        }],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens
+        }
+    }
+
+class FakeOpenAIState:
+
+    __slots__ = [
+        "lock",
+        "files",
+        "batches",
+        "latency",
+        "failure_rate",
+        "invalid_rate",
+        "batch_delay",
+        "number_of_requests",
+        "number_of_streamed_characters",
+    ]
+    def __init__(self,
+                 latency: float = 0.0,
+                 failure_rate: float = 0.0,
+                 invalid_rate: float = 0.0,
+                 batch_delay: float = 0.0) -> None:
+
+        self.lock = threading.Lock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.invalid_rate = invalid_rate
+        self.batch_delay = batch_delay
+        self.number_of_requests = 0
+        # characters actually sent by streamed responses, lower when clients abort early
+        self.number_of_streamed_characters = 0
+
+    def add_file(self, filename, purpose, content: bytes) -> Dict[str, Any]:
+
+        file_object = {
+            "id": f"file-{uuid.uuid4().hex}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+        with self.lock:
+            self.files[file_object["id"]] = {"object": file_object, "content": content}
+
+        return file_object
+
+    def get_batch(self, batch_id) -> Optional[Dict[str, Any]]:
+
+        with self.lock:
+            batch = self.batches.get(batch_id, None)
+
+        if batch is None:
+            return None
+
+        if batch["status"] == "in_progress" and time.time() >= batch["completes_at"]:
+            self.complete_batch(batch)
+
+        return {key: value for key, value in batch.items() if key != "completes_at"}
+
+    def complete_batch(self, batch) -> None:
+
+        input_content = self.files[batch["input_file_id"]]["content"].decode("utf-8")
+
+        output_lines = []
+        for line in input_content.splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            output_text = get_output_text(request["body"]["input"])
+            output_lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": get_response_object(request["body"]["model"], output_text, request["body"]["input"])
+                },
+                "error": None
+            }, ensure_ascii=False))
+
+        output_file = self.add_file(f"{batch['id']}_output.jsonl",
+                                    "batch_output",
+                                    ("\n".join(output_lines) + "\n").encode("utf-8"))
+
+        batch["status"] = "completed"
+        batch["output_file_id"] = output_file["id"]
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"] = {"total": len(output_lines), "completed": len(output_lines), "failed": 0}
+
+class FakeOpenAIRequestHandler(BaseHTTPRequestHandler):
+
+    # set by make_server
+    state: FakeOpenAIState = None
+
+    def log_message(self, format, *args) -> None:
+
+        pass
+
+    def send_json(self, status_code, body, headers=None) -> None:
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_event_stream(self, model, output_text) -> None:
+
+        """
+        Send output_text as server-sent response events, a few characters at a time.
+        """
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        response_object = get_response_object(model, output_text)
+        item_id = response_object["output"][0]["id"]
+
+        events = [{"type": "response.created", "response": {**response_object, "status": "in_progress", "output": []}}]
+        for chunk_i in range(0, len(output_text), 8):
+            events.append({"type": "response.output_text.delta",
+                           "item_id": item_id,
+                           "output_index": 0,
+                           "content_index": 0,
+                           "delta": output_text[chunk_i:chunk_i + 8]})
+        events.append({"type": "response.completed", "response": response_object})
+
+        try:
+            for sequence_number, event in enumerate(events):
+                event["sequence_number"] = sequence_number
+                self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                with self.state.lock:
+                    self.state.number_of_streamed_characters += len(event.get("delta", ""))
+                # tokens are not generated instantly
+                time.sleep(0.001)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading
+            pass
+
+    def read_body(self) -> bytes:
+
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def should_fail(self) -> bool:
+
+        with self.state.lock:
+            self.state.number_of_requests += 1
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        if random.random() < self.state.failure_rate:
+            if random.random() < 0.5:
+                self.send_json(429, {"error": {"message": "Rate limit reached (fake).", "type": "requests", "code": "rate_limit_exceeded"}},
+                               headers={"Retry-After": "1"})
+            else:
+                self.send_json(500, {"error": {"message": "Internal error (fake).", "type": "server_error", "code": None}})
+            return True
+
+        return False
+
+    def do_POST(self) -> None:
+
+        if self.path == "/v1/responses":
+            body = json.loads(self.read_body())
+            if self.should_fail():
+                return
+            output_text = get_output_text(body["input"], self.state.invalid_rate)
+            if body.get("stream", False):
+                self.send_event_stream(body.get("model", ""), output_text)
+            else:
+                self.send_json(200, get_response_object(body.get("model", ""), output_text, body["input"]))
+
+        elif self.path == "/v1/files":
+            content_type = self.headers.get("Content-Type", "")
+            message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + self.read_body())
+            fields = {}
+            for part in message.iter_parts():
+                fields[part.get_param("name", header="content-disposition")] = (part.get_filename(), part.get_payload(decode=True))
+            filename, content = fields["file"]
+            purpose = fields.get("purpose", (None, b""))[1].decode("utf-8")
+            self.send_json(200, self.state.add_file(filename, purpose, content))
+
+        elif self.path == "/v1/batches":
+            body = json.loads(self.read_body())
+            if body["input_file_id"] not in self.state.files:
+                self.send_json(404, {"error": {"message": "File not found.", "type": "invalid_request_error", "code": None}})
+                return
+            batch = {
+                "id": f"batch_{uuid.uuid4().hex}",
+                "object": "batch",
+                "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"],
+                "status": "in_progress",
+                "created_at": int(time.time()),
+                "output_file_id": None,
+                "error_file_id": None,
+                "completes_at": time.time() + self.state.batch_delay,
+            }
+            with self.state.lock:
+                self.state.batches[batch["id"]] = batch
+            self.send_json(200, self.state.get_batch(batch["id"]))
+
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path} (fake).", "type": "invalid_request_error", "code": None}})
+
+    def do_GET(self) -> None:
+
+        batch_match = re.fullmatch(r"/v1/batches/([^/]+)", self.path)
+        file_content_match = re.fullmatch(r"/v1/files/([^/]+)/content", self.path)
+
+        if batch_match:
+            batch = self.state.get_batch(batch_match.group(1))
+            if batch is None:
+                self.send_json(404, {"error": {"message": "Batch not found.", "type": "invalid_request_error", "code": None}})
+                return
+            self.send_json(200, batch)
+
+        elif file_content_match and file_content_match.group(1) in self.state.files:
+            content = self.state.files[file_content_match.group(1)]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path} (fake).", "type": "invalid_request_error", "code": None}})
+
+def make_server(host: str = "127.0.0.1",
+                port: int = 8001,
+                latency: float = 0.0,
+                failure_rate: float = 0.0,
+                invalid_rate: float = 0.0,
+                batch_delay: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Create the server (port 0 picks a free port), call serve_forever to run it.
+    """
+
+    state = FakeOpenAIState(latency, failure_rate, invalid_rate, batch_delay)
+    handler = type("BoundFakeOpenAIRequestHandler", (FakeOpenAIRequestHandler,), {"state": state})
+
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    return server
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every /v1/responses request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of /v1/responses requests answered with 429 or 500")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="fraction of exercises generated with too many choices")
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="seconds until a batch is completed")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.failure_rate, args.invalid_rate, args.batch_delay)
+    print(f"Fake OpenAI server listening on http://{args.host}:{server.server_port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+End-to-end load test of the app against a local mongod and the fake OpenAI server.
+
+    python tools/load_test.py --users 50 --duration 120 --llm-latency 1.0 --llm-failure-rate 0.05
+
+The fake OpenAI server is started in this process, the Django app is set up
+as it is when served, and every simulated learner logs in and loops through
+create_new_exercise -> wait_for_created_exercise -> submit_answer ->
+apply_thumbs_up_or_down through the whole stack (middleware, views,
+GlobalContainer, pymongo). The report has the throughput, the p50/p95/p99
+latency and status codes of every endpoint and the number of MongoDB commands
+per completed exercise (background threads included, as they are in
+production).
+
+Everything is written to the "language_app" database of --mongo-uri, so use a
+throwaway mongod, for example: docker run --rm -p 27017:27017 mongo
+With --storage memory the app uses its in-process storage instead.
+
+MongoDB commands are read from the app's own command metrics (the ones on
+/metrics), which the pymongo command listener and the in-process storage
+both record, so the counts of the two storages can be compared.
+"""
+
+from typing import Dict, Any, List
+import threading
+import argparse
+import tempfile
+import random
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = [
+    "create_new_exercise",
+    "wait_for_created_exercise",
+    "submit_answer",
+    "apply_thumbs_up_or_down",
+]
+
+def get_mongo_command_counts() -> Dict[str, int]:
+    """
+    Get the number of MongoDB commands sent by this process so far, per command.
+    """
+
+    from language_app_backend.util.metrics import REGISTRY
+
+    counts = {}
+
+    for histogram in REGISTRY.get_snapshot()["histograms"]:
+        if histogram["name"] == "language_app_mongo_command_duration_seconds":
+            command_name = histogram["labels"]["command"]
+            counts[command_name] = counts.get(command_name, 0) + histogram["count"]
+
+    return counts
+
+class LoadTestResults:
+
+    """
+    Latencies and status codes of every endpoint, and the number of completed exercises.
+    """
+
+    def __init__(self) -> None:
+
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        self.status_codes: Dict[str, Dict[str, int]] = {endpoint: {} for endpoint in ENDPOINTS}
+        self.number_of_exercises = 0
+
+    def record_request(self,
+                       endpoint,
+                       latency,
+                       status_code) -> None:
+
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            endpoint_status_codes = self.status_codes[endpoint]
+            endpoint_status_codes[str(status_code)] = endpoint_status_codes.get(str(status_code), 0) + 1
+
+    def record_exercise(self) -> None:
+
+        with self.lock:
+            self.number_of_exercises += 1
+
+    def get_endpoint_report(self,
+                            duration) -> Dict[str, Any]:
+
+        report = {}
+
+        with self.lock:
+            for endpoint in ENDPOINTS:
+
+                latencies = np.array(self.latencies[endpoint])
+
+                if not len(latencies):
+                    continue
+
+                report[endpoint] = {
+                    "requests": len(latencies),
+                    "requests_per_second": len(latencies) / duration,
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                    "p99": float(np.percentile(latencies, 99)),
+                    "max": float(latencies.max()),
+                    "status_codes": dict(self.status_codes[endpoint]),
+                }
+
+        return report
+
+def timed_get(client,
+              results,
+              endpoint,
+              data=None):
+
+    start_time = time.monotonic()
+    response = client.get(f"/{endpoint}", data)
+    results.record_request(endpoint, time.monotonic() - start_time, response.status_code)
+
+    return response
+
+def run_learner(client,
+                results,
+                end_time) -> None:
+    """
+    Loop through the exercises of one learner until end_time.
+    """
+
+    while time.monotonic() < end_time:
+
+        response = timed_get(client, results, "create_new_exercise")
+
+        if response.status_code == 503:
+            time.sleep(float(response.get("Retry-After", 1)))
+            continue
+
+        if response.status_code != 200:
+            time.sleep(1)
+            continue
+
+        # a prepared exercise comes with the response, like in the player
+        exercise = response.json().get("exercise", None)
+        while exercise is None and time.monotonic() < end_time:
+
+            response = timed_get(client, results, "wait_for_created_exercise")
+
+            if response.status_code != 200:
+                break
+
+            exercise = response.json().get("exercise", None)
+
+        if exercise is None:
+            continue
+
+        answer = random.randint(0, max(0, len(exercise["final_strings"]) - 1))
+
+        timed_get(client, results, "submit_answer", {"exercise_id": exercise["exercise_id"],
+                                                     "answer": str(answer)})
+
+        timed_get(client, results, "apply_thumbs_up_or_down", {"exercise_id": exercise["exercise_id"],
+                                                               "is_positive": random.choice(["true", "false"])})
+
+        results.record_exercise()
+
+def run_learner_thread(client,
+                       results,
+                       end_time) -> None:
+
+    from django.db import connection
+
+    try:
+        run_learner(client, results, end_time)
+    except Exception as e:
+        print(f"Error in load test learner: {e}", file=sys.stderr)
+    finally:
+        # each thread has its own connection to the sessions database
+        connection.close()
+
+def setup_django(args,
+                 llm_base_url,
+                 sqlite_path) -> None:
+    """
+    Set up the Django app the way it is set up when served, with the fake LLM server and the local mongod.
+    """
+
+    if PROJECT_DIRECTORY not in sys.path:
+        sys.path.insert(0, PROJECT_DIRECTORY)
+
+    os.environ["OPENAI_BASE_URL"] = llm_base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["LANGUAGE_APP_DB_CONNECTION_STRING"] = args.mongo_uri
+    os.environ["LANGUAGE_APP_STORAGE"] = args.storage
+    # the fake server has no rate limits, measure the app rather than the default budget of the lowest usage tier
+    os.environ.setdefault("LANGUAGE_APP_LLM_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("LANGUAGE_APP_LLM_TOKENS_PER_MINUTE", "100000000")
+    os.environ["DJANGO_SETTINGS_MODULE"] = "language_app.settings"
+    os.environ.setdefault("DJANGO_SECRET_KEY", "load-test")
+    os.environ.setdefault("LANGUAGE_APP_LOG_LEVEL", "DEBUG" if args.verbose else "WARNING")
+    # setup_globals only runs in the serving process
+    os.environ["RUN_MAIN"] = "true"
+
+    from django.conf import settings
+
+    # every learner comes from the same address
+    settings.RATELIMIT_ENABLE = False
+    # users and sessions go to a throwaway database instead of the project's db.sqlite3
+    settings.DATABASES["default"]["NAME"] = sqlite_path
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+def create_learner_clients(args) -> List[Any]:
+    """
+    Create one logged in test client per learner, with its languages set.
+    """
+
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    clients = []
+
+    for user_i in range(args.users):
+
+        user = User.objects.create_user(username=f"load_test_{user_i}",
+                                        email=f"load_test_{user_i}@example.com")
+
+        client = Client(SERVER_NAME="localhost")
+        client.force_login(user)
+
+        # creates the user in the database, like the first visit after logging in
+        client.get("/")
+        client.get("/set_ui_language", {"language": "en"})
+        client.get("/set_learning_language", {"language": args.language})
+
+        clients.append(client)
+
+    return clients
+
+def run_load_test(args) -> Dict[str, Any]:
+
+    from fake_openai_server import make_server
+
+    llm_server = make_server(port=0,
+                             latency=args.llm_latency,
+                             failure_rate=args.llm_failure_rate,
+                             invalid_rate=args.llm_invalid_rate)
+    threading.Thread(target=llm_server.serve_forever, daemon=True).start()
+
+    sqlite_file = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+    sqlite_file.close()
+
+    try:
+        setup_django(args,
+                     f"http://127.0.0.1:{llm_server.server_port}/v1",
+                     sqlite_file.name)
+
+        from language_app_backend.util.db import get_global_container
+
+        global_container = get_global_container()
+        # normally done by the main server once it has been up for a while
+        global_container.populate_initial_words(args.language)
+
+        clients = create_learner_clients(args)
+
+        mongo_counts_before = get_mongo_command_counts()
+        llm_requests_before = llm_server.RequestHandlerClass.state.number_of_requests
+
+        results = LoadTestResults()
+        start_time = time.monotonic()
+        end_time = start_time + args.duration
+
+        threads = [threading.Thread(target=run_learner_thread,
+                                    args=(client, results, end_time),
+                                    daemon=True) for client in clients]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        duration = time.monotonic() - start_time
+
+        mongo_counts_after = get_mongo_command_counts()
+        llm_requests = llm_server.RequestHandlerClass.state.number_of_requests - llm_requests_before
+
+        global_container.is_running = False
+    finally:
+        llm_server.shutdown()
+        os.remove(sqlite_file.name)
+
+    mongo_counts = {command_name: count - mongo_counts_before.get(command_name, 0)
+                    for command_name, count in mongo_counts_after.items()
+                    if count - mongo_counts_before.get(command_name, 0) > 0}
+    number_of_mongo_commands = sum(mongo_counts.values())
+    number_of_exercises = results.number_of_exercises
+
+    return {
+        "users": args.users,
+        "duration": duration,
+        "llm_latency": args.llm_latency,
+        "llm_failure_rate": args.llm_failure_rate,
+        "exercises": number_of_exercises,
+        "exercises_per_second": number_of_exercises / duration,
+        "endpoints": results.get_endpoint_report(duration),
+        "llm_requests": llm_requests,
+        "llm_requests_per_exercise": llm_requests / number_of_exercises if number_of_exercises else None,
+        "mongo_commands": mongo_counts,
+        "mongo_commands_per_exercise": number_of_mongo_commands / number_of_exercises if number_of_exercises else None,
+    }
+
+def print_report(report) -> None:
+
+    print(f"{report['users']} learners for {report['duration']:.1f}s: "
+          f"{report['exercises']} exercises ({report['exercises_per_second']:.2f}/s)")
+
+    print(f"{'endpoint':<28}{'requests':>10}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}  status codes")
+    for endpoint, endpoint_report in report["endpoints"].items():
+        print(f"{endpoint:<28}{endpoint_report['requests']:>10}{endpoint_report['requests_per_second']:>10.2f}"
+              f"{endpoint_report['p50']:>10.3f}{endpoint_report['p95']:>10.3f}{endpoint_report['p99']:>10.3f}"
+              f"  {endpoint_report['status_codes']}")
+
+    print(f"LLM requests per exercise: {report['llm_requests_per_exercise']}")
+    print(f"MongoDB commands per exercise: {report['mongo_commands_per_exercise']}")
+    print(f"MongoDB commands: {report['mongo_commands']}")
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="number of simulated learners")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds the learners keep going")
+    parser.add_argument("--language", default="es", help="learning language of the learners")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds added to every LLM request")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="fraction of LLM requests answered with 429 or 500")
+    parser.add_argument("--llm-invalid-rate", type=float, default=0.0, help="fraction of exercises generated invalid")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017", help="throwaway mongod, its language_app database is written to")
+    parser.add_argument("--storage", default="mongo", choices=["mongo", "memory"], help="memory runs without a mongod")
+    parser.add_argument("--output", default=None, help="also write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the app's debug logs (LANGUAGE_APP_LOG_LEVEL overrides it)")
+    args = parser.parse_args()
+
+    report = run_load_test(args)
+
+    print_report(report)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()